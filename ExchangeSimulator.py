@@ -0,0 +1,740 @@
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import numpy as np
+
+try:
+    from aiohttp import web, WSMsgType
+except ImportError:
+    web = None
+
+logger = logging.getLogger(__name__)
+
+
+# Suits of the orders (singular) and of the WebSocket feed (plural)
+CARDS = ['spade', 'club', 'heart', 'diamond']
+SUITS = ['spades', 'clubs', 'hearts', 'diamonds']
+
+# Suit of the same colour [spades, clubs, hearts, diamonds]
+SAME_COLOUR = [1, 0, 3, 2]
+
+# Money rules
+STARTING_BALANCE = 350
+ANTE             = 50
+GOAL_CARD_PRIZE  = 10
+
+
+class Player:
+
+    __slots__ = ('player_id', 'name', 'cards', 'balance')
+
+    def __init__(self, player_id, name) -> None:
+        """
+        A seat of the exchange.
+
+        INPUTS:
+            * player_id (str): secret id used in the REST headers
+            * name (str): public name used in the WebSocket feed
+        """
+        self.player_id = player_id
+        self.name      = name
+        self.cards     = [0, 0, 0, 0]
+        self.balance   = STARTING_BALANCE
+
+
+
+class MatchingEngine:
+
+    def __init__(self, seed=None) -> None:
+        """
+        Figgie matching engine: one resting order per player, suit and direction, trades at
+        the resting price and clears every order after a trade. It does no I/O, so the exchange
+        simulator and the self-play simulator share it.
+
+        INPUTS:
+            * seed (int): seed of the deals
+        """
+
+        self.rng      = random.Random(seed)
+        self.players  = {}                                # player_id -> Player
+        self.by_name  = {}                                # name -> Player
+        self.bids     = [{} for _ in range(4)]            # suit -> {name: price}, in time priority
+        self.asks     = [{} for _ in range(4)]
+        self.active   = False
+        self.deck     = None
+        self.goal     = None
+        self.pot      = 0
+        self.n_trades = 0
+
+
+    def add_player(self, player_id, name):
+        """
+        Adds a player, or returns the existing one.
+        """
+
+        if player_id not in self.players:
+            player = Player(player_id, name)
+            self.players[player_id] = player
+            self.by_name[name] = player
+        return self.players[player_id]
+
+
+    def reset_game(self):
+        """
+        Restores the starting balances.
+        """
+
+        for player in self.players.values():
+            player.balance = STARTING_BALANCE
+
+
+    def start_round(self):
+        """
+        Collects the antes, picks a deck configuration and deals the 40 cards.
+
+        OUTPUTS:
+            * (dict): name -> cards dealt [spades, clubs, hearts, diamonds]
+        """
+
+        # Deck: one 12-cards suit, the goal suit is the other suit of its colour
+        idx_12 = self.rng.randrange(4)
+        idx_8  = self.rng.choice([idx for idx in range(4) if idx != idx_12])
+        self.deck = [10, 10, 10, 10]
+        self.deck[idx_12], self.deck[idx_8] = 12, 8
+        self.goal = SAME_COLOUR[idx_12]
+
+        cards = [idx_suit for idx_suit in range(4) for _ in range(self.deck[idx_suit])]
+        self.rng.shuffle(cards)
+
+        players = list(self.players.values())
+        n_hand = len(cards) // len(players)
+        hands = {}
+        for idx_player, player in enumerate(players):
+            player.cards = [0, 0, 0, 0]
+            for idx_suit in cards[idx_player*n_hand:(idx_player + 1)*n_hand]:
+                player.cards[idx_suit] += 1
+            player.balance -= ANTE
+            hands[player.name] = list(player.cards)
+
+        self.pot    = ANTE * len(players)
+        self.active = True
+        self.clear_book()
+
+        return hands
+
+
+    def end_round(self):
+        """
+        Pays the goal suit cards and the majority, and closes the round.
+
+        OUTPUTS:
+            * (dict): end_round data of the WebSocket feed
+        """
+
+        self.active = False
+        self.clear_book()
+        goal = self.goal
+
+        # 10 per goal card, the rest of the pot to the majority (split between ties)
+        players = list(self.players.values())
+        for player in players:
+            player.balance += GOAL_CARD_PRIZE * player.cards[goal]
+            self.pot -= GOAL_CARD_PRIZE * player.cards[goal]
+        n_max = max(player.cards[goal] for player in players)
+        winners = [player for player in players if player.cards[goal] == n_max]
+        for player in winners:
+            player.balance += self.pot // len(winners)
+        self.pot = 0
+
+        return {'card_count':         dict(zip(SUITS, self.deck)),
+                'goal_suit':          SUITS[goal],
+                'player_inventories': [dict(player_name=player.name, **dict(zip(SUITS, player.cards))) for player in players],
+                'player_points':      self.get_points()}
+
+
+    def get_points(self):
+        """
+        Returns the balance of every player.
+        """
+        return [{'player_name': player.name, 'points': player.balance} for player in self.players.values()]
+
+
+    def clear_book(self):
+        self.bids = [{} for _ in range(4)]
+        self.asks = [{} for _ in range(4)]
+
+
+    def post_order(self, player_id, card, price, direction):
+        """
+        Places an order, trading against the best opposite order when it crosses.
+
+        INPUTS:
+            * player_id (str)
+            * card (str): "spade" | "club" | "heart" | "diamond"
+            * price (int)
+            * direction (str): "buy" | "sell"
+
+        OUTPUTS:
+            * (str): status of the exchange
+            * (str): trade "suit,price,buyer,seller", None if there was no trade
+        """
+
+        player = self.players.get(player_id)
+        if player is None:
+            return 'UNKNOWN_PLAYER', None
+        if not self.active:
+            return 'NO_GAME', None
+        if direction not in ('buy', 'sell'):
+            return 'INVALID_DIRECTION', None
+        if card not in CARDS:
+            return 'INVALID_CARD', None
+        if not isinstance(price, int) or price < 1 or price > 99:
+            return 'INVALID_PRICE', None
+
+        idx_suit = CARDS.index(card)
+        if direction == 'buy':
+            if player.balance < price:
+                return 'INSUFFICIENT_FUNDS', None
+            own, opposite, crosses = self.bids[idx_suit], self.asks[idx_suit], (lambda best: price >= best)
+            best = min(opposite.values(), default=None)
+        else:
+            if player.cards[idx_suit] < 1:
+                return 'NO_INVENTORY', None
+            own, opposite, crosses = self.asks[idx_suit], self.bids[idx_suit], (lambda best: price <= best)
+            best = max(opposite.values(), default=None)
+
+        # Trade against the first order at the best price
+        if best is not None and crosses(best):
+            counterparty = next(name for name, opp_price in opposite.items() if opp_price == best)
+            if counterparty == player.name:
+                return 'SELF_TRADE', None
+            buyer, seller = (player, self.by_name[counterparty]) if direction == 'buy' else (self.by_name[counterparty], player)
+            buyer.cards[idx_suit]  += 1
+            seller.cards[idx_suit] -= 1
+            buyer.balance  -= best
+            seller.balance += best
+            self.n_trades += 1
+            self.clear_book()
+            return 'SUCCESS', f'{card},{best},{buyer.name},{seller.name}'
+
+        # Rest the order, replacing the previous one (it loses its time priority)
+        own.pop(player.name, None)
+        own[player.name] = price
+        return 'SUCCESS', None
+
+
+    def cancel_order(self, player_id, card, direction):
+        """
+        Cancels the resting order of a player.
+
+        OUTPUTS:
+            * (str): status of the exchange
+            * (boolean): if an order was removed
+        """
+
+        player = self.players.get(player_id)
+        if player is None:
+            return 'UNKNOWN_PLAYER', False
+        if not self.active:
+            return 'NO_GAME', False
+        if direction not in ('buy', 'sell'):
+            return 'INVALID_DIRECTION', False
+        if card not in CARDS:
+            return 'INVALID_CARD', False
+
+        book = self.bids if direction == 'buy' else self.asks
+        removed = book[CARDS.index(card)].pop(player.name, None) is not None
+        return 'SUCCESS', removed
+
+
+    def get_inventory(self, player_id):
+        """
+        Returns the inventory message of the exchange: "spades,clubs,diamonds,hearts".
+        """
+
+        player = self.players.get(player_id)
+        if player is None:
+            return 'UNKNOWN_PLAYER', ''
+        if not self.active:
+            return 'NO_GAME', ''
+        spades, clubs, hearts, diamonds = player.cards
+        return 'SUCCESS', f'{spades},{clubs},{diamonds},{hearts}'
+
+
+    def get_update(self, trade=None):
+        """
+        Returns the update data of the WebSocket feed.
+
+        INPUTS:
+            * trade (str): last trade, None if there was no trade
+        """
+
+        data = {'trade': trade or ''}
+        for idx_suit, suit in enumerate(SUITS):
+            data[suit] = {'bids': [[price, name] for name, price in sorted(self.bids[idx_suit].items(), key=lambda item: -item[1])],
+                          'asks': [[price, name] for name, price in sorted(self.asks[idx_suit].items(), key=lambda item: item[1])]}
+        return data
+
+
+
+class TokenBucket:
+
+    __slots__ = ('rate', 'burst', 'tokens', 'last')
+
+    def __init__(self, rate, burst) -> None:
+        """
+        Rate limit of a player: `rate` requests per second with bursts up to `burst`.
+        """
+        self.rate   = rate
+        self.burst  = burst
+        self.tokens = burst
+        self.last   = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last)*self.rate)
+        self.last = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+
+class NoiseBot:
+
+    def __init__(self, simulator, player, interval=0.2, seed=None) -> None:
+        """
+        Scripted player posting random orders around a fair price.
+
+        INPUTS:
+            * simulator (ExchangeSimulator)
+            * player (Player)
+            * interval (double): mean seconds between actions
+            * seed (int)
+        """
+
+        self.simulator = simulator
+        self.player    = player
+        self.interval  = interval
+        self.rng       = random.Random(seed)
+
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.rng.expovariate(1.0/self.interval))
+            if not self.simulator.engine.active:
+                continue
+
+            card = self.rng.choice(CARDS)
+            if self.rng.random() < 0.15:
+                await self.simulator.cancel_order(self.player.player_id, card, self.rng.choice(['buy', 'sell']))
+            elif self.rng.random() < 0.5:
+                await self.simulator.post_order(self.player.player_id, card, self.rng.randint(1, 12), 'buy')
+            elif self.player.cards[CARDS.index(card)] > 0:
+                await self.simulator.post_order(self.player.player_id, card, self.rng.randint(6, 30), 'sell')
+
+
+
+class ExchangeSimulator:
+
+    def __init__(self,
+                 rest_port = 8090,
+                 ws_port = 8080,
+                 host = 'localhost',
+                 n_players = 4,
+                 n_rounds = 4,
+                 n_games = None,
+                 round_duration = 30.0,
+                 pause = 2.0,
+                 rate_limit = 20.0,
+                 burst = 10,
+                 noise_interval = 0.2,
+                 seed = None) -> None:
+        """
+        Local stand-in of the Figgie exchange: REST API (/register_testnet, /order, /cancel, /inventory)
+        and WebSocket feed (update, dealing_cards, end_round, end_game) with the payloads of the testnet.
+        Seats that no external bot takes are played by noise bots.
+
+        INPUTS:
+            * rest_port, ws_port (int), host (str)
+            * n_players (int): players of a game, including the noise bots
+            * n_rounds (int): rounds of a game
+            * n_games (int): games before stopping, None to play forever
+            * round_duration (double): seconds of a round
+            * pause (double): seconds between rounds
+            * rate_limit (double): REST requests per second of each player, None for no limit
+            * burst (int): burst of REST requests
+            * noise_interval (double): mean seconds between noise bot actions
+            * seed (int)
+        """
+
+        if web is None:
+            raise ImportError('The exchange simulator needs aiohttp.')
+
+        self.rest_port      = rest_port
+        self.ws_port        = ws_port
+        self.host           = host
+        self.n_players      = n_players
+        self.n_rounds       = n_rounds
+        self.n_games        = n_games
+        self.round_duration = round_duration
+        self.pause          = pause
+        self.rate_limit     = rate_limit
+        self.burst          = burst
+        self.noise_interval = noise_interval
+        self.seed           = seed
+
+        self.engine      = MatchingEngine(seed)
+        self.buckets     = {}                # player_id -> TokenBucket
+        self.sockets     = {}                # player_id -> WebSocketResponse
+        self.noise_bots  = []
+        self.lock        = asyncio.Lock()
+        self.n_external  = 0
+
+        # Tick-to-order latency of the external players
+        self.last_tick_ns = 0
+        self.answered     = set()
+        self.latencies    = []
+
+
+    #####################################################################################################
+    #                                           ORDERS
+    #####################################################################################################
+
+    async def post_order(self, player_id, card, price, direction):
+        """
+        Sends an order to the engine and broadcasts the book when it changed.
+        """
+
+        async with self.lock:
+            status, trade = self.engine.post_order(player_id, card, price, direction)
+            if status == 'SUCCESS':
+                await self.broadcast('update', self.engine.get_update(trade))
+        return status
+
+
+    async def cancel_order(self, player_id, card, direction):
+        """
+        Cancels an order and broadcasts the book when it changed.
+        """
+
+        async with self.lock:
+            status, removed = self.engine.cancel_order(player_id, card, direction)
+            if removed:
+                await self.broadcast('update', self.engine.get_update())
+        return status
+
+
+    def record_latency(self, player_id):
+        """
+        Records the time between the last update and the first order of an external player.
+        """
+
+        if self.last_tick_ns and (player_id not in self.answered):
+            self.answered.add(player_id)
+            self.latencies.append(time.perf_counter_ns() - self.last_tick_ns)
+
+
+    def get_latency_stats(self):
+        """
+        Returns the tick-to-order latency percentiles in microseconds.
+        """
+
+        if not self.latencies:
+            return {'n': 0}
+        latencies = np.array(self.latencies) / 1e3
+        return {'n': len(latencies),
+                **{f'p{q}': float(np.percentile(latencies, q)) for q in (50, 90, 99)},
+                'max': float(latencies.max())}
+
+
+
+    #####################################################################################################
+    #                                           REST API
+    #####################################################################################################
+
+    @staticmethod
+    def reply(status, message=''):
+        # The exchange double encodes its answers
+        return web.json_response(json.dumps({'status': status, 'message': message}))
+
+
+    def check_request(self, request):
+        """
+        Returns the player id of a request and the error status, if any.
+        """
+
+        player_id = request.headers.get('Playerid')
+        if player_id is None:
+            return None, 'MISSING_HEADER'
+        if player_id not in self.engine.players:
+            return player_id, 'UNKNOWN_PLAYER'
+        if self.rate_limit is not None:
+            bucket = self.buckets.setdefault(player_id, TokenBucket(self.rate_limit, self.burst))
+            if not bucket.take():
+                return player_id, 'RATE_LIMIT'
+        return player_id, None
+
+
+    @staticmethod
+    async def read_object(request):
+        """
+        Returns the JSON object of a request body, None if the body is not a JSON object.
+        """
+
+        try:
+            data = await request.json()
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+
+    async def handle_register(self, request):
+        player_id = request.headers.get('Playerid')
+        if player_id is None:
+            return self.reply('MISSING_HEADER')
+
+        if player_id not in self.engine.players:
+            if self.n_external + len(self.noise_bots) >= self.n_players:
+                return self.reply('UNAUTHORIZED_ACTION', 'The game is full.')
+            self.engine.add_player(player_id, f'{player_id}_{len(self.engine.players) + 1}')
+            self.n_external += 1
+
+        name = self.engine.players[player_id].name
+        return self.reply('SUCCESS', f'Registered to testnet. Temp player name: {name}.')
+
+
+    async def handle_order(self, request):
+        player_id, error = self.check_request(request)
+        if error is not None:
+            return self.reply(error)
+        self.record_latency(player_id)
+
+        data = await self.read_object(request)
+        if data is None:
+            return self.reply('PARSE_ERROR')
+        status = await self.post_order(player_id, data.get('card'), data.get('price'), data.get('direction'))
+        return self.reply(status)
+
+
+    async def handle_cancel(self, request):
+        player_id, error = self.check_request(request)
+        if error is not None:
+            return self.reply(error)
+        self.record_latency(player_id)
+
+        data = await self.read_object(request)
+        if data is None:
+            return self.reply('PARSE_ERROR')
+        status = await self.cancel_order(player_id, data.get('card'), data.get('direction'))
+        return self.reply(status)
+
+
+    async def handle_inventory(self, request):
+        player_id, error = self.check_request(request)
+        if error is not None:
+            return self.reply(error)
+
+        status, message = self.engine.get_inventory(player_id)
+        return self.reply(status, message)
+
+
+    async def handle_stats(self, request):
+        return web.json_response({'latency_us': self.get_latency_stats(),
+                                  'trades':     self.engine.n_trades,
+                                  'points':     self.engine.get_points()})
+
+
+
+    #####################################################################################################
+    #                                           WEBSOCKET
+    #####################################################################################################
+
+    async def handle_websocket(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        player_id = None
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            try:
+                message = json.loads(msg.data)
+            except ValueError:
+                message = None
+            if not isinstance(message, dict):
+                await ws.send_str(json.dumps({'status': 'PARSE_ERROR'}))
+                continue
+
+            if message.get('action') != 'subscribe':
+                await ws.send_str(json.dumps({'status': 'UNAUTHORIZED_ACTION'}))
+            elif not isinstance(message.get('playerid'), str) or message['playerid'] not in self.engine.players:
+                await ws.send_str(json.dumps({'status': 'UNKNOWN_PLAYER'}))
+            else:
+                player_id = message['playerid']
+                self.sockets[player_id] = ws
+                await ws.send_str(json.dumps({'status': 'SUCCESS'}))
+
+        if player_id is not None and self.sockets.get(player_id) is ws:
+            del self.sockets[player_id]
+        return ws
+
+
+    async def send(self, player_id, kind, data):
+        """
+        Sends a frame to one player, if subscribed.
+        """
+
+        ws = self.sockets.get(player_id)
+        if ws is not None and not ws.closed:
+            await ws.send_str(json.dumps({'kind': kind, 'data': data}))
+
+
+    async def broadcast(self, kind, data):
+        """
+        Sends a frame to every subscribed player.
+        """
+
+        frame = json.dumps({'kind': kind, 'data': data})
+        sockets = [ws for ws in self.sockets.values() if not ws.closed]
+        await asyncio.gather(*[ws.send_str(frame) for ws in sockets], return_exceptions=True)
+
+        if kind == 'update':
+            self.last_tick_ns = time.perf_counter_ns()
+            self.answered = set()
+
+
+
+    #####################################################################################################
+    #                                           GAME LOOP
+    #####################################################################################################
+
+    def add_noise_bots(self):
+        """
+        Takes the seats left for the noise bots.
+        """
+
+        n_noise = self.n_players - self.n_external - len(self.noise_bots)
+        for idx in range(n_noise):
+            idx_bot = len(self.noise_bots) + 1
+            player = self.engine.add_player(f'noise_{idx_bot}', f'Noise{idx_bot}')
+            seed = None if self.seed is None else self.seed + idx_bot
+            self.noise_bots.append(NoiseBot(self, player, self.noise_interval, seed))
+
+
+    async def run_games(self, n_external):
+        """
+        Plays the games once the external players subscribed.
+
+        INPUTS:
+            * n_external (int): external players to wait for
+        """
+
+        while len(self.sockets) < n_external:
+            await asyncio.sleep(0.05)
+        self.add_noise_bots()
+        bot_tasks = [asyncio.create_task(bot.run()) for bot in self.noise_bots]
+
+        try:
+            n_game = 0
+            while self.n_games is None or n_game < self.n_games:
+                self.engine.reset_game()
+
+                for _ in range(self.n_rounds):
+                    async with self.lock:
+                        hands = self.engine.start_round()
+                        for player_id, player in self.engine.players.items():
+                            await self.send(player_id, 'dealing_cards', dict(zip(SUITS, hands[player.name])))
+                    logger.info(f'Round started: deck {self.engine.deck}, goal {SUITS[self.engine.goal]}.')
+
+                    await asyncio.sleep(self.round_duration)
+
+                    async with self.lock:
+                        await self.broadcast('end_round', self.engine.end_round())
+                    logger.info(f'Round ended. Tick-to-order latency (us): {self.get_latency_stats()}')
+                    await asyncio.sleep(self.pause)
+
+                await self.broadcast('end_game', {'player_points': self.engine.get_points()})
+                n_game += 1
+        finally:
+            for task in bot_tasks:
+                task.cancel()
+
+
+    def make_rest_app(self):
+        rest_app = web.Application()
+        rest_app.add_routes([web.post('/register_testnet', self.handle_register),
+                             web.post('/order',            self.handle_order),
+                             web.post('/cancel',           self.handle_cancel),
+                             web.post('/inventory',        self.handle_inventory),
+                             web.get('/stats',             self.handle_stats)])
+        return rest_app
+
+
+    def make_ws_app(self):
+        ws_app = web.Application()
+        ws_app.add_routes([web.get('/', self.handle_websocket)])
+        return ws_app
+
+
+    async def start(self):
+        """
+        Starts the REST and WebSocket servers.
+        """
+
+        self.runners = []
+        for app, port in ((self.make_rest_app(), self.rest_port), (self.make_ws_app(), self.ws_port)):
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            await web.TCPSite(runner, self.host, port).start()
+            self.runners.append(runner)
+        logger.info(f'Exchange simulator: REST on {self.host}:{self.rest_port}, WebSocket on {self.host}:{self.ws_port}.')
+
+
+    async def stop(self):
+        for ws in list(self.sockets.values()):
+            await ws.close()
+        for runner in self.runners:
+            await runner.cleanup()
+
+
+    async def serve(self, n_external=1):
+        """
+        Runs the simulator until the games are over.
+        """
+
+        await self.start()
+        try:
+            await self.run_games(n_external)
+        finally:
+            logger.info(f'Tick-to-order latency (us): {self.get_latency_stats()}')
+            await self.stop()
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Local Figgie exchange simulator.')
+    parser.add_argument('--rest-port', type=int, default=8090)
+    parser.add_argument('--ws-port', type=int, default=8080)
+    parser.add_argument('--players', type=int, default=1, help='external players to wait for')
+    parser.add_argument('--rounds', type=int, default=4)
+    parser.add_argument('--games', type=int, default=None)
+    parser.add_argument('--round-duration', type=float, default=30.0)
+    parser.add_argument('--rate-limit', type=float, default=20.0, help='requests per second, 0 for no limit')
+    parser.add_argument('--burst', type=int, default=10)
+    parser.add_argument('--noise-interval', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    simulator = ExchangeSimulator(rest_port=args.rest_port, ws_port=args.ws_port, n_rounds=args.rounds,
+                                  n_games=args.games, round_duration=args.round_duration,
+                                  rate_limit=args.rate_limit or None, burst=args.burst,
+                                  noise_interval=args.noise_interval, seed=args.seed)
+    asyncio.run(simulator.serve(args.players))
@@ -4,40 +4,57 @@ import numpy as np
 
 from GoalSuitEstimator import GoalSuitEstimator
 from PortfolioEval import PortfolioEval
-from RESTAPIController import RESTAPIController
+from RESTAPIController import AsyncRESTAPIController
+from OrderBook import OrderBook, ASK
+from QueueLogging import HotLogger, json_message
+from WSMessages import SUITS, SUIT_INDEX, BOOK_ORDER, DealingCards, UpdateMessage, EndRound, EndGame
 
 logger = logging.getLogger(__name__)
+hotlog = HotLogger(__name__)
+
+
+# Placeholder names until the players are known. Row 0 is always myself.
+DEFAULT_PLAYERS = ['Myself', 'P2', 'P3', 'P4']
 
 
 class GameController:
 
     def __init__(self) -> None:
-        self.inventory = {'Myself': {'spades':0, 'clubs':0, 'hearts':0, 'diamonds':0},
-                          'P2': {'spades':0, 'clubs':0, 'hearts':0, 'diamonds':0},
-                          'P3': {'spades':0, 'clubs':0, 'hearts':0, 'diamonds':0},
-                          'P4': {'spades':0, 'clubs':0, 'hearts':0, 'diamonds':0},
-                          }
-        self.players_names = ['Myself', 'P2', 'P3', 'P4']
-        self.inventory2d = np.array([[0,0,0,0], [0,0,0,0], [0,0,0,0], [0,0,0,0]])
+        self.inventory2d = np.zeros((4, 4), dtype=np.int8)
+        self.suit_totals = np.zeros(4, dtype=np.int16)
+        self.players_names = list(DEFAULT_PLAYERS)
+        self.player_index = {player: idx for idx, player in enumerate(self.players_names)}
+        self.player_name = self.players_names[0]
         self.known_players = 1
+        self.cards_dealt = False
+        self.book = OrderBook()
         self.orderbook = {"spades":   [-999, 999],
                           "clubs":    [-999, 999],
                           "hearts":   [-999, 999],
                           "diamonds": [-999, 999]}
         self.restapi = None
+        self.inventory_drift = False
+        self.n_own_trades = 0
+        self.n_drifts = 0
         
         
-    def set_restAPI(self, rest_api: RESTAPIController):
+    def set_restAPI(self, rest_api: AsyncRESTAPIController):
         self.restapi = rest_api
 
     def get_restAPI(self):
         return self.restapi
     
     def set_playerName(self, player_name):
+        self.rename_player(0, player_name)
         self.player_name = player_name
-        self.inventory[self.player_name] = self.inventory['Myself']
-        del self.inventory['Myself']
-        self.players_names[0] = self.player_name
+
+
+    @property
+    def inventory(self):
+        """
+        Dictionary view of the inventory {player: {suit: cards}}. Only for logging and printing.
+        """
+        return {player: self.get_player_inventory(player) for player in self.players_names}
 
 
 
@@ -45,28 +62,33 @@ class GameController:
     #                                      INVENTORY DEALERS
     #####################################################################################################
 
-    def set_starting_hand(self, cards):
+    def set_cards(self, idx_player, idx_suit, value):
+        """
+        Sets the number of cards of a player for a given suit, keeping the totals per suit.
+
+        INPUTS:
+            * idx_player (int): row of the player, 0 is myself
+            * idx_suit (int): column of the suit
+            * value (int)
+        """
+
+        self.suit_totals[idx_suit] += value - self.inventory2d[idx_player, idx_suit]
+        self.inventory2d[idx_player, idx_suit] = value
+
+
+    def set_starting_hand(self, cards: DealingCards):
         """
         Sets bot's starting hand.
 
         INPUTS:
-            * cards (dict): message from WebSocket.
-        """
-
-        for suit, value in cards['data'].items():
-            try:
-                self.inventory[self.player_name][suit] += value
-            except:
-                logger.error('Something wrong with the inventory player name!')
-                self.inventory = {'Myself': {'spades':0, 'clubs':0, 'hearts':0, 'diamonds':0},
-                          'P2': {'spades':0, 'clubs':0, 'hearts':0, 'diamonds':0},
-                          'P3': {'spades':0, 'clubs':0, 'hearts':0, 'diamonds':0},
-                          'P4': {'spades':0, 'clubs':0, 'hearts':0, 'diamonds':0},
-                          }
-                self.inventory[self.player_name][suit] += value
+            * cards (DealingCards): message from WebSocket.
+        """
+
+        for idx_suit, value in enumerate(cards.cards):
+            self.set_cards(0, idx_suit, self.inventory2d[0, idx_suit] + value)
+        self.cards_dealt = True
         
         self.print_my_inventory()
-        self.inventory2d = self.get_inventory_matrix()
 
 
     def set_suit_n(self, suit, value):
@@ -78,8 +100,7 @@ class GameController:
             * value (int)
         """
 
-        self.inventory[self.player_name][suit] = value
-        self.inventory2d = self.get_inventory_matrix()
+        self.set_cards(0, SUIT_INDEX[suit], value)
 
 
     def get_suit_n(self, suit):
@@ -90,37 +111,32 @@ class GameController:
             * suit (str): "spades" | "clubs" | "hearts" | "diamonds"
         """
 
-        return self.inventory[self.player_name][suit]
+        return int(self.inventory2d[0, SUIT_INDEX[suit]])
     
 
     def get_my_inventory(self):
         """
         Returns a list with my cards inventory.
         """
-        return [self.inventory[self.player_name]['spades'],
-                self.inventory[self.player_name]['clubs'],
-                self.inventory[self.player_name]['hearts'],
-                self.inventory[self.player_name]['diamonds']]  
+        return self.inventory2d[0].tolist()
 
 
-    def get_inventory_matrix(self):
-        """
-        Returns the inventory in a 2d matrix format.
+    def get_player_inventory(self, player_id):
         """
+        Returns the inventory of a player as a dictionary {suit: cards}.
 
-        # Extract players (keys of the outer dictionary)
-        players = self.players_names
+        INPUTS:
+            * player_id (str): name of the player.
+        """
+        return dict(zip(SUITS, self.inventory2d[self.player_index[player_id]].tolist()))
 
-        # Extract suits (keys of the inner dictionaries)
-        suits = list(self.inventory[players[0]].keys())
 
-        # Create a 2D inventory
-        inventory_2d = []
-        for player in players:
-            row = [self.inventory[player][suit] for suit in suits]
-            inventory_2d.append(row)
+    def get_inventory_matrix(self):
+        """
+        Returns the inventory in a 2d matrix format.
+        """
 
-        return np.array(inventory_2d)
+        return self.inventory2d.copy()
     
 
     def add_card_to_player(self, player_id, suit, qty=1):
@@ -133,10 +149,17 @@ class GameController:
             * qty (int): quantity
         """
 
-        self.inventory[player_id][suit + 's'] += qty
-        self.inventory[player_id][suit + 's'] = int(np.nanmax([self.inventory[player_id][suit + 's'], 0]))
-        self.inventory2d = self.get_inventory_matrix()
-        logger.info(f'{player_id} has {json.dumps(self.inventory[player_id])}.')
+        idx_player = self.player_index[player_id]
+        idx_suit = SUIT_INDEX[suit + 's']
+        n_cards = int(self.inventory2d[idx_player, idx_suit]) + qty
+
+        # My inventory cannot be negative: something was missed, it has to be reconciled
+        if (idx_player == 0) and (n_cards < 0):
+            logger.warning(f'Selling a {suit} I do not have in the tracked inventory.')
+            self.inventory_drift = True
+
+        self.set_cards(idx_player, idx_suit, max(n_cards, 0))
+        hotlog.info(json_message, '%s has %s.', player_id, self.get_player_inventory(player_id))
 
 
     def add_card_to_selling_player(self, player_id, suit):
@@ -148,12 +171,39 @@ class GameController:
             * suit (str): suit of the card to add.
         """
 
-        if (self.inventory[player_id][suit] == 0) and (player_id != self.player_name):
-            logger.info(f'{player_id} had {json.dumps(self.inventory[player_id])}.')
-            self.inventory[player_id][suit] += 1
-            self.inventory2d = self.get_inventory_matrix()
-            logger.info('Adding card to selling player...')
-            logger.info(f'{player_id} has {json.dumps(self.inventory[player_id])}.')
+        idx_player = self.player_index[player_id]
+        idx_suit = SUIT_INDEX[suit]
+
+        if (self.inventory2d[idx_player, idx_suit] == 0) and (idx_player != 0):
+            hotlog.info(json_message, '%s had %s.', player_id, self.get_player_inventory(player_id))
+            self.set_cards(idx_player, idx_suit, 1)
+            hotlog.info('Adding card to selling player...')
+            hotlog.info(json_message, '%s has %s.', player_id, self.get_player_inventory(player_id))
+
+
+    def reconcile_inventory(self, nsuits):
+        """
+        Reconciles my tracked inventory with the one given by the REST API.
+
+        INPUTS:
+            * nsuits (list): cards for each suit [spades, clubs, hearts, diamonds]
+
+        OUTPUTS:
+            * (boolean): if the tracked inventory had drifted
+        """
+
+        self.inventory_drift = False
+        my_inventory = self.get_my_inventory()
+
+        if my_inventory == list(nsuits):
+            return False
+
+        logger.warning(f'Inventory drift: tracked {my_inventory}, exchange {list(nsuits)} [spades, clubs, hearts, diamonds].')
+        for idx_suit, nsuit in enumerate(nsuits):
+            self.set_cards(0, idx_suit, nsuit)
+        self.n_drifts += 1
+
+        return True
 
 
     def get_ncards_per_suit(self):
@@ -163,14 +213,56 @@ class GameController:
         OUTPUTS:
             * (list): [spades, clubs, hearts, diamonds]
         """
-        totals = {'spades': 0, 'clubs': 0, 'hearts': 0, 'diamonds': 0}
+        return self.suit_totals.tolist()
+    
+
+    def rename_player(self, idx_player, player_id):
+        """
+        Gives a name to a row of the inventory.
 
-        for player, suits in self.inventory.items():
-            for suit, count in suits.items():
-                totals[suit] += count
+        INPUTS:
+            * idx_player (int): row of the player, 0 is myself
+            * player_id (str): name of the player.
+        """
+
+        del self.player_index[self.players_names[idx_player]]
+        self.player_index[player_id] = idx_player
+        self.players_names[idx_player] = player_id
+
+
+    def set_players(self, player_names):
+        """
+        Gives the rows of the inventory to the players in seat order, myself first. Rows are
+        reassigned, so it is called while the inventory is reset (between rounds).
+
+        INPUTS:
+            * player_names (list): names of the players of the table in seat order, myself included.
+        """
+
+        others = [player for player in player_names if player != self.player_name][:3]
+        self.players_names = [self.player_name] + others + DEFAULT_PLAYERS[1 + len(others):]
+        self.player_index = {player: idx for idx, player in enumerate(self.players_names)}
+        self.known_players = 1 + len(others)
+
+
+    def get_player_row(self, player_id):
+        """
+        Returns the row of a player in the inventory. Once the cards are dealt, players not given
+        by set_players are added while there are unknown ones: an update of the previous round
+        or before the deal does not take a row.
+
+        INPUTS:
+            * player_id (str): name of the player.
+
+        OUTPUTS:
+            * (int): row of the player, -1 if unknown
+        """
+
+        if self.cards_dealt and (self.known_players < 4) and (player_id not in self.player_index):
+            self.add_player(player_id)
+
+        return self.player_index.get(player_id, -1)
 
-        return [totals['spades'], totals['clubs'], totals['hearts'], totals['diamonds']]
-    
 
     def add_player(self, player_id):
         """
@@ -180,20 +272,13 @@ class GameController:
             * player_id (str): name of the player.
         """
 
-        if player_id not in self.players_names:
+        if player_id not in self.player_index:
 
-            if 'P2' in self.inventory:
-                self.inventory[player_id] = self.inventory['P2']
-                del self.inventory['P2']
-                self.players_names[1] = player_id
-            elif 'P3' in self.inventory:
-                self.inventory[player_id] = self.inventory['P3']
-                del self.inventory['P3']
-                self.players_names[2] = player_id
-            elif 'P4' in self.inventory:
-                self.inventory[player_id] = self.inventory['P4']
-                del self.inventory['P4']
-                self.players_names[3] = player_id
+            # First row still without a name
+            for idx_player in range(1, 4):
+                if self.players_names[idx_player] == DEFAULT_PLAYERS[idx_player]:
+                    self.rename_player(idx_player, player_id)
+                    break
 
             self.known_players += 1
             logger.info(f'{player_id} player was added to the inventory.')
@@ -204,16 +289,15 @@ class GameController:
         Sets the card inventory to zero for a new round.
         """
 
-        self.inventory = {self.players_names[0]: {'spades':0, 'clubs':0, 'hearts':0, 'diamonds':0},
-                          self.players_names[1]: {'spades':0, 'clubs':0, 'hearts':0, 'diamonds':0},
-                          self.players_names[2]: {'spades':0, 'clubs':0, 'hearts':0, 'diamonds':0},
-                          self.players_names[3]: {'spades':0, 'clubs':0, 'hearts':0, 'diamonds':0},
-                          }
-        self.inventory2d = np.array([[0,0,0,0], [0,0,0,0], [0,0,0,0], [0,0,0,0]])
+        self.inventory2d[:] = 0
+        self.suit_totals[:] = 0
+        self.book.reset()
         self.orderbook = {"spades":   [-999, 999],
                           "clubs":    [-999, 999],
                           "hearts":   [-999, 999],
                           "diamonds": [-999, 999]}
+        self.inventory_drift = False
+        self.cards_dealt = False
         logger.info('Card inventory was reset. Prepared for a new round.')
 
 
@@ -222,72 +306,57 @@ class GameController:
         Sets the card inventory to zero for a new game.
         """
 
-        self.inventory = {'Myself': {'spades':0, 'clubs':0, 'hearts':0, 'diamonds':0},
-                          'P2': {'spades':0, 'clubs':0, 'hearts':0, 'diamonds':0},
-                          'P3': {'spades':0, 'clubs':0, 'hearts':0, 'diamonds':0},
-                          'P4': {'spades':0, 'clubs':0, 'hearts':0, 'diamonds':0},
-                          }
-        self.inventory2d = np.array([[0,0,0,0], [0,0,0,0], [0,0,0,0], [0,0,0,0]])
+        self.inventory2d[:] = 0
+        self.suit_totals[:] = 0
         self.known_players = 1
-        self.players_names = ['Myself', 'P2', 'P3', 'P4']
+        self.players_names = [self.player_name] + DEFAULT_PLAYERS[1:]
+        self.player_index = {player: idx for idx, player in enumerate(self.players_names)}
+        self.book.reset()
         self.orderbook = {"spades":   [-999, 999],
                           "clubs":    [-999, 999],
                           "hearts":   [-999, 999],
                           "diamonds": [-999, 999]}
+        self.inventory_drift = False
+        self.cards_dealt = False
         logger.info('Card inventory was reset. Prepared for a new game.')
 
     
-    def update_game_status(self, message):
+    def update_game_status(self, message: UpdateMessage):
         """
-        Updates the cards each player has.
+        Updates the cards each player has. Players were added while decoding the message.
+
+        INPUTS:
+            * message (UpdateMessage): message from WebSocket.
         """
 
-        # Initialize the orderbook
         is_trade = False
-        self.orderbook = {"spades":   [-999, 999],
-                          "clubs":    [-999, 999],
-                          "hearts":   [-999, 999],
-                          "diamonds": [-999, 999]}
 
         # Updates info given by trades
-        strTradesUp = message['data']['trade']
-        if strTradesUp != '':
-            suit, price, buyer_pl, seller_pl = strTradesUp.split(',')
-            if self.known_players < 4:
-                self.add_player(buyer_pl)
-                self.add_player(seller_pl)
-            if buyer_pl != self.player_name:
-                self.add_card_to_player(buyer_pl, suit, 1)
-            if seller_pl != self.player_name:
-                self.add_card_to_player(seller_pl, suit, -1)
-            #self.add_card_to_player(buyer_pl, suit, 1)
-            #self.add_card_to_player(seller_pl, suit, -1)
+        trade = message.trade
+        if trade is not None:
+            if trade.idx_buyer >= 0:
+                self.add_card_to_player(trade.buyer, trade.suit, 1)
+            if trade.idx_seller >= 0:
+                self.add_card_to_player(trade.seller, trade.suit, -1)
+            if self.player_name in (trade.buyer, trade.seller):
+                self.n_own_trades += 1
             is_trade = True
-            logger.info(f"Trade between {buyer_pl} and {seller_pl} - {suit} at {price}")
+            hotlog.info('Trade between %s and %s - %s at %s', trade.buyer, trade.seller, trade.suit, trade.price)
 
-        # Updates info given by order book
-        for suit in ['spades', 'clubs', 'diamonds', 'hearts']:
-
-            # Ask
-            asks = message['data'][suit]['asks']
+        # Updates info given by order book (only the suits whose book changed)
+        for idx_suit in BOOK_ORDER:
+            if not self.book.update(idx_suit, message.bids[idx_suit], message.asks[idx_suit]):
+                continue
+            suit = SUITS[idx_suit]
 
             # Add players who are selling cards
-            for ask in asks:
-                if self.known_players < 4:
-                    self.add_player(ask[1])
-                self.add_card_to_selling_player(ask[1], suit)
-                self.orderbook[suit][1] = int(np.nanmin([ask[0], self.orderbook[suit][1]]))
-
-            # Bid
-            bids = message['data'][suit]['bids']
+            for idx_player in self.book.get_resting_players(idx_suit, ASK):
+                if idx_player >= 0:
+                    self.add_card_to_selling_player(self.players_names[idx_player], suit)
 
-            # Add players who are buying cards
-            for bid in bids:
-                if self.known_players < 4:
-                    self.add_player(bid[1])
-                self.orderbook[suit][0] = int(np.nanmax([bid[0], self.orderbook[suit][0]]))
+            self.orderbook[suit] = [self.book.get_best_bid(idx_suit), self.book.get_best_ask(idx_suit)]
 
-        logger.info(f"Orderbook: {self.orderbook}.")
+        hotlog.info('Orderbook: %s.', dict(self.orderbook))
 
         return is_trade
 
@@ -298,27 +367,27 @@ class GameController:
     #                                           PRINTERS
     #####################################################################################################
 
-    def print_round_end(self, message):
+    def print_round_end(self, message: EndRound):
         """
         Prints the results of the round end.
         """
 
         # Prints the deck
-        logger.info(f"The deck was: {json.dumps(message['data']['card_count'])}")
+        logger.info(f"The deck was: {json.dumps(message.card_count)}")
 
         # Prints the goal suit
-        logger.info(f"The goal suit was: {json.dumps(message['data']['goal_suit'])}")
+        logger.info(f"The goal suit was: {json.dumps(message.goal_suit)}")
 
         # Prints player inventories
-        for pl_inventory in message['data']['player_inventories']:
+        for pl_inventory in message.player_inventories:
             logger.info(f'{json.dumps(pl_inventory)}')
 
         # Prints player points
-        for pl_points in message['data']['player_points']:
+        for pl_points in message.player_points:
             logger.info(f'{json.dumps(pl_points)}')
 
 
-    def print_game_end(self, message):
+    def print_game_end(self, message: EndGame):
         """
         Prints the results of the game end.
         """
@@ -326,7 +395,7 @@ class GameController:
         dict_points = {}
 
         # Prints player points
-        for pl_points in message['data']['player_points']:
+        for pl_points in message.player_points:
             logger.info(f'{json.dumps(pl_points)}')
             dict_points[pl_points['player_name']] = pl_points['points']
 
@@ -341,11 +410,11 @@ class GameController:
         """
         Prints my cards inventory.
         """
-        logger.info(f"My inventory: {json.dumps(self.inventory[self.player_name])}.")
+        hotlog.info(json_message, 'My inventory: %s.', self.get_player_inventory(self.player_name))
 
 
     def print_seen_cards(self):
         """
         Prints the number of cards seen for each suit.
         """
-        logger.info(f"Seen cards: {self.get_ncards_per_suit()} [spades, clubs, hearts, diamonds]")
+        hotlog.info('Seen cards: %s [spades, clubs, hearts, diamonds]', self.get_ncards_per_suit())
@@ -1,26 +1,218 @@
+import time
+import asyncio
 import logging
-import json
 
 from GoalSuitEstimator import GoalSuitEstimator
-from PortfolioEval import PortfolioEval
+from PortfolioEval import PortfolioEval, log_checks
 from GameController import GameController
+from OpenOrders import OpenOrders
+from LatencyTracer import LatencyTracer
+from QueueLogging import HotLogger, json_message, quotes_message, is_tick_dump_enabled, dump_tick
+from WSMessages import SUITS, SUIT_INDEX
 
 logger = logging.getLogger(__name__)
+hotlog = HotLogger(__name__)
+
+
+class StrategySnapshot:
+
+   __slots__ = ('player_name', 'n_suits', 'own_cards', 'pl_cards', 'orderbook')
+
+   def __init__(self, gameCon: GameController) -> None:
+      """
+      Copy of the GameController state the strategy reads, so it can be computed off the event loop
+      while new frames keep updating the GameController.
+      """
+      self.player_name = gameCon.player_name
+      self.n_suits     = gameCon.get_ncards_per_suit()
+      self.own_cards   = gameCon.get_my_inventory()
+      self.pl_cards    = gameCon.get_inventory_matrix()
+      self.orderbook   = dict(gameCon.orderbook)
+
+
+
+class QuoteEntry:
+
+   __slots__ = ('probs', 'probs_10', 'port_ev', 'neutral_quotes', 'adj_quotes', 'checks', 'durations', 'compute_ns', 'speculative')
+
+   def __init__(self) -> None:
+      """
+      Quotes of an inventory (steps 1-4 of the strategy), which only depend on the cards each player has.
+
+      * probs, probs_10 (numpy array): goal suit probabilities and probabilities of each suit having 10 cards
+      * port_ev (double): portfolio value
+      * neutral_quotes, adj_quotes (numpy 2d array): quotes for each suit
+      * checks (list): failed sanity checks of the evaluator (see PortfolioEval.report_check),
+                       logged each time the quotes are used
+      * durations (dict): ns spent in each stage of the computation
+      * compute_ns (int): total ns of the computation (time saved when it is reused)
+      * speculative (boolean): computed ahead, before the inventory was reached
+      """
+      self.checks      = []
+      self.durations   = {}
+      self.speculative = False
+
+
+
+class StrategyDecision:
+
+   __slots__ = ('take', 'target', 'keep', 'durations', 'quotes')
+
+   def __init__(self) -> None:
+      """
+      Orders decided by a strategy run.
+
+      * take (tuple): (direction, suit, price) of the market taking order, None if not taking
+      * target (dict): {(direction, suit): price} limit orders to have in the market, None if none
+      * keep (set): (direction, suit) of the limit orders left as they are
+      * durations (dict): ns spent in each stage of the computation
+      * quotes (QuoteEntry): quotes the orders were decided from
+      """
+      self.take      = None
+      self.target    = None
+      self.keep      = set()
+      self.durations = {}
+      self.quotes    = None
+
+
+
+def compute_quotes(pl_cards, goalEst: GoalSuitEstimator, portEval: PortfolioEval, speculative=False):
+   """
+   Probability, portfolio and quote steps of the strategy for an inventory.
+
+   INPUTS:
+      * pl_cards (numpy 2d array): number of cards each player has of each suit, row 0 is myself
+      * goalEst (GoalSuitEstimator)
+      * portEval (PortfolioEval)
+      * speculative (boolean): the inventory was not reached yet
+
+   OUTPUTS:
+      * (QuoteEntry)
+   """
+
+   quotes = QuoteEntry()
+   quotes.speculative = speculative
+   n_suits   = pl_cards.sum(axis=0).tolist()
+   own_cards = pl_cards[0].tolist()
+   start = t = time.perf_counter_ns()
+
+   # STEP 1) Get the updated probabilities of the goal suit
+   quotes.probs, quotes.probs_10 = goalEst.get_goalsuit_prob(n_suits)
+   t_end = time.perf_counter_ns()
+   quotes.durations['probabilities'], t = t_end - t, t_end
+
+   # STEP 2) Update the value of the portfolio
+   quotes.port_ev = portEval.evaluate_portfolio(own_cards, pl_cards, quotes.probs, quotes.probs_10)
+   t_end = time.perf_counter_ns()
+   quotes.durations['portfolio'], t = t_end - t, t_end
+
+   # STEP 3) Compute neutral quotes for each suit
+   quotes.neutral_quotes = portEval.get_neutral_quotes(quotes.port_ev, pl_cards, quotes.probs, quotes.probs_10, quotes.checks)
+
+   # STEP 4) Adjust quoting prices
+   quotes.adj_quotes = portEval.get_adjusted_quotes(quotes.neutral_quotes, sum(n_suits), quotes.probs, own_cards, quotes.checks)
+   t_end = time.perf_counter_ns()
+   quotes.durations['quotes'] = t_end - t
+   quotes.compute_ns = t_end - start
+
+   return quotes
+
+
+
+def compute_decision(snapshot: StrategySnapshot, goalEst: GoalSuitEstimator, portEval: PortfolioEval, quotes: QuoteEntry = None):
+   """
+   Probability, portfolio and quote pipeline of the strategy. It only reads the snapshot, so it
+   can run in an executor.
+
+   INPUTS:
+      * snapshot (StrategySnapshot)
+      * goalEst (GoalSuitEstimator)
+      * portEval (PortfolioEval)
+      * quotes (QuoteEntry): quotes of the inventory of the snapshot if already known, computed if None
+
+   OUTPUTS:
+      * (StrategyDecision)
+   """
+
+   decision = StrategyDecision()
+
+   # STEPS 1-4) Probabilities, portfolio value and quotes
+   if quotes is None:
+      quotes = compute_quotes(snapshot.pl_cards, goalEst, portEval)
+      decision.durations.update(quotes.durations)
+   decision.quotes = quotes
+
+   # Sanity checks of the evaluator, also for quotes computed ahead or loaded from the opening table
+   log_checks(quotes.checks)
+   probs, probs_10, port_ev = quotes.probs, quotes.probs_10, quotes.port_ev
+   neutral_quotes, adj_quotes = quotes.neutral_quotes, quotes.adj_quotes
+   t = time.perf_counter_ns()
+
+   hotlog.info(json_message, 'My inventory: %s.', dict(zip(SUITS, snapshot.own_cards)))
+   hotlog.info('Seen cards: %s [spades, clubs, hearts, diamonds]', snapshot.n_suits)
+   hotlog.info(json_message, 'Goal suit probabilities: %s [spades, clubs, hearts, diamonds]', probs)
+   hotlog.info('Portfolio eval: %.2f', port_ev)
+   hotlog.info('Orderbook: %s.', snapshot.orderbook)
+   hotlog.info(quotes_message, 'Neutral quotes: %s', neutral_quotes)
+   hotlog.info(quotes_message, 'Adjusted quotes: %s', adj_quotes)
+   if is_tick_dump_enabled():
+      dump_tick('quotes', player=snapshot.player_name, seen=snapshot.n_suits, inventory=snapshot.own_cards,
+                probs=probs, probs_10=probs_10, port_ev=port_ev, orderbook=snapshot.orderbook,
+                neutral=neutral_quotes, adjusted=adj_quotes)
+
+   # STEP 5) Compare the quotes with the orderbook
+   take_order, direction, suit, price = portEval.get_market_taking_order(snapshot.orderbook, neutral_quotes, adj_quotes)
+
+   # STEP 6) If market taking is profitable, take the order
+   if take_order:
+      if snapshot.own_cards[SUIT_INDEX[suit + 's']] > 0 or direction == 'buy':
+         decision.take = (direction, suit, price)
+
+   # STEP 7) If not, put the most profitable quotes
+   else:
+      limit_order, ldirection, lsuit, lprice = portEval.get_market_limiting_order(neutral_quotes, adj_quotes)
+
+      if limit_order:
+         decision.target = {}
+         for direction, suit, price in zip(ldirection, lsuit, lprice):
+            if (price > 0) and (price < 100):
+               if (direction == "buy") or ((direction == "sell") and (price > portEval.params.min_sell_price)):
+                  decision.target[(direction, suit)] = int(price)
+
+         # Orders that did not pass the checks are left as they are in the market
+         decision.keep = set(zip(ldirection, lsuit))
+
+   decision.durations['decision'] = time.perf_counter_ns() - t
+
+   return decision
+
 
 
 class GameStrategy:
-        
-   def __init__(self, 
-                 goalEst: GoalSuitEstimator, 
+
+   def __init__(self,
+                 goalEst: GoalSuitEstimator,
                  portEval: PortfolioEval,
-                 gameCon: GameController) -> None:
-      self.goalEst  = goalEst
-      self.portEval = portEval
-      self.gameCon  = gameCon
-      self.orders = []
+                 gameCon: GameController,
+                 tracer: LatencyTracer = None,
+                 executor = None,
+                 quote_cache = None) -> None:
+      """
+      INPUTS:
+         * tracer (LatencyTracer): spans of the runs, a new one if None
+         * executor (StrategyExecutor): computes the decisions off the event loop, None to compute them inline
+         * quote_cache (QuoteCache): quotes of known and speculated inventories, None to always compute them
+      """
+      self.goalEst     = goalEst
+      self.portEval    = portEval
+      self.gameCon     = gameCon
+      self.orders      = OpenOrders()
+      self.tracer      = tracer if tracer is not None else LatencyTracer()
+      self.executor    = executor
+      self.quote_cache = quote_cache
 
    def reset(self):
-      self.orders = []
+      self.orders.reset()
 
 
    async def perform_strategy(self):
@@ -28,61 +220,103 @@ class GameStrategy:
       Computes quoting prices for each suit and sends the orders.
       """
 
-      # STEP 1) Get the updated probabilities of the goal suit
-      probs, probs_10 = self.goalEst.get_goalsuit_prob(self.gameCon.get_ncards_per_suit())
-      self.gameCon.print_my_inventory()
-      self.gameCon.print_seen_cards()
-      logger.info(f'Goal suit probabilities: {json.dumps(probs)} [spades, clubs, hearts, diamonds]')
+      # Spans start when the newest update frame was handled (runs without a new frame have no tick spans)
+      tracer, frame_ns = self.tracer, self.tracer.frame_ns
+      if tracer.handled_ns is not None:
+         t = tracer.record('schedule', tracer.handled_ns)
+         tracer.set_frame(None, None)
+      else:
+         t, frame_ns = tracer.now(), None
 
-      # STEP 2) Update the value of the portfolio
-      port_ev = self.portEval.evaluate_portfolio(self.gameCon.get_my_inventory(), self.gameCon.inventory2d, probs, probs_10)
-      logger.info(f'Portfolio eval: {port_ev:.2f}')
-      logger.info(f"Orderbook: {self.gameCon.orderbook}.")
+      # STEPS 1-5) Probabilities, portfolio, quotes and orders, from a snapshot of the state.
+      # Known quotes leave only the cheap order decision, which is not worth the executor hop
+      snapshot = StrategySnapshot(self.gameCon)
+      quotes = self.quote_cache.get(snapshot.pl_cards) if self.quote_cache is not None else None
+      if (self.executor is None) or (quotes is not None):
+         decision = compute_decision(snapshot, self.goalEst, self.portEval, quotes)
+      else:
+         decision = await self.executor.compute(snapshot, self.goalEst, self.portEval)
+      if (self.quote_cache is not None) and (quotes is None):
+         self.quote_cache.put(snapshot.pl_cards, decision.quotes)
+      for stage, duration in decision.durations.items():
+         tracer.add(stage, duration)
+      t = tracer.record('compute', t)
 
-      # STEP 3) Compute neutral quotes for each suit
-      neutral_quotes = self.portEval.get_neutral_quotes(port_ev, self.gameCon.inventory2d, probs, probs_10)
-      logger.info(f"Neutral quotes: {' '.join(['[' + ', '.join(f'{num:.2f}' for num in row) + ']' for row in neutral_quotes])}")
+      # STEP 6) If market taking is profitable, send the order
+      if decision.take is not None:
+         direction, suit, price = decision.take
+         hotlog.info('Trying to take order: %s, %s, %s ...', direction, suit, price)
+         t = self.trace_send(t, frame_ns)
+         await self.gameCon.get_restAPI().post_order(suit, int(price), direction)
+         self.trace_ack(t, frame_ns)
+         return
 
-      # STEP 4) Adjust quoting prices
-      adj_quotes = self.portEval.get_adjusted_quotes(neutral_quotes, sum(self.gameCon.get_ncards_per_suit()), probs, self.gameCon.get_my_inventory())
-      logger.info(f"Adjusted quotes: {' '.join(['[' + ', '.join(f'{num:.2f}' for num in row) + ']' for row in adj_quotes])}")
+      # STEP 7) If not, put the most profitable quotes
+      if decision.target is not None:
+         diff = self.orders.get_diff(decision.target, keep=decision.keep)
+         if diff:
+            for direction, suit, price in diff.posts:
+               hotlog.info('Trying to put limiting order: %s, %s, %s ...', direction, suit, price)
+            for direction, suit in diff.cancels:
+               hotlog.info('Trying to cancel order: %s, %s ...', direction, suit)
 
-      # STEP 5) Compare the quotes with the orderbook
-      take_order, direction, suit, price = self.portEval.get_market_taking_order(self.gameCon.orderbook, neutral_quotes, adj_quotes)
+            # Send the new orders and the cancellations concurrently
+            t = self.trace_send(t, frame_ns)
+            post_results, cancel_results = await self.gameCon.get_restAPI().send_order_diff(diff)
+            self.trace_ack(t, frame_ns)
+            self.orders.apply(diff, post_results, cancel_results)
+            return
 
-      # STEP 6) If market taking is profitable, send the order
-      if take_order and (self.gameCon.get_suit_n(suit + 's') > 0 or direction == 'buy'):
-         logger.info(f"Trying to take order: {direction}, {suit}, {price} ...")
-         self.gameCon.get_restAPI().post_order(suit, int(price), direction)
+      tracer.record('order_diff', t)
 
-      # STEP 7) If not, put the most profitable quotes
-      if not take_order:
-         limit_order, ldirection, lsuit, lprice = self.portEval.get_market_limiting_order(neutral_quotes, adj_quotes)
-
-         if limit_order:
-            new_orders = []
-            for idx in range(len(ldirection)):
-               direction = ldirection[idx]
-               suit = lsuit[idx]
-               price = lprice[idx]
-               order_id = direction + ',' + suit + ',' + str(price)
-               new_orders.append(direction + ',' + suit)
-
-               # Check if order is already in the market
-               if ((order_id) not in self.orders) and (price > 0) and (price < 100):
-                  if (direction == "buy") or ((direction == "sell") and (price > 3)):
-                     logger.info(f"Trying to put limiting order: {direction}, {suit}, {price} ...")
-                     bool_limit = self.gameCon.get_restAPI().post_order(suit, int(price), direction)
-                     if bool_limit:
-                        self.orders.append(order_id)
-
-            # Remove old orders from the market
-            for order in self.orders:
-               temp_dir = order.split(',')[0]
-               temp_suit = order.split(',')[1]
-               temp_order_id = temp_dir + ',' + temp_suit
-               if temp_order_id not in new_orders:
-                  logger.info(f"Trying to cancel order: {temp_dir}, {temp_suit} ...")
-                  bool_cancel = self.gameCon.get_restAPI().cancel_order(temp_suit, temp_dir)
-                  if bool_cancel:
-                     self.orders.remove(order)
\ No newline at end of file
+
+   async def speculate(self, stop):
+      """
+      Computes ahead the quotes of every inventory one trade away from the current one, so the
+      update of the trade is answered with a lookup. Runs while the strategy is idle, one
+      inventory at a time, giving the event loop back in between.
+
+      INPUTS:
+         * stop (function): returns True when a new strategy run was requested
+      """
+
+      if (self.quote_cache is None) or not self.quote_cache.speculative:
+         return
+
+      base = self.gameCon.get_inventory_matrix()
+      for pl_cards in self.quote_cache.set_base(base):
+
+         # A new update arrived or the inventory changed without a strategy run (end of round)
+         if stop() or not self.quote_cache.is_base(self.gameCon.inventory2d):
+            return
+
+         if self.executor is None:
+            quotes = compute_quotes(pl_cards, self.goalEst, self.portEval, speculative=True)
+            await asyncio.sleep(0)
+         else:
+            quotes = await self.executor.compute_quotes(pl_cards, self.goalEst, self.portEval, speculative=True)
+         self.quote_cache.put(pl_cards, quotes)
+
+
+   def trace_send(self, t, frame_ns):
+      """
+      Closes the order diff span when the orders are about to be sent.
+
+      OUTPUTS:
+         * (int): time the orders are sent (perf_counter_ns)
+      """
+
+      t = self.tracer.record('order_diff', t)
+      if frame_ns is not None:
+         self.tracer.record('tick_to_send', frame_ns)
+      return t
+
+
+   def trace_ack(self, t, frame_ns):
+      """
+      Closes the REST span when every order was acknowledged.
+      """
+
+      self.tracer.record('rest', t)
+      if frame_ns is not None:
+         self.tracer.record('tick_to_trade', frame_ns)
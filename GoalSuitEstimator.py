@@ -1,12 +1,64 @@
-import pandas as pd
 import numpy as np
 
+from PrecomputedTables import load_table, load_derived
+
+# Maximum number of cards of a suit in the deck (12 cards suit) plus one
+N_CARDS_AXIS = 13
+
+# Suit permutations used to bring the largest suit to the first position. They keep
+# the colour pairs together ([spades, clubs] and [hearts, diamonds]).
+SUIT_PERMUTATIONS = np.array([[0, 1, 2, 3],
+                              [1, 0, 2, 3],
+                              [2, 3, 0, 1],
+                              [3, 2, 0, 1]])
+
 class GoalSuitEstimator:
 
     def __init__(self) -> None:
 
         # Load precomputed probabilities
-        self.dfPreProb = pd.read_csv('precomputed/GoalDist.csv', delimiter=',')
+        self.preProb = load_table('GoalDist')
+
+        # Dense lookup tensor indexed by the seen cards of each suit
+        self.probTensor = load_derived('GoalDistTensor', self.preProb, self.build_prob_tensor)
+
+
+    @staticmethod
+    def build_prob_tensor(table):
+        """
+        Builds a dense tensor with the probabilities for every distribution of seen cards.
+
+        INPUTS:
+            * table (numpy 2d array): GoalDist.csv values [Suit_1..4, Pr_suit_1..4, Pr_10_1..4]
+
+        OUTPUTS:
+            * (numpy 5d array, 13x13x13x13x8): [probs, probs_10] for each [spades, clubs, hearts, diamonds]
+                                                combination of seen cards, NaN for unfeasible ones.
+        """
+
+        shape = (N_CARDS_AXIS,) * 4
+
+        # Row of the table for each stored distribution (largest suit first)
+        keys = table[:, :4].astype(int)
+        row_of = np.full(shape, -1, dtype=int)
+        row_of[tuple(keys.T)] = np.arange(len(table))
+
+        # Every possible distribution of seen cards, reordered as the table expects it
+        n_suits = np.indices(shape).reshape(4, -1).T
+        perms = SUIT_PERMUTATIONS[np.argmax(n_suits, axis=1)]
+        rows = row_of[tuple(np.take_along_axis(n_suits, perms, axis=1).T)]
+        feasible = rows >= 0
+
+        # Undo the permutation so the probabilities follow the original suit order
+        inv_perms = np.argsort(perms[feasible], axis=1)
+        values = table[rows[feasible], 4:]
+        probs = np.take_along_axis(values[:, :4], inv_perms, axis=1)
+        probs_10 = np.take_along_axis(values[:, 4:], inv_perms, axis=1)
+
+        tensor = np.full((n_suits.shape[0], 8), np.nan)
+        tensor[feasible] = np.hstack([probs, probs_10])
+
+        return tensor.reshape(shape + (8,))
 
 
     def get_goalsuit_prob(self, n_suits):
@@ -21,39 +73,38 @@ class GoalSuitEstimator:
             * list containing the probability of goal suit having 10 cards [spades, clubs, hearts, diamonds]
         """
 
-        # Reorder suits based on largest suit 
-        idx_max = np.argmax(n_suits)
-
-        if idx_max == 1:
-            new_n_suits = [n_suits[1], n_suits[0], n_suits[2], n_suits[3]]
-        elif idx_max == 2:
-            new_n_suits = [n_suits[2], n_suits[3], n_suits[0], n_suits[1]]
-        elif idx_max == 3:
-            new_n_suits = [n_suits[3], n_suits[2], n_suits[0], n_suits[1]]
-        else:
-            new_n_suits = n_suits
-
-        # Get the probabilities
-        probs = self.dfPreProb[ (self.dfPreProb['Suit_1'] == new_n_suits[0]) & \
-                                (self.dfPreProb['Suit_2'] == new_n_suits[1]) & \
-                                (self.dfPreProb['Suit_3'] == new_n_suits[2]) & \
-                                (self.dfPreProb['Suit_4'] == new_n_suits[3])].iloc[:,4:8].values[0]
-            
-        probs = list(probs)
-
-        probs_10 = self.dfPreProb[  (self.dfPreProb['Suit_1'] == new_n_suits[0]) & \
-                                    (self.dfPreProb['Suit_2'] == new_n_suits[1]) & \
-                                    (self.dfPreProb['Suit_3'] == new_n_suits[2]) & \
-                                    (self.dfPreProb['Suit_4'] == new_n_suits[3])].iloc[:,8:].values[0]
-        probs_10 = list(probs_10)
-
-        
-        # Reorder the suits
-        if idx_max == 1:
-            return [probs[1], probs[0], probs[2], probs[3]], [probs_10[1], probs_10[0], probs_10[2], probs_10[3]]
-        elif idx_max == 2:
-            return [probs[2], probs[3], probs[0], probs[1]], [probs_10[2], probs_10[3], probs_10[0], probs_10[1]]
-        elif idx_max == 3:
-            return [probs[2], probs[3], probs[1], probs[0]], [probs_10[2], probs_10[3], probs_10[1], probs_10[0]]
-        else:
-            return probs, probs_10
+        # Unfeasible distributions are not in the table
+        if min(n_suits) < 0 or max(n_suits) >= N_CARDS_AXIS:
+            raise ValueError(f'Unfeasible distribution of seen cards: {list(n_suits)}')
+
+        values = self.probTensor[n_suits[0], n_suits[1], n_suits[2], n_suits[3]]
+        if np.isnan(values[0]):
+            raise ValueError(f'Unfeasible distribution of seen cards: {list(n_suits)}')
+
+        return values[:4].tolist(), values[4:].tolist()
+
+
+    def get_goalsuit_prob_batch(self, n_suits):
+        """
+        Evaluates the goal suit probabilities for a batch of seen cards distributions.
+
+        INPUTS:
+            * n_suits (numpy 2d array, Nx4): number of cards for each suit [spades, clubs, hearts, diamonds]
+
+        OUTPUTS:
+            * (numpy 2d array, Nx4): probability of being goal suit, NaN for unfeasible rows
+            * (numpy 2d array, Nx4): probability of goal suit having 10 cards, NaN for unfeasible rows
+            * (numpy 1d array, N): mask with the feasible rows
+        """
+
+        n_suits = np.asarray(n_suits, dtype=int).reshape(-1, 4)
+
+        # Out of range rows are looked up at zero and flagged afterwards
+        in_range = np.all((n_suits >= 0) & (n_suits < N_CARDS_AXIS), axis=1)
+        idx = np.where(in_range[:, None], n_suits, 0)
+
+        values = self.probTensor[idx[:, 0], idx[:, 1], idx[:, 2], idx[:, 3]]
+        values[~in_range] = np.nan
+        feasible = ~np.isnan(values[:, 0])
+
+        return values[:, :4], values[:, 4:], feasible
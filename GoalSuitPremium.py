@@ -1,12 +1,86 @@
-import pandas as pd
 import numpy as np
 
+from PrecomputedTables import load_table
+
+# Maximum number of cards of a suit in the deck (12 cards suit) plus one
+N_CARDS_AXIS = 13
+
+# Premium when you hold the majority for sure: (10-cards pot + 10-cards pot + 8-cards pot) / 3
+MAJORITY_PREMIUM = (2*100 + 120)/3.0
+
+# np.sum adds up to 128 floats in 8 lanes (blocks of 8 values), then the lanes, then the remaining values in order
+SUM_LANES = 8
+SUM_BLOCK_SIZE = 128
+
 class GoalSuitPremium:
 
     def __init__(self) -> None:
 
         # Load precomputed probabilities
-        self.dfDist = pd.read_csv('precomputed/GoalPremium.csv', delimiter=',')
+        self.dist = load_table('GoalPremium')
+
+        # Distributions matching each [Me, Pl_2, Pl_3, Pl_4]
+        self.key_slot, self.slot_rows, layout = self.build_row_index(self.dist)
+
+        goal_10 = self.dist[:, :4].sum(axis=1) == 10
+        self.slot_tables = [(goal_10[rows], self.dist[rows, 5], self.dist[rows, 6]) for rows in self.slot_rows]
+
+        # Same distributions, padded with zeros for the batches: [10 cards goal, 8 cards goal, Weight, Pot]
+        rows = np.maximum(layout, 0)
+        self.slot_values = np.stack([goal_10[rows], ~goal_10[rows], self.dist[rows, 5], self.dist[rows, 6]], axis=1)
+        self.slot_values[np.broadcast_to((layout < 0)[:, None, :], self.slot_values.shape)] = 0.0
+
+
+    @staticmethod
+    def build_row_index(table):
+        """
+        Finds the distributions with Me cards and at least Pl_2, Pl_3, Pl_4 cards for the other players.
+
+        INPUTS:
+            * table (numpy 2d array): GoalPremium.csv values [Me, Pl_2, Pl_3, Pl_4, Pr_goal, Weight, Pot]
+
+        OUTPUTS:
+            * (numpy 4d int array, 13x13x13x13): slot of each [Me, Pl_2, Pl_3, Pl_4], 0 if no distribution matches
+            * (list): rows of the table of each slot, in the order of the CSV
+            * (numpy 2d int array): rows of each slot padded with -1, laid out so that np.sum over the padded
+                                    rows adds the rows in the same order as np.sum over the rows of the CSV
+                                    (the full blocks of SUM_LANES rows first, then the remaining rows)
+        """
+
+        cards     = table[:, :4].astype(int)
+        grid      = np.arange(N_CARDS_AXIS)
+        key_slot  = np.zeros((N_CARDS_AXIS,) * 4, dtype=int)
+        slot_rows = [np.array([], dtype=int)]
+
+        # Easy cases (less than 2 or more than 6 cards) are not looked up
+        for n_my_cards in range(2, 7):
+            rows  = np.flatnonzero(cards[:, 0] == n_my_cards)
+            match = ((cards[rows, 1] >= grid[:, None, None, None]) &
+                     (cards[rows, 2] >= grid[None, :, None, None]) &
+                     (cards[rows, 3] >= grid[None, None, :, None]))
+
+            # Keys matching the same rows share the slot
+            match = match.reshape(-1, len(rows))
+            _, first, inverse = np.unique(np.packbits(match, axis=1), axis=0, return_index=True, return_inverse=True)
+            slot_ids = np.zeros(len(first), dtype=int)
+            for ii, key in enumerate(first):
+                if match[key].any():
+                    slot_ids[ii] = len(slot_rows)
+                    slot_rows.append(rows[match[key]])
+            key_slot[n_my_cards] = slot_ids[inverse].reshape((N_CARDS_AXIS,) * 3)
+
+        # While the padded rows fit in one block of np.sum, the zeros of the padding do not change the sums
+        n_rows       = max(len(rows) for rows in slot_rows)
+        n_block_rows = n_rows - n_rows % SUM_LANES
+        layout = np.full((len(slot_rows), n_block_rows + SUM_LANES - 1), -1)
+        assert layout.shape[1] <= SUM_BLOCK_SIZE
+
+        for slot, rows in enumerate(slot_rows):
+            n_full = len(rows) - len(rows) % SUM_LANES if len(rows) >= SUM_LANES else 0
+            layout[slot, :n_full] = rows[:n_full]
+            layout[slot, n_block_rows:n_block_rows + len(rows) - n_full] = rows[n_full:]
+
+        return key_slot, slot_rows, layout
 
 
     def get_goal_suit_premium(self, n_my_cards, n_pl_cards, prob_10):
@@ -26,22 +100,50 @@ class GoalSuitPremium:
         if n_my_cards < 2:
             return 0.0
         elif n_my_cards > 6:
-            return (2*100 + 120)/3.0
-    
+            return MAJORITY_PREMIUM
+
         # Not so simple cases
-        condition   =   (self.dfDist['Me'] == n_my_cards) & \
-                        (self.dfDist['Pl_2'] >= n_pl_cards[1]) & \
-                        (self.dfDist['Pl_3'] >= n_pl_cards[2]) & \
-                        (self.dfDist['Pl_4'] >= n_pl_cards[3])
-        dfFilter = self.dfDist.copy(deep=True)
-        dfFilter = dfFilter[condition]
-
-        sum_condition_10 = dfFilter.iloc[:, :4].sum(axis=1) == 10
-        sum_condition_8  = dfFilter.iloc[:, :4].sum(axis=1) == 8
-
-        dfFilter.loc[sum_condition_10, 'Pr_goal'] = prob_10
-        dfFilter.loc[sum_condition_8, 'Pr_goal']  = 1 - prob_10
-
-        profit   = (dfFilter['Pr_goal']*dfFilter['Weight']*dfFilter['Pot']).sum()
-        
-        return  profit / dfFilter['Pr_goal'].sum(axis=0)
\ No newline at end of file
+        slot = self.key_slot[n_my_cards,
+                             min(max(n_pl_cards[1], 0), N_CARDS_AXIS - 1),
+                             min(max(n_pl_cards[2], 0), N_CARDS_AXIS - 1),
+                             min(max(n_pl_cards[3], 0), N_CARDS_AXIS - 1)]
+        if slot == 0:
+            return np.nan
+
+        goal_10, weight, pot = self.slot_tables[slot]
+        pr_goal = np.where(goal_10, prob_10, 1 - prob_10)
+
+        return (pr_goal*weight*pot).sum() / pr_goal.sum()
+
+
+    def get_goal_suit_premium_batch(self, n_my_cards, n_pl_cards, prob_10):
+        """
+        Evaluates the premium of a batch of suits being goal suit. Inputs are broadcast
+        together, so it can evaluate the four suits of many portfolios at once.
+
+        INPUTS:
+            * n_my_cards (numpy array, shape S): number of cards for the suit
+            * n_pl_cards (numpy array, shape S+(4,)): number of cards each player has of the suit
+            * prob_10 (numpy array, shape S): probability of goal suit having 10 cards
+
+        OUTPUTS:
+            * (numpy array, shape S) premium in dollars of such suit being goal suit
+        """
+
+        n_my_cards = np.asarray(n_my_cards)
+        n_pl_cards = np.minimum(np.maximum(n_pl_cards, 0), N_CARDS_AXIS - 1)
+        prob_10    = np.asarray(prob_10, dtype=float)[..., None]
+
+        slot = self.key_slot[np.minimum(np.maximum(n_my_cards, 0), N_CARDS_AXIS - 1), n_pl_cards[..., 1], n_pl_cards[..., 2], n_pl_cards[..., 3]]
+        goal_10, goal_8, weight, pot = np.moveaxis(self.slot_values[slot], -2, 0)
+
+        # Distributions with 10 cards weight prob_10, the ones with 8 cards weight 1 - prob_10
+        pr_goal = goal_10*prob_10 + goal_8*(1 - prob_10)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            premium = np.sum(pr_goal*weight*pot, axis=-1) / np.sum(pr_goal, axis=-1)
+
+        # Easy cases
+        premium = np.where(n_my_cards > 6, MAJORITY_PREMIUM, premium)
+        premium = np.where(n_my_cards < 2, 0.0, premium)
+
+        return premium
@@ -0,0 +1,202 @@
+import time
+
+# Stages between an update frame and the acknowledgement of the orders it triggered
+STAGES = ['receive',            # frame received -> handled (recording)
+          'decode',             # JSON decode of the frame
+          'update_game_status', # update of players, inventory and order book
+          'schedule',           # update handled -> strategy run started
+          'probabilities',      # goal suit probabilities lookup
+          'portfolio',          # portfolio evaluation
+          'quotes',             # neutral and adjusted quotes
+          'decision',           # market taking/limiting orders
+          'compute',            # snapshot -> decision back on the event loop (executor hop included)
+          'order_diff',         # diff with the open orders
+          'rest',               # REST send -> ack
+          'tick_to_send',       # frame received -> orders sent
+          'tick_to_trade']      # frame received -> orders acknowledged
+
+# Linear sub-buckets per power of two (relative error of a bucket below 1/2**SUB_BITS)
+SUB_BITS = 4
+SUB_COUNT = 1 << SUB_BITS
+
+
+class LatencyHistogram:
+
+    def __init__(self) -> None:
+        """
+        Log-linear histogram of durations in ns (HDR style): exact below 2**(SUB_BITS+1) ns, then
+        every power of two is split in SUB_COUNT linear buckets. Recording is an integer index
+        computation and a list increment.
+        """
+
+        self.counts = []
+        self.count  = 0
+        self.total  = 0
+        self.min    = None
+        self.max    = 0
+
+
+    @staticmethod
+    def get_index(value):
+        """
+        Returns the bucket of a duration.
+        """
+
+        if value < SUB_COUNT:
+            return value
+        shift = value.bit_length() - SUB_BITS - 1
+        return (shift + 1) * SUB_COUNT + (value >> shift) - SUB_COUNT
+
+
+    @staticmethod
+    def get_bounds(index):
+        """
+        Returns the lowest and highest duration of a bucket.
+        """
+
+        if index < 2 * SUB_COUNT:
+            return index, index
+        shift = index // SUB_COUNT - 1
+        low = (index % SUB_COUNT + SUB_COUNT) << shift
+        return low, low + (1 << shift) - 1
+
+
+    def record(self, value):
+        """
+        Records a duration.
+
+        INPUTS:
+            * value (int): duration in ns
+        """
+
+        if value < 0:
+            value = 0
+        index = self.get_index(value)
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += 1
+
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if self.min is None or value < self.min:
+            self.min = value
+
+
+    def get_percentile(self, q):
+        """
+        Returns the highest duration of the bucket holding the q-th percentile (upper bound).
+
+        INPUTS:
+            * q (double): percentile in [0, 100]
+        """
+
+        if self.count == 0:
+            return None
+        rank = max(1, int(round(q / 100 * self.count)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.get_bounds(index)[1], self.max)
+        return self.max
+
+
+    def get_summary(self):
+        """
+        Returns the statistics of the histogram in microseconds.
+
+        OUTPUTS:
+            * (dict): count, mean, min, p50, p90, p99, p99.9 and max
+        """
+
+        if self.count == 0:
+            return {'count': 0}
+
+        summary = {'count': self.count,
+                   'mean':  self.total / self.count / 1e3,
+                   'min':   self.min / 1e3}
+        for q in [50, 90, 99, 99.9]:
+            summary[f'p{q:g}'] = self.get_percentile(q) / 1e3
+        summary['max'] = self.max / 1e3
+
+        return summary
+
+
+
+class LatencyTracer:
+
+    def __init__(self, enabled=True) -> None:
+        """
+        Tick-to-trade spans of a bot, one histogram per stage (see STAGES). The stages of a frame
+        are recorded by WSController, the ones of a strategy run by GameStrategy. A strategy run
+        is attributed to the newest update frame handled before it started (runs are coalesced).
+
+        INPUTS:
+            * enabled (boolean): records nothing if False (timestamps are still taken)
+        """
+
+        self.enabled    = enabled
+        self.histograms = {stage: LatencyHistogram() for stage in STAGES}
+
+        # Newest update frame: receive time and end of its handling
+        self.frame_ns   = None
+        self.handled_ns = None
+
+
+    @staticmethod
+    def now():
+        return time.perf_counter_ns()
+
+
+    def record(self, stage, start_ns):
+        """
+        Records a span that started at start_ns and ends now.
+
+        INPUTS:
+            * stage (str): see STAGES
+            * start_ns (int): perf_counter_ns at the start of the span
+
+        OUTPUTS:
+            * (int): end of the span (perf_counter_ns), start of the next one
+        """
+
+        end_ns = time.perf_counter_ns()
+        if self.enabled:
+            self.histograms[stage].record(end_ns - start_ns)
+        return end_ns
+
+
+    def add(self, stage, duration_ns):
+        """
+        Records a span measured elsewhere (e.g. in an executor).
+        """
+
+        if self.enabled:
+            self.histograms[stage].record(duration_ns)
+
+
+    def set_frame(self, frame_ns, handled_ns):
+        """
+        Sets the newest handled update frame, the origin of the next strategy run.
+        """
+
+        self.frame_ns   = frame_ns
+        self.handled_ns = handled_ns
+
+
+    def get_summary(self):
+        """
+        Returns the statistics of every stage with spans, in microseconds.
+        """
+
+        return {stage: histogram.get_summary() for stage, histogram in self.histograms.items() if histogram.count}
+
+
+    def reset(self):
+        """
+        Clears the histograms.
+        """
+
+        self.histograms = {stage: LatencyHistogram() for stage in STAGES}
@@ -0,0 +1,109 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class OrderDiff:
+
+    __slots__ = ('posts', 'cancels', 'generation')
+
+    def __init__(self, posts, cancels, generation) -> None:
+        """
+        Orders to send and to cancel to move the resting orders to the target quotes.
+
+        INPUTS:
+            * posts (list): (direction, suit, price) orders to send
+            * cancels (list): (direction, suit) orders to cancel
+            * generation (int): generation of the open orders the diff was computed from
+        """
+
+        self.posts      = posts
+        self.cancels    = cancels
+        self.generation = generation
+
+    def __bool__(self):
+        return bool(self.posts) or bool(self.cancels)
+
+    def __repr__(self):
+        return f'OrderDiff(posts={self.posts}, cancels={self.cancels})'
+
+
+
+class OpenOrders:
+
+    def __init__(self) -> None:
+        """
+        Resting limit orders, keyed by (direction, suit). The exchange keeps one order
+        per player, suit and direction, so a new order replaces the old one.
+        """
+
+        self.prices     = {}
+        self.generation = 0
+
+
+    def reset(self):
+        """
+        Forgets every resting order (e.g. the exchange clears the book after a trade).
+        Results of diffs computed before the reset are ignored.
+        """
+
+        self.prices = {}
+        self.generation += 1
+
+
+    def get_price(self, direction, suit):
+        """
+        Returns the price of the resting order, None if there is no order.
+
+        INPUTS:
+            * direction (str): "buy" | "sell"
+            * suit (str): "spade" | "club" | "heart" | "diamond"
+        """
+
+        return self.prices.get((direction, suit))
+
+
+    def get_diff(self, target, keep=()):
+        """
+        Computes the minimal set of orders to send and cancel to reach the target quotes.
+
+        INPUTS:
+            * target (dict): (direction, suit) -> price of the orders we want in the market
+            * keep (iterable): (direction, suit) of resting orders that should not be cancelled
+                               even if they are not in the target
+
+        OUTPUTS:
+            * (OrderDiff)
+        """
+
+        keep = set(keep)
+
+        posts = [(direction, suit, price) for (direction, suit), price in target.items()
+                 if self.prices.get((direction, suit)) != price]
+
+        cancels = [key for key in self.prices if (key not in target) and (key not in keep)]
+
+        return OrderDiff(posts, cancels, self.generation)
+
+
+    def apply(self, diff, post_results, cancel_results):
+        """
+        Updates the resting orders with the results of an executed diff.
+
+        INPUTS:
+            * diff (OrderDiff)
+            * post_results (list): boolean for each sent order
+            * cancel_results (list): boolean for each cancellation
+        """
+
+        # The book was cleared while the diff was executing
+        if diff.generation != self.generation:
+            return
+
+        for (direction, suit, price), bool_limit in zip(diff.posts, post_results):
+            if bool_limit:
+                self.prices[(direction, suit)] = price
+
+        for key, bool_cancel in zip(diff.cancels, cancel_results):
+            if bool_cancel:
+                self.prices.pop(key, None)
@@ -0,0 +1,161 @@
+import sys
+import json
+import zlib
+import inspect
+import logging
+import argparse
+import numpy as np
+
+from GoalSuitEstimator import GoalSuitEstimator
+from GoalSuitPremium import GoalSuitPremium
+from PortfolioEval import PortfolioEval
+from GameStrategy import QuoteEntry, compute_quotes
+from QuoteParams import QuoteParams
+from PortfolioVariants import VARIANTS
+from PrecomputedTables import PRECOMPUTED_FOLDER, load_derived, get_source
+
+logger = logging.getLogger(__name__)
+
+
+# Cards dealt to each player
+HAND_SIZE = 10
+
+# Columns of the table: hand, then the quotes of the inventory holding only the hand and the number of
+# sanity checks failed by the neutral and the adjusted quotes
+COLUMNS = (['hand_spades', 'hand_clubs', 'hand_hearts', 'hand_diamonds'] +
+           [f'probs_{idx}' for idx in range(4)] + [f'probs_10_{idx}' for idx in range(4)] + ['port_ev'] +
+           [f'neutral_{idx}' for idx in range(8)] + [f'adjusted_{idx}' for idx in range(8)] + ['compute_ns', 'neutral_checks', 'adjusted_checks'])
+
+
+def get_opening_hands():
+    """
+    Returns every suit composition of a dealt hand.
+
+    OUTPUTS:
+        * (numpy 2d int array, Kx4): cards of each suit [spades, clubs, hearts, diamonds]
+    """
+
+    hands = np.indices((HAND_SIZE + 1,) * 3).reshape(3, -1).T
+    hands = hands[hands.sum(axis=1) <= HAND_SIZE]
+
+    return np.column_stack([hands, HAND_SIZE - hands.sum(axis=1)])
+
+
+def get_inventory(hand):
+    """
+    Returns the inventory right after the cards were dealt: only my hand is known.
+    """
+
+    pl_cards = np.zeros((4, 4), dtype=np.int8)
+    pl_cards[0] = hand
+
+    return pl_cards
+
+
+def get_adjusted_checks(quotes, hand, portEval: PortfolioEval):
+    """
+    Returns the sanity checks failed by the adjusted quotes of an opening hand (see QuoteEntry.checks),
+    cheap to get again from the neutral quotes.
+    """
+
+    checks = []
+    portEval.get_adjusted_quotes(quotes.neutral_quotes, HAND_SIZE, quotes.probs, hand.tolist(), checks)
+
+    return checks
+
+
+def build_opening_table(hands, goalEst: GoalSuitEstimator, portEval: PortfolioEval):
+    """
+    Computes the quotes of every opening hand (see GameStrategy.compute_quotes).
+
+    INPUTS:
+        * hands (numpy 2d int array, Kx4): opening hands
+        * goalEst (GoalSuitEstimator)
+        * portEval (PortfolioEval)
+
+    OUTPUTS:
+        * (numpy 2d array): one row per hand, see COLUMNS
+    """
+
+    table = np.empty((len(hands), len(COLUMNS)))
+    for idx, hand in enumerate(hands):
+        quotes = compute_quotes(get_inventory(hand), goalEst, portEval, speculative=True)
+        n_adjusted = len(get_adjusted_checks(quotes, hand, portEval))
+        table[idx] = np.concatenate([hand, quotes.probs, quotes.probs_10, [quotes.port_ev],
+                                     quotes.neutral_quotes.ravel(), quotes.adj_quotes.ravel(),
+                                     [quotes.compute_ns, len(quotes.checks) - n_adjusted, n_adjusted]])
+
+    return table
+
+
+def get_table_source(portEval: PortfolioEval):
+    """
+    Identifies what the quotes of a table depend on: evaluator, parameters, probability and
+    premium tables, and the code computing them.
+    """
+
+    modules = [inspect.getfile(klass) for klass in type(portEval).__mro__ if issubclass(klass, PortfolioEval)]
+    modules.append(inspect.getfile(compute_quotes))
+
+    return {'evaluator':    type(portEval).__name__,
+            'params':       portEval.params.to_dict(),
+            'goal_dist':    zlib.crc32(np.ascontiguousarray(portEval.gsEst.preProb)),
+            'goal_premium': zlib.crc32(np.ascontiguousarray(portEval.gsPrem.dist)),
+            'code':         [get_source(path) for path in modules]}
+
+
+def load_opening_quotes(goalEst: GoalSuitEstimator, portEval: PortfolioEval, folder=PRECOMPUTED_FOLDER):
+    """
+    Loads the quotes of every opening hand of an evaluator, building the table (and its binary
+    file) if it is missing or was built from different tables, parameters or code.
+
+    INPUTS:
+        * goalEst (GoalSuitEstimator)
+        * portEval (PortfolioEval)
+        * folder (str)
+
+    OUTPUTS:
+        * (dict): QuoteEntry by inventory (bytes of the int8 inventory matrix), for QuoteCache
+    """
+
+    name = f'OpeningQuotes_{type(portEval).__name__}_{portEval.params.get_hash()[:12]}'
+    table = load_derived(name, get_opening_hands(), lambda hands: build_opening_table(hands, goalEst, portEval),
+                         folder=folder, source=get_table_source(portEval))
+
+    opening = {}
+    for row in table:
+        quotes = QuoteEntry()
+        quotes.probs          = row[4:8].tolist()
+        quotes.probs_10       = row[8:12].tolist()
+        quotes.port_ev        = np.float64(row[12])
+        quotes.neutral_quotes = row[13:21].reshape(4, 2).copy()
+        quotes.adj_quotes     = row[21:29].reshape(4, 2).astype(int)
+        quotes.compute_ns     = int(row[29])
+
+        # Messages of the failed sanity checks: the neutral ones need the whole computation (seldom)
+        hand     = row[:4].astype(int)
+        pl_cards = get_inventory(hand)
+        if row[30] > 0:
+            quotes.checks = compute_quotes(pl_cards, goalEst, portEval).checks
+        elif row[31] > 0:
+            quotes.checks = get_adjusted_checks(quotes, hand, portEval)
+        opening[pl_cards.tobytes()] = quotes
+
+    return opening
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Builds the opening-hand quote tables (precomputed folder).')
+    parser.add_argument('--variants', nargs='+', default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument('--params', default='{}', help='QuoteParams values (JSON)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+
+    goalEst, gsPremium = GoalSuitEstimator(), GoalSuitPremium()
+    params = QuoteParams.from_dict(json.loads(args.params))
+    for variant in args.variants:
+        portEval = VARIANTS[variant](gsPremium, goalEst, params)
+        logger.info(f'{variant}: {len(load_opening_quotes(goalEst, portEval))} opening hands.')
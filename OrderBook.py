@@ -0,0 +1,140 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# Sentinels of an empty side of the book
+NO_BID = -999
+NO_ASK = 999
+
+# Sides of the book
+BID = 0
+ASK = 1
+
+
+class OrderBook:
+
+    def __init__(self) -> None:
+        """
+        Level 2 order book of the four suits [spades, clubs, hearts, diamonds], kept between messages.
+        Every order is for one card. For each suit and side the book keeps:
+            * the best resting order of each player {player index: price}
+            * the price levels {price: number of orders}
+            * the best bid and ask.
+        A side is only rebuilt when its snapshot differs from the previous one.
+        """
+
+        self.reset()
+
+
+    def reset(self):
+        """
+        Empties the book.
+        """
+
+        self.resting   = [[{}, {}] for _ in range(4)]      # [suit][side] -> {player index: price}
+        self.levels    = [[{}, {}] for _ in range(4)]      # [suit][side] -> {price: size}
+        self.best      = np.array([[NO_BID, NO_ASK]] * 4, dtype=np.int16)
+        self.snapshots = [[None, None] for _ in range(4)]  # [suit][side] -> last snapshot
+        self.n_updates = 0
+        self.n_skipped = 0
+
+
+    def update(self, idx_suit, bids, asks):
+        """
+        Applies a snapshot of a suit, skipping the sides that did not change.
+
+        INPUTS:
+            * idx_suit (int): column of the suit
+            * bids, asks (tuple): (price, player index) of the resting orders
+
+        OUTPUTS:
+            * (boolean): if the book of the suit changed
+        """
+
+        changed = False
+        for side, orders in ((BID, bids), (ASK, asks)):
+            if orders == self.snapshots[idx_suit][side]:
+                self.n_skipped += 1
+                continue
+            self.snapshots[idx_suit][side] = orders
+            self.update_side(idx_suit, side, orders)
+            self.n_updates += 1
+            changed = True
+
+        return changed
+
+
+    def update_side(self, idx_suit, side, orders):
+        """
+        Rebuilds a side of a suit from its resting orders. Sides hold a handful of orders,
+        so rebuilding a changed side costs less than diffing it.
+
+        INPUTS:
+            * idx_suit (int): column of the suit
+            * side (int): BID | ASK
+            * orders (tuple): (price, player index) of the resting orders
+        """
+
+        resting = {}
+        levels  = {}
+        for price, idx_player in orders:
+            levels[price] = levels.get(price, 0) + 1
+            # Best order of each player
+            if (idx_player not in resting) or ((price > resting[idx_player]) if side == BID else (price < resting[idx_player])):
+                resting[idx_player] = price
+
+        self.resting[idx_suit][side] = resting
+        self.levels[idx_suit][side]  = levels
+        if levels:
+            self.best[idx_suit, side] = max(levels) if side == BID else min(levels)
+        else:
+            self.best[idx_suit, side] = NO_BID if side == BID else NO_ASK
+
+
+    def get_best_bid(self, idx_suit):
+        """
+        Returns the best bid of a suit, NO_BID if there is none.
+        """
+        return int(self.best[idx_suit, BID])
+
+
+    def get_best_ask(self, idx_suit):
+        """
+        Returns the best ask of a suit, NO_ASK if there is none.
+        """
+        return int(self.best[idx_suit, ASK])
+
+
+    def get_depth(self, idx_suit, side, price):
+        """
+        Returns the number of orders resting at a price.
+
+        INPUTS:
+            * idx_suit (int): column of the suit
+            * side (int): BID | ASK
+            * price (int)
+        """
+        return self.levels[idx_suit][side].get(price, 0)
+
+
+    def get_resting(self, idx_suit, side):
+        """
+        Returns the resting orders of a side {player index: price}. It must not be modified.
+        """
+        return self.resting[idx_suit][side]
+
+
+    def get_resting_players(self, idx_suit, side):
+        """
+        Returns the player indices with an order resting on a side.
+        """
+        return self.resting[idx_suit][side].keys()
+
+
+    def get_stats(self):
+        """
+        Returns the number of applied and skipped (unchanged) side snapshots.
+        """
+        return {'updates': self.n_updates, 'skipped': self.n_skipped}
@@ -0,0 +1,302 @@
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import argparse
+import itertools
+import collections
+import multiprocessing
+import numpy as np
+
+from QuoteParams import QuoteParams
+from PortfolioVariants import VARIANTS
+from SelfPlaySimulator import worker_tables, init_worker, run_chunk
+from SessionReplayer import SessionReplayer
+
+logger = logging.getLogger(__name__)
+
+
+# Results of the sweeps, one JSON line per evaluated parameter set
+SWEEP_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sweeps')
+
+
+
+def grid_search(space):
+    """
+    Every combination of the values of the space.
+
+    INPUTS:
+        * space (dict): name of the parameter -> list of values
+
+    OUTPUTS:
+        * (list): QuoteParams
+    """
+
+    names = sorted(space)
+    return [QuoteParams.from_dict(dict(zip(names, values))) for values in itertools.product(*(space[name] for name in names))]
+
+
+
+def random_search(space, n_samples, seed=0):
+    """
+    Parameter sets drawn uniformly from the space. Integer bounds give integer values.
+
+    INPUTS:
+        * space (dict): name of the parameter -> (low, high)
+        * n_samples (int)
+        * seed (int)
+
+    OUTPUTS:
+        * (list): QuoteParams
+    """
+
+    rng = random.Random(seed)
+    names = sorted(space)
+    candidates = []
+    for _ in range(n_samples):
+        values = {}
+        for name in names:
+            low, high = space[name]
+            if isinstance(low, int) and isinstance(high, int):
+                values[name] = rng.randint(low, high)
+            else:
+                values[name] = round(rng.uniform(low, high), 4)
+        candidates.append(QuoteParams.from_dict(values))
+    return candidates
+
+
+
+def get_key(params, settings):
+    """
+    Key of a result: hash of the parameters and of the evaluation settings, so results of
+    another evaluation (rounds, opponents, sessions...) are never reused.
+    """
+
+    content = json.dumps({'params': params.get_hash(), 'settings': settings}, sort_keys=True)
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+
+class SweepCache:
+
+    def __init__(self, path) -> None:
+        """
+        Results of a sweep, appended to a JSON lines file as soon as each one is known.
+        An interrupted sweep reads them back and only evaluates the missing parameter sets.
+
+        INPUTS:
+            * path (str)
+        """
+
+        self.path    = path
+        self.results = {}
+
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    # The last line can be truncated if the sweep was killed
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(f'Skipping a malformed line of {path}.')
+                        continue
+                    self.results[record['key']] = record
+            logger.info(f'{len(self.results)} cached results in {path}.')
+
+
+    def __contains__(self, key):
+        return key in self.results
+
+
+    def add(self, record):
+        """
+        Appends a result and flushes it to disk.
+        """
+
+        self.results[record['key']] = record
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+
+def evaluate_simulated(params, settings):
+    """
+    Self-play of a parameter set: the candidate against the opponents, in every seat. Every
+    candidate plays the same deals (same seeds), so differences are not due to the cards.
+
+    INPUTS:
+        * params (QuoteParams)
+        * settings (dict): variant, opponents, rounds, ticks, seed
+
+    OUTPUTS:
+        * (dict): PnL per round of the candidate (mean, 95% CI), rounds, failed strategy runs and their errors
+    """
+
+    seats = [settings['variant']] + settings['opponents']
+    seat_params = [params] + [None] * len(settings['opponents'])
+    n_seats = len(seats)
+
+    pnls, errors = [], collections.Counter()
+    for shift in range(n_seats):
+        n_rounds = settings['rounds'] // n_seats + (shift < settings['rounds'] % n_seats)
+        if n_rounds == 0:
+            continue
+        variants = seats[shift:] + seats[:shift]
+        chunk_params = seat_params[shift:] + seat_params[:shift]
+        pnl, _, chunk_errors = run_chunk((variants, n_rounds, settings['ticks'], settings['seed'] + shift, chunk_params))
+        idx_seat = (n_seats - shift) % n_seats
+        pnls.append(pnl[:, idx_seat])
+        errors.update(chunk_errors[idx_seat])
+
+    values = np.concatenate(pnls)
+    half_width = 1.96 * values.std(ddof=1) / np.sqrt(len(values)) if len(values) > 1 else float('nan')
+    return {'score':       float(values.mean()),
+            'ci95':        [float(values.mean() - half_width), float(values.mean() + half_width)],
+            'rounds':      len(values),
+            'failed_runs': sum(errors.values()),
+            'errors':      dict(errors)}
+
+
+
+def evaluate_recorded(params, settings):
+    """
+    Replay of a parameter set over recorded sessions, scored with the mark-out of its orders
+    against the recorded trades (see SessionReplayer.get_markout).
+
+    INPUTS:
+        * params (QuoteParams)
+        * settings (dict): variant, sessions
+
+    OUTPUTS:
+        * (dict): mark-out PnL, fills and orders over all the sessions
+    """
+
+    score, n_fills, n_orders = 0, 0, 0
+    for path in settings['sessions']:
+        replayer = SessionReplayer(path, settings['variant'], params, worker_tables['goalEst'], worker_tables['gsPremium'])
+        stats = asyncio.run(replayer.run())
+        markout = replayer.get_markout()
+        score += markout['pnl']
+        n_fills += markout['fills']
+        n_orders += stats.get('orders', 0)
+
+    return {'score': score, 'fills': n_fills, 'orders': n_orders}
+
+
+
+def evaluate(args):
+    """
+    Evaluates a parameter set in a worker.
+
+    INPUTS:
+        * args (tuple): key, parameter values (dict), settings (dict)
+
+    OUTPUTS:
+        * (dict): record of the cache
+    """
+
+    key, values, settings = args
+    if not worker_tables:
+        init_worker(logging.WARNING)
+
+    params = QuoteParams.from_dict(values)
+    start = time.perf_counter()
+    if settings['mode'] == 'simulated':
+        result = evaluate_simulated(params, settings)
+    else:
+        result = evaluate_recorded(params, settings)
+
+    return {'key': key, 'params': values, 'result': result, 'elapsed': time.perf_counter() - start}
+
+
+
+def run_sweep(candidates, settings, cache_path, n_processes=None):
+    """
+    Evaluates the parameter sets not in the cache over a process pool (all the cores by
+    default), writing each result to the cache as it finishes.
+
+    INPUTS:
+        * candidates (list): QuoteParams
+        * settings (dict): mode ("simulated" | "recorded") and its evaluation settings
+        * cache_path (str): JSON lines file of the results
+        * n_processes (int): worker processes, all the cores if None
+
+    OUTPUTS:
+        * (list): records of the candidates, best score first
+    """
+
+    cache = SweepCache(cache_path)
+
+    keys = [get_key(params, settings) for params in candidates]
+    pending, seen = [], set()
+    for key, params in zip(keys, candidates):
+        if (key not in cache) and (key not in seen):
+            pending.append((key, params.to_dict(), settings))
+            seen.add(key)
+    logger.info(f'{len(candidates)} parameter sets, {len(candidates) - len(pending)} cached, {len(pending)} to evaluate.')
+
+    if pending:
+        with multiprocessing.Pool(min(n_processes or os.cpu_count(), len(pending)), initializer=init_worker, initargs=(logging.WARNING,)) as pool:
+            for n_done, record in enumerate(pool.imap_unordered(evaluate, pending), 1):
+                cache.add(record)
+                logger.info(f'[{n_done}/{len(pending)}] score {record["result"]["score"]:.2f} {record["params"]}')
+
+    records = [cache.results[key] for key in dict.fromkeys(keys)]
+    return sorted(records, key=lambda x: x['result']['score'], reverse=True)
+
+
+
+def parse_space(specs, is_range):
+    """
+    Parses "name=v1,v2,..." (grid) or "name=low:high" (random) arguments.
+    """
+
+    space = {}
+    for spec in specs:
+        name, values = spec.split('=', 1)
+        values = [json.loads(value) for value in values.split(':' if is_range else ',')]
+        space[name] = tuple(values) if is_range else values
+    return space
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Parameter sweep of the quoting constants.')
+    search = parser.add_mutually_exclusive_group(required=True)
+    search.add_argument('--grid', nargs='+', metavar='NAME=V1,V2', help='grid search values')
+    search.add_argument('--random', nargs='+', metavar='NAME=LOW:HIGH', help='random search ranges')
+    parser.add_argument('--samples', type=int, default=32, help='parameter sets of a random search')
+    parser.add_argument('--variant', default='base', choices=list(VARIANTS))
+    parser.add_argument('--opponents', nargs='+', default=['base', 'monocolor', 'monocolor2'], choices=list(VARIANTS))
+    parser.add_argument('--sessions', nargs='+', help='recorded sessions, evaluates over them instead of self-play')
+    parser.add_argument('--rounds', type=int, default=400, help='self-play rounds per parameter set')
+    parser.add_argument('--ticks', type=int, default=50, help='maximum ticks of a round')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--cache', default=os.path.join(SWEEP_FOLDER, 'results.jsonl'))
+    parser.add_argument('--top', type=int, default=10, help='best parameter sets printed')
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+
+    if args.grid:
+        candidates = grid_search(parse_space(args.grid, is_range=False))
+    else:
+        candidates = random_search(parse_space(args.random, is_range=True), args.samples, args.seed)
+
+    if args.sessions:
+        settings = {'mode': 'recorded', 'variant': args.variant, 'sessions': [os.path.abspath(path) for path in args.sessions]}
+    else:
+        settings = {'mode': 'simulated', 'variant': args.variant, 'opponents': args.opponents,
+                    'rounds': args.rounds, 'ticks': args.ticks, 'seed': args.seed}
+
+    records = run_sweep(candidates, settings, args.cache, args.processes)
+    print(json.dumps(records[:args.top], indent=2))
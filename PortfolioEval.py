@@ -3,14 +3,51 @@ import math
 import logging
 from GoalSuitPremium import GoalSuitPremium
 from GoalSuitEstimator import GoalSuitEstimator
+from QuoteParams import QuoteParams
 
 logger = logging.getLogger(__name__)
 
+# Every (suit, opponent) pair of a one card trade, suit major
+TRADE_SUITS = np.repeat(np.arange(4), 3)
+TRADE_OPPS  = np.tile(np.arange(1, 4), 4)
+
+
+def report_check(checks, log, level, message):
+    """
+    Reports a failed sanity check: logged right away, or kept in checks to be logged when the
+    quotes are used (see log_checks).
+
+    INPUTS:
+        * checks (list): (logger name, level, path, line, message) of the failed checks, None to log
+        * log (logging.Logger): logger of the evaluator
+        * level (int): logging level
+        * message (str)
+    """
+
+    if checks is None:
+        log.log(level, message, stacklevel=2)
+    else:
+        path, lineno = log.findCaller(stacklevel=2)[:2]
+        checks.append((log.name, level, path, lineno, message))
+
+
+def log_checks(checks):
+    """
+    Logs the failed sanity checks kept by report_check, as if they were logged where they failed.
+    """
+
+    for name, level, path, lineno, message in checks:
+        log = logging.getLogger(name)
+        if log.isEnabledFor(level):
+            log.handle(log.makeRecord(name, level, path, lineno, message, None, None))
+
+
 class PortfolioEval:
 
-    def __init__(self, gsPremium: GoalSuitPremium, gsEst: GoalSuitEstimator) -> None:
+    def __init__(self, gsPremium: GoalSuitPremium, gsEst: GoalSuitEstimator, params: QuoteParams = None) -> None:
         self.gsPrem = gsPremium
         self.gsEst  = gsEst
+        self.params = params if params is not None else QuoteParams()
 
 
     def evaluate_portfolio(self, own_cards, pl_cards, probs, probs_10):
@@ -24,11 +61,37 @@ class PortfolioEval:
             * probs_10 (list): probability of each suit having 10 cards
         """
 
-        return 10*np.dot(own_cards, probs) + np.sum([probs[ii]*self.gsPrem.get_goal_suit_premium(own_cards[ii], list(pl_cards[:,ii]), probs_10[ii]) for ii in range(4)])
+        return 10*np.dot(own_cards, probs) + np.sum([probs[ii]*self.gsPrem.get_goal_suit_premium(own_cards[ii], pl_cards[:,ii], probs_10[ii]) for ii in range(4)])
     
 
 
-    def get_neutral_quotes(self, port_ev, pl_cards, probs, probs_10):
+    def evaluate_portfolio_batch(self, own_cards, pl_cards, probs, probs_10):
+        """
+        Evaluates the value of a batch of portfolios in dollars.
+
+        INPUTS:
+            * own_cards (numpy 2d array, Kx4): number of cards you have in each portfolio
+            * pl_cards (numpy 3d array, Kx4x4): number of cards each player has of each suit
+            * probs (numpy 2d array, Kx4): probability of goal suit
+            * probs_10 (numpy 2d array, Kx4): probability of each suit having 10 cards
+
+        OUTPUTS:
+            * (numpy 1d array, K) value of each portfolio
+        """
+
+        premiums = self.gsPrem.get_goal_suit_premium_batch(own_cards, pl_cards.transpose(0, 2, 1), probs_10)
+
+        # Row-wise dot product through matmul keeps the same accumulation as evaluate_portfolio
+        own_value = np.matmul(own_cards[:, None, :].astype(float), probs[:, :, None])[:, 0, 0]
+
+        # Suit terms added one by one, in the order np.sum adds the four terms of evaluate_portfolio
+        suit_values = probs*premiums
+
+        return 10*own_value + (((suit_values[:, 0] + suit_values[:, 1]) + suit_values[:, 2]) + suit_values[:, 3])
+
+
+
+    def get_neutral_quotes(self, port_ev, pl_cards, probs, probs_10, checks=None):
         """
         Computes the neutral quotes (portfolio will have the same EV) for each suit.
 
@@ -37,70 +100,69 @@ class PortfolioEval:
             * pl_cards (numpy 2d array): number of cards each player has of each suit
             * probs (list): probability of goal suit, array [spades, clubs, hearts, diamonds]
             * probs_10 (list): probability of each suit having 10 cards
+            * checks (list): failed sanity checks are added to it instead of logged (see report_check)
 
         OUTPUTS:
             * (numpy 2d array) equilibrium price for each action
         """
 
-        # Neutral quotes
-        neutral_quotes = np.array([ [np.nan, np.nan],
-                                    [np.nan, np.nan],
-                                    [np.nan, np.nan],
-                                    [np.nan, np.nan]])        
-
-        for suit in range(4):
-
-            # Selling case
-            least_port_eval = np.nan
-            if pl_cards[0, suit] > 0: # At least I have one card to sell
-                for idx_opp in range(1,4):
-                    new_port_eval = self.evaluate_portfolio([n if idx != suit else n-1 for idx, n in enumerate(pl_cards[0,:])], # substract one card to suit
-                                            np.array([[pl_cards[i, j] + 1 if i == idx_opp and j == suit else pl_cards[i, j] for j in range(pl_cards.shape[1])] for i in range(pl_cards.shape[0])]), 
-                                            probs, 
-                                            probs_10)
-                    
-                    least_port_eval = np.nanmin([least_port_eval, new_port_eval])
-                
-                    if new_port_eval > port_ev:
-                        logger.error('By giving one card your portfolio cannot have greater value!')
-            
-                neutral_quotes[suit][1] = port_ev - least_port_eval
-
-
-            # Buying case
-            least_port_eval = np.nan
-            for idx_opp in range(1,4):
-
-                if pl_cards[idx_opp, suit] == 0: # in the case someone sell to us one card we did not see before
-                    try:
-                        new_probs, new_probs_10 = self.gsEst.get_goalsuit_prob([n if idx != suit else n+1 for idx, n in enumerate(np.sum(pl_cards,axis=0))])
-                    except: # special cases were adding more cards than feasible
-                        continue
-                else: # in this case we already saw the card
-                    new_probs, new_probs_10 = probs, probs_10
-
-                new_port_eval = self.evaluate_portfolio([n if idx != suit else n+1 for idx, n in enumerate(pl_cards[0,:])], # add one card to suit
-                                        np.array([[pl_cards[i, j] - 1 if (i == idx_opp) and (j == suit) and (pl_cards[i, j] > 0) else pl_cards[i, j] for j in range(pl_cards.shape[1])] for i in range(pl_cards.shape[0])]), 
-                                        new_probs, 
-                                        new_probs_10)
-
-                least_port_eval = np.nanmin([least_port_eval, new_port_eval])
-                
-                if (new_port_eval < port_ev) & (pl_cards[idx_opp, suit] != 0):
-                    logger.error('By having one more card your portfolio cannot have lower value!')
-
-            neutral_quotes[suit][0] = np.nanmax([least_port_eval - port_ev, 0.0])
+        pl_cards = np.asarray(pl_cards, dtype=int)
+        probs    = np.asarray(probs, dtype=float)
+        probs_10 = np.asarray(probs_10, dtype=float)
+
+        suits, opps = TRADE_SUITS, TRADE_OPPS
+        n_cases = len(suits)
+
+        # One card of the suit moving between me and the opponent
+        deltas = np.zeros((n_cases, 4, 4), dtype=int)
+        deltas[np.arange(n_cases), opps, suits] = 1
+        my_delta = np.eye(4, dtype=int)[suits]
+        opp_cards = pl_cards[opps, suits]
+
+        # Probabilities in the case someone sells us one card of each suit we did not see before
+        unseen_probs, unseen_probs_10, unseen_feasible = self.gsEst.get_goalsuit_prob_batch(np.sum(pl_cards, axis=0) + np.eye(4, dtype=int))
+        unseen = (opp_cards == 0)[:, None]
+
+        # Selling case: substract one card to suit, the opponent gets it
+        # Buying case: add one card to suit, the opponent loses it if we had seen it
+        own_batch   = np.concatenate([pl_cards[0] - my_delta, pl_cards[0] + my_delta])
+        pl_batch    = np.concatenate([pl_cards + deltas, pl_cards - deltas*(opp_cards > 0)[:, None, None]])
+        probs_batch = np.concatenate([np.broadcast_to(probs, (n_cases, 4)),
+                                      np.where(unseen, unseen_probs[suits], probs)])
+        probs_10_batch = np.concatenate([np.broadcast_to(probs_10, (n_cases, 4)),
+                                         np.where(unseen, unseen_probs_10[suits], probs_10)])
+
+        new_port_evals = self.evaluate_portfolio_batch(own_batch, pl_batch, probs_batch, probs_10_batch)
+        sell_evals = new_port_evals[:n_cases].reshape(4, 3)
+        buy_evals  = new_port_evals[n_cases:].reshape(4, 3)
+
+        # Special cases were adding more cards than feasible
+        buy_feasible = ~unseen[:, 0] | unseen_feasible[suits]
+        buy_evals[~buy_feasible.reshape(4, 3)] = np.nan
+
+        # Sanity checks
+        can_sell = pl_cards[0] > 0
+        for _ in range(np.count_nonzero((sell_evals > port_ev) & can_sell[:, None])):
+            report_check(checks, logger, logging.ERROR, 'By giving one card your portfolio cannot have greater value!')
+        for _ in range(np.count_nonzero((buy_evals < port_ev) & (opp_cards != 0).reshape(4, 3))):
+            report_check(checks, logger, logging.ERROR, 'By having one more card your portfolio cannot have lower value!')
+
+        # Neutral quotes (least valued portfolio for each suit and side)
+        neutral_quotes = np.empty((4, 2))
+        neutral_quotes[:, 0] = np.fmax(np.fmin.reduce(buy_evals, axis=1) - port_ev, 0.0)
+        neutral_quotes[:, 1] = np.where(can_sell, port_ev - np.fmin.reduce(sell_evals, axis=1), np.nan)
         
         return neutral_quotes
 
 
-    def get_adjusted_quotes(self, neutral_quotes, n_seen_cards, probs, own_cards):
+    def get_adjusted_quotes(self, neutral_quotes, n_seen_cards, probs, own_cards, checks=None):
         """
         Adjust the quotes based on a spread constant and the number of card seen.
 
         INPUTS:
             * neutral_quotes (list): neutral quotes for each suit
             * n_seen_cards (int): number of seen cards
+            * checks (list): failed sanity checks are added to it instead of logged (see report_check)
 
         OUTPUTS:
             * (list): adjusted quotes
@@ -115,13 +177,13 @@ class PortfolioEval:
         for suit in range(4):
 
             if not math.isnan(neutral_quotes[suit][0]):
-                adj_quotes[suit][0] = int(math.floor(neutral_quotes[suit][0] * (n_seen_cards/40)))
+                adj_quotes[suit][0] = int(math.floor(neutral_quotes[suit][0] * (n_seen_cards/40)**self.params.bid_exponent))
 
             if not math.isnan(neutral_quotes[suit][1]):
-                adj_quotes[suit][1] = int(math.ceil(neutral_quotes[suit][1] * (1 + (1-n_seen_cards/40))))
+                adj_quotes[suit][1] = int(math.ceil(neutral_quotes[suit][1] * (1 + self.params.ask_weight*(1-n_seen_cards/40))))
 
             if adj_quotes[suit][1] <= adj_quotes[suit][0]:
-                logger.warning(f'Bid-Ask quotes were not correctly adjusted!: {adj_quotes[suit][0]} - {adj_quotes[suit][1]}')
+                report_check(checks, logger, logging.WARNING, f'Bid-Ask quotes were not correctly adjusted!: {adj_quotes[suit][0]} - {adj_quotes[suit][1]}')
 
         return adj_quotes
     
@@ -206,10 +268,10 @@ class PortfolioEval:
                                         adj_quotes[idx][0]]) # EV, direction, suit, price
 
 
-        # Get the four limiting orders with more EV
+        # Get the limiting orders with more EV (four by default)
         if limiting_orders:
             limiting_orders = sorted(limiting_orders, key=lambda x: x[0], reverse=True)
-            limiting_orders = limiting_orders[:4]
+            limiting_orders = limiting_orders[:self.params.n_limit_orders]
             return True, \
                 [sublist[1] for sublist in limiting_orders], \
                 [sublist[2] for sublist in limiting_orders], \
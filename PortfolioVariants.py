@@ -0,0 +1,9 @@
+from PortfolioEval import PortfolioEval
+from PortfolioEval_Monocolor import PortfolioEval_3
+from PortfolioEval_Monocolor2 import PortfolioEval_4
+
+
+# Quoting strategies by name: the ones a bot can run, seat at a self-play table or replay
+VARIANTS = {'base':       PortfolioEval,
+            'monocolor':  PortfolioEval_3,
+            'monocolor2': PortfolioEval_4}
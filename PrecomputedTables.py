@@ -0,0 +1,190 @@
+import os
+import json
+import zlib
+import inspect
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# Folder of the precomputed tables
+PRECOMPUTED_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'precomputed')
+
+# Binary format: MAGIC, header length (uint32, little endian), JSON header, padding, raw C-order data
+MAGIC = b'FIGTABLE'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+
+def write_table(path, array, columns=None, source=None):
+    """
+    Writes an array in the binary table format. The file is replaced atomically.
+
+    INPUTS:
+        * path (str)
+        * array (numpy array): float64 data
+        * columns (list): names of the columns, if any
+        * source (dict): identifies the data the array was built from, to detect stale files
+    """
+
+    data = np.ascontiguousarray(array, dtype='<f8')
+    header = {'version': FORMAT_VERSION,
+              'dtype':   data.dtype.str,
+              'shape':   list(data.shape),
+              'columns': columns,
+              'source':  source,
+              'crc32':   zlib.crc32(data)}
+
+    # Pad the header so the data starts aligned
+    header_bytes = json.dumps(header).encode()
+    prefix_len = len(MAGIC) + 4
+    header_bytes += b' ' * (-(prefix_len + len(header_bytes)) % ALIGNMENT)
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header_bytes).to_bytes(4, 'little'))
+        f.write(header_bytes)
+        f.write(data.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_header(path):
+    """
+    Reads the header of a binary table.
+
+    INPUTS:
+        * path (str)
+
+    OUTPUTS:
+        * (dict): header
+        * (int): offset of the data
+    """
+
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a precomputed table.')
+        header_len = int.from_bytes(f.read(4), 'little')
+        header = json.loads(f.read(header_len))
+
+    if header.get('version') != FORMAT_VERSION:
+        raise ValueError(f'{path} has format version {header.get("version")}, expected {FORMAT_VERSION}.')
+
+    return header, len(MAGIC) + 4 + header_len
+
+
+def open_table(path, verify=True):
+    """
+    Maps a binary table in memory (read only, shared between processes).
+
+    INPUTS:
+        * path (str)
+        * verify (boolean): checks the checksum of the data
+
+    OUTPUTS:
+        * (numpy array): read-only view of the mapped data
+        * (dict): header
+    """
+
+    header, offset = read_header(path)
+    array = np.memmap(path, dtype=np.dtype(header['dtype']), mode='r', offset=offset,
+                      shape=tuple(header['shape'])).view(np.ndarray)
+
+    if verify and zlib.crc32(array) != header['crc32']:
+        raise ValueError(f'{path} is corrupted (checksum mismatch).')
+
+    return array, header
+
+
+def get_source(path):
+    """
+    Identifies a source file by its size and modification time (cheaper than hashing it).
+    """
+
+    stat = os.stat(path)
+    return {'file': os.path.basename(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def load_table(name, folder=PRECOMPUTED_FOLDER, verify=True):
+    """
+    Loads a precomputed table from its binary file. If the file is missing, stale or invalid,
+    the CSV is converted once (without pandas) and the binary file is written.
+
+    INPUTS:
+        * name (str): "GoalDist" | "GoalPremium"
+        * folder (str)
+        * verify (boolean): checks the checksum of the data
+
+    OUTPUTS:
+        * (numpy 2d array): values of the table
+    """
+
+    bin_path = os.path.join(folder, f'{name}.bin')
+    csv_path = os.path.join(folder, f'{name}.csv')
+    source = get_source(csv_path) if os.path.exists(csv_path) else None
+
+    if os.path.exists(bin_path):
+        try:
+            array, header = open_table(bin_path, verify)
+            if source is None or header['source'] == source:
+                return array
+            logger.info(f'{bin_path} is older than {csv_path}.')
+        except (ValueError, OSError) as e:
+            logger.warning(f'{e} It is rebuilt from the CSV.')
+
+    # Fallback: convert the CSV
+    with open(csv_path) as f:
+        columns = f.readline().strip().split(',')
+    values = np.loadtxt(csv_path, delimiter=',', skiprows=1, ndmin=2)
+
+    try:
+        write_table(bin_path, values, columns, source)
+        logger.info(f'{csv_path} was converted to {bin_path}.')
+    except OSError as e:
+        logger.warning(f'{bin_path} could not be written: {e}')
+        return values
+
+    return open_table(bin_path, verify=False)[0]
+
+
+def load_derived(name, source_table, build, folder=PRECOMPUTED_FOLDER, verify=True, source=None):
+    """
+    Loads an array derived from a table (e.g. a lookup tensor), building and saving it
+    if it is missing or was built from different data or code.
+
+    INPUTS:
+        * name (str): name of the binary file, without extension
+        * source_table (numpy array): table the array is built from
+        * build (callable): builds the array from the table
+        * folder (str)
+        * verify (boolean): checks the checksum of the data
+        * source (dict): identifies everything the array depends on. If None, the checksum of the
+                         table and the module defining build (a change of the code rebuilds the array)
+
+    OUTPUTS:
+        * (numpy array)
+    """
+
+    bin_path = os.path.join(folder, f'{name}.bin')
+    if source is None:
+        source = {'crc32': zlib.crc32(np.ascontiguousarray(source_table)),
+                  'code':  get_source(inspect.getfile(build))}
+
+    if os.path.exists(bin_path):
+        try:
+            array, header = open_table(bin_path, verify)
+            if header['source'] == source:
+                return array
+        except (ValueError, OSError) as e:
+            logger.warning(f'{e} It is rebuilt.')
+
+    array = build(source_table)
+
+    try:
+        write_table(bin_path, array, source=source)
+    except OSError as e:
+        logger.warning(f'{bin_path} could not be written: {e}')
+        return array
+
+    return open_table(bin_path, verify=False)[0]
@@ -0,0 +1,283 @@
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import logging.handlers
+import threading
+import numpy as np
+
+# Writer of the process, None when logging is synchronous
+writer = None
+
+# Kind of the queued items that are not log records
+TICK = 'tick'
+
+
+
+def json_message(template, *values):
+    """
+    Formats a message inserting the values as JSON (strings are inserted as they are).
+    """
+
+    return template % tuple(value if isinstance(value, str) else json.dumps(value) for value in values)
+
+
+
+def quotes_message(template, quotes):
+    """
+    Formats a message inserting quotes (4x2 array) as [bid, ask] pairs with two decimals.
+    """
+
+    return template % ' '.join(['[' + ', '.join(f'{num:.2f}' for num in row) + ']' for row in quotes])
+
+
+
+def to_json(value):
+    """
+    JSON conversion of the numpy values of a tick dump.
+    """
+
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+
+class LogWriter:
+
+    def __init__(self, handlers, tick_path=None) -> None:
+        """
+        Background thread formatting and writing the queued log records, and the per-tick
+        state dumps to a JSON lines file.
+
+        INPUTS:
+            * handlers (list): logging handlers the records are written to
+            * tick_path (str): JSON lines file of the tick dumps, None to disable them
+        """
+
+        self.queue     = queue.SimpleQueue()
+        self.handlers  = handlers
+        self.tick_path = tick_path
+        self.tick_file = None
+        self.thread    = threading.Thread(target=self.run, name='LogWriter', daemon=True)
+
+        if tick_path is not None:
+            folder = os.path.dirname(tick_path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self.tick_file = open(tick_path, 'a')
+
+        # Counters
+        self.n_records = 0
+        self.n_ticks   = 0
+
+
+    def start(self):
+        self.thread.start()
+
+
+    def stop(self):
+        """
+        Writes what is left in the queue and stops the thread.
+        """
+
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        for handler in self.handlers:
+            handler.flush()
+        if self.tick_file is not None:
+            self.tick_file.close()
+
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            try:
+                self.write(item)
+            except Exception:
+                # Never let a bad record kill the writer
+                logging.lastResort.handle(logging.makeLogRecord({'msg': f'Log writer failed on {item!r}', 'levelno': logging.ERROR, 'levelname': 'ERROR'}))
+            # Give the GIL back after every record: the event loop never waits for a switch interval
+            time.sleep(0)
+
+
+    def write(self, item):
+        """
+        Writes a queued item: a LogRecord, a tick dump or a HotLogger tuple.
+        """
+
+        if isinstance(item, logging.LogRecord):
+            record = item
+
+        elif item[0] == TICK:
+            _, timestamp, kind, fields = item
+            self.tick_file.write(json.dumps({'time': timestamp, 'kind': kind, **fields}, default=to_json) + '\n')
+            self.n_ticks += 1
+            return
+
+        else:
+            timestamp, level, name, pathname, fmt, args = item
+            message = fmt(*args) if callable(fmt) else (fmt % args if args else fmt)
+            record = logging.LogRecord(name, level, pathname, 0, message, None, None)
+            record.created = timestamp
+            record.msecs   = (timestamp - int(timestamp)) * 1000
+
+        self.n_records += 1
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+        # Flush the tick dumps when the queue is drained
+        if self.tick_file is not None and self.queue.empty():
+            self.tick_file.flush()
+
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+
+    def __init__(self, log_writer: LogWriter) -> None:
+        """
+        Handler of the root logger in queue mode. Records are prepared as by QueueHandler: the
+        message is merged with its arguments and traceback before queueing, so a record never
+        reads arguments mutated afterwards nor keeps frames alive. The I/O happens in the
+        writer thread. The trading hot path queues cheaper tuples instead (see HotLogger).
+        """
+
+        super().__init__(log_writer.queue)
+        self.log_writer = log_writer
+
+
+
+class HotLogger:
+
+    def __init__(self, name) -> None:
+        """
+        Logger of the trading hot path. In queue mode a call only queues a small tuple
+        (time, level, logger, file, format, arguments): the message is built in the writer thread.
+        Otherwise it logs through the standard logger. The format is either a %-style string
+        or a function called with the arguments (see json_message and quotes_message).
+        Arguments are read later: mutable ones must be copies.
+
+        INPUTS:
+            * name (str): name of the logger, usually __name__
+        """
+
+        self.name     = name
+        self.logger   = logging.getLogger(name)
+        self.pathname = getattr(sys.modules.get(name), '__file__', name)
+
+
+    def log(self, level, fmt, *args):
+        if not self.logger.isEnabledFor(level):
+            return
+        if writer is not None:
+            writer.queue.put_nowait((time.time(), level, self.name, self.pathname, fmt, args))
+        elif callable(fmt):
+            self.logger.log(level, fmt(*args), stacklevel=3)
+        else:
+            self.logger.log(level, fmt, *args, stacklevel=3)
+
+
+    def debug(self, fmt, *args):
+        self.log(logging.DEBUG, fmt, *args)
+
+
+    def info(self, fmt, *args):
+        self.log(logging.INFO, fmt, *args)
+
+
+    def warning(self, fmt, *args):
+        self.log(logging.WARNING, fmt, *args)
+
+
+
+def is_tick_dump_enabled():
+    return writer is not None and writer.tick_file is not None
+
+
+
+def dump_tick(kind, **fields):
+    """
+    Queues a per-tick state dump (JSON line) if the tick sink is enabled. Numpy values are
+    converted in the writer thread: fields must not be mutated afterwards.
+
+    INPUTS:
+        * kind (str): kind of the dump
+        * fields: values of the dump
+    """
+
+    if writer is not None and writer.tick_file is not None:
+        writer.queue.put_nowait((TICK, time.time(), kind, fields))
+
+
+
+def setup_queue_logging(handlers, tick_path=None):
+    """
+    Moves the handlers of the root logger to a background writer thread.
+
+    INPUTS:
+        * handlers (list): handlers to write the records to (removed from the root logger)
+        * tick_path (str): JSON lines file of the tick dumps, None to disable them
+
+    OUTPUTS:
+        * (LogWriter)
+    """
+
+    global writer
+
+    if writer is not None:
+        stop_queue_logging()
+
+    root_logger = logging.getLogger()
+    for handler in handlers:
+        root_logger.removeHandler(handler)
+
+    writer = LogWriter(handlers, tick_path)
+    writer.handler = DeferredQueueHandler(writer)
+    root_logger.addHandler(writer.handler)
+    writer.start()
+    atexit.register(stop_queue_logging)
+
+    return writer
+
+
+
+def stop_queue_logging():
+    """
+    Writes the queued records and gives the handlers back to the root logger.
+    """
+
+    global writer
+
+    if writer is None:
+        return
+
+    log_writer, writer = writer, None
+    root_logger = logging.getLogger()
+    root_logger.removeHandler(log_writer.handler)
+    log_writer.stop()
+    for handler in log_writer.handlers:
+        root_logger.addHandler(handler)
+
+
+
+def reset_after_fork():
+    """
+    Drops the logging setup inherited by a forked process: the writer thread of the parent
+    does not exist in the child, and the root handlers would write through it.
+    """
+
+    global writer
+
+    writer = None
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
@@ -0,0 +1,151 @@
+import time
+
+
+def get_trade_states(pl_cards):
+    """
+    Returns the inventories one trade away: a player buys one card of a suit from another one.
+    Trades of mine come first, they are the most likely after my orders were sent.
+
+    INPUTS:
+        * pl_cards (numpy 2d int8 array): number of cards each player has of each suit, row 0 is myself
+
+    OUTPUTS:
+        * (list): inventories (numpy 2d int8 array) without duplicates
+    """
+
+    pairs = [(buyer, seller) for buyer in range(4) for seller in range(4) if buyer != seller]
+    pairs.sort(key=lambda pair: 0 not in pair)
+
+    states, keys = [], set()
+    for buyer, seller in pairs:
+        for idx_suit in range(4):
+            state = pl_cards.copy()
+            state[buyer, idx_suit] += 1
+
+            # As GameController: a seller without tracked cards of the suit stays at zero
+            state[seller, idx_suit] = max(state[seller, idx_suit] - 1, 0)
+
+            key = state.tobytes()
+            if key not in keys:
+                keys.add(key)
+                states.append(state)
+
+    return states
+
+
+
+class QuoteCache:
+
+    def __init__(self, opening=None, speculative=True) -> None:
+        """
+        Quotes (see GameStrategy.QuoteEntry) by inventory. The quotes only depend on the cards each
+        player has, so updates that only move the order book reuse them, and the inventories one
+        trade away are computed ahead while the strategy is idle (GameStrategy.speculate).
+        Only the current inventory and its neighbours are kept.
+
+        INPUTS:
+            * opening (dict): quotes of the opening hands, always kept (see OpeningQuotes), None if none
+            * speculative (boolean): computes ahead the inventories one trade away
+        """
+
+        self.entries     = {}
+        self.opening     = opening if opening is not None else {}
+        self.speculative = speculative
+        self.base        = None
+
+        # Counters
+        self.n_lookups          = 0
+        self.n_hits             = 0
+        self.n_speculated       = 0
+        self.n_speculative_hits = 0
+        self.n_wasted           = 0
+        self.n_opening_hits     = 0
+        self.saved_ns           = 0
+
+
+    def get(self, pl_cards):
+        """
+        Returns the quotes of an inventory.
+
+        INPUTS:
+            * pl_cards (numpy 2d int8 array): number of cards each player has of each suit
+
+        OUTPUTS:
+            * (QuoteEntry): None if unknown
+        """
+
+        start = time.perf_counter_ns()
+        self.n_lookups += 1
+
+        key = pl_cards.tobytes()
+        quotes = self.entries.get(key)
+        if quotes is None:
+            quotes = self.opening.get(key)
+            if quotes is None:
+                return None
+            self.n_opening_hits += 1
+
+        self.n_hits += 1
+        if quotes.speculative:
+            self.n_speculative_hits += 1
+            quotes.speculative = False
+        self.saved_ns += quotes.compute_ns - (time.perf_counter_ns() - start)
+
+        return quotes
+
+
+    def put(self, pl_cards, quotes):
+        """
+        Stores the quotes of an inventory.
+        """
+
+        self.entries[pl_cards.tobytes()] = quotes
+        if quotes.speculative:
+            self.n_speculated += 1
+
+
+    def set_base(self, pl_cards):
+        """
+        Sets the current inventory, dropping the quotes that are not reachable with one trade.
+
+        INPUTS:
+            * pl_cards (numpy 2d int8 array): current inventory
+
+        OUTPUTS:
+            * (list): inventories one trade away whose quotes are unknown, in speculation order
+        """
+
+        states = get_trade_states(pl_cards)
+        self.base = pl_cards.tobytes()
+
+        keep = set(state.tobytes() for state in states)
+        keep.add(self.base)
+        for key, quotes in list(self.entries.items()):
+            if key not in keep:
+                self.n_wasted += quotes.speculative
+                del self.entries[key]
+
+        return [state for state in states if state.tobytes() not in self.entries]
+
+
+    def is_base(self, pl_cards):
+        return pl_cards.tobytes() == self.base
+
+
+    def get_stats(self):
+        """
+        Returns the cache counters.
+
+        OUTPUTS:
+            * (dict): lookups, hits and hit rate, opening hand hits, speculated inventories, the
+                      ones that were reached and the ones dropped unused, time saved (ms)
+        """
+
+        return {'lookups':          self.n_lookups,
+                'hits':             self.n_hits,
+                'hit_rate':         self.n_hits / self.n_lookups if self.n_lookups else None,
+                'opening_hits':     self.n_opening_hits,
+                'speculated':       self.n_speculated,
+                'speculative_hits': self.n_speculative_hits,
+                'wasted':           self.n_wasted,
+                'saved_ms':         self.saved_ns / 1e6}
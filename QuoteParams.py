@@ -0,0 +1,58 @@
+import json
+import hashlib
+
+
+class QuoteParams:
+
+    def __init__(self,
+                 bid_exponent = 1.0,
+                 ask_weight = 1.0,
+                 colour_exponent = 1.0,
+                 colour_weight = 1.0,
+                 sigmoid_scale = 1.0,
+                 min_sell_price = 3,
+                 n_limit_orders = 4) -> None:
+        """
+        Constants of the quote adjustment and of the limit order rules. The defaults reproduce
+        the original hard-coded values exactly.
+
+        INPUTS:
+            * bid_exponent (double): bid factor (n_seen_cards/40)**bid_exponent [PortfolioEval]
+            * ask_weight (double): ask factor 1 + ask_weight*(1 - n_seen_cards/40) [PortfolioEval]
+            * colour_exponent (double): bid factor (my colour cards/my cards)**colour_exponent [PortfolioEval_3]
+            * colour_weight (double): ask factor 1 + colour_weight*(my other colour cards/my cards) [PortfolioEval_3]
+            * sigmoid_scale (double): factors use sigmoid(sigmoid_scale*x) [PortfolioEval_4]
+            * min_sell_price (int): limit sell orders need a price above it [GameStrategy]
+            * n_limit_orders (int): limit orders with more EV kept in the market [PortfolioEval]
+        """
+
+        self.bid_exponent    = bid_exponent
+        self.ask_weight      = ask_weight
+        self.colour_exponent = colour_exponent
+        self.colour_weight   = colour_weight
+        self.sigmoid_scale   = sigmoid_scale
+        self.min_sell_price  = min_sell_price
+        self.n_limit_orders  = n_limit_orders
+
+
+    @classmethod
+    def from_dict(cls, values):
+        """
+        Builds the parameters from a dictionary, missing ones take the default value.
+        """
+        return cls(**values)
+
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+    def get_hash(self):
+        """
+        Returns a stable hash of the parameter values.
+        """
+        return hashlib.sha1(json.dumps(self.to_dict(), sort_keys=True).encode()).hexdigest()
+
+
+    def __repr__(self):
+        return f'QuoteParams({", ".join(f"{name}={value}" for name, value in self.to_dict().items())})'
@@ -1,13 +1,29 @@
 import requests
 import json
 import logging
+import asyncio
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
 
 logger = logging.getLogger(__name__)
 
-class RESTAPIController:
+
+class BaseRESTAPIController:
 
     def __init__(self, url) -> None:
+        """
+        Registration, requests and responses shared by the blocking RESTAPIController and the
+        AsyncRESTAPIController. Orders are sent by the subclasses.
+
+        INPUTS:
+            * url (str): REST API address
+        """
+
         self.url = url
+        self.n_no_inventory = 0
 
 
     def register_to_testnet(self, player_id):
@@ -57,6 +73,174 @@ class RESTAPIController:
         self.playerid = player_id
 
 
+    #####################################################################################################
+    #                                      REQUESTS AND RESPONSES
+    #####################################################################################################
+
+    def get_headers(self):
+        """
+        Returns the headers identifying the player.
+        """
+        return {
+            "Playerid" : self.playerid
+        }
+
+
+    def get_json_headers(self):
+        """
+        Returns the headers identifying the player for a request with JSON data.
+        """
+        return {
+            "Content-Type": "application/json",
+            "Playerid": self.playerid
+        }
+
+
+    def get_order_data(self, suit, price, direction):
+        """
+        Returns the JSON data of an order.
+
+        INPUTS:
+            * suit (str): "spade" | "club" | "diamond" | "heart"
+            * price (int)
+            * direction (str): "buy" | "sell"
+        """
+        return json.dumps({
+            "card": suit,
+            "price": price,
+            "direction": direction
+        })
+
+
+    def get_cancel_data(self, suit, direction):
+        """
+        Returns the JSON data of an order cancellation.
+
+        INPUTS:
+            * suit (str): "spade" | "club" | "diamond" | "heart"
+            * direction (str): "buy" | "sell"
+        """
+        return json.dumps({
+            "card": suit,
+            "direction": direction
+        })
+
+
+    def handle_order_status(self, response_data, suit, price, direction):
+        """
+        Handles the response of an order.
+
+        INPUTS:
+            * response_data (dict): decoded response
+            * suit (str), price (int), direction (str): the order
+
+        OUTPUTS:
+            * (boolean): if the order was sent correctly
+        """
+
+        if response_data['status'] == 'SUCCESS':
+            logging.info(f'Order ({suit},{price},{direction}) was sent correctly.')
+            return True
+        elif response_data['status'] == 'NO_GAME':
+            logging.warning(f'No game is currently active.')
+            return False
+        elif response_data['status'] == 'RATE_LIMIT':
+            logging.warning(f'Rate limit was reached. Order was {suit},{price},{direction} not sent.')
+            return False
+        elif response_data['status'] == 'INVALID_DIRECTION':
+            logging.error(f'Order direction is incorrect. Choose buy or sell.')
+            return False
+        elif response_data['status'] == 'INVALID_CARD':
+            logging.error(f'Suit is invalid. Choose between spade, club, diamond, or heart.')
+            return False
+        elif response_data['status'] == 'INVALID_PRICE':
+            logging.error(f'Invalid price. Price should be between 1 and 99.')
+            return False
+        elif response_data['status'] == 'INSUFFICIENT_FUNDS':
+            logging.error(f'Not enough funds.')
+            return False
+        elif response_data['status'] == 'SELF_TRADE':
+            logging.error(f'Trying to self-trade.')
+            return False
+        elif response_data['status'] == 'NO_INVENTORY':
+            logging.error(f'Trying to sell a card you do not have.')
+            self.n_no_inventory += 1
+            return False
+        elif response_data['status'] == 'UNKNOWN_PLAYER':
+            logging.error(f'The player does not exist.')
+            return False
+        elif response_data['status'] == 'MISSING_HEADER':
+            logging.error(f'The player header is missing.')
+            return False
+
+
+    def handle_cancel_status(self, response_data, suit, direction):
+        """
+        Handles the response of an order cancellation.
+
+        INPUTS:
+            * response_data (dict): decoded response
+            * suit (str), direction (str): the order
+
+        OUTPUTS:
+            * (boolean): if the order was cancelled correctly
+        """
+
+        if response_data['status'] == 'SUCCESS':
+            logging.info(f'Order ({suit},{direction}) was cancelled correctly.')
+            return True
+        elif response_data['status'] == 'NO_GAME':
+            logging.warning(f'No game is currently active.')
+            return False
+        elif response_data['status'] == 'RATE_LIMIT':
+            logging.warning(f'Rate limit was reached. Order was {suit},{direction} not sent.')
+            return False
+        elif response_data['status'] == 'INVALID_DIRECTION':
+            logging.error(f'Order direction is incorrect. Choose buy or sell.')
+            return False
+        elif response_data['status'] == 'INVALID_CARD':
+            logging.error(f'Suit is invalid. Choose between spade, club, diamond, or heart.')
+            return False
+        elif response_data['status'] == 'UNKNOWN_PLAYER':
+            logging.error(f'The player does not exist.')
+            return False
+        elif response_data['status'] == 'MISSING_HEADER':
+            logging.error(f'The player header is missing.')
+            return False
+
+
+    def handle_inventory_status(self, response_data):
+        """
+        Handles the response of an inventory request.
+
+        INPUTS:
+            * response_data (dict): decoded response
+
+        OUTPUTS:
+            * (boolean): if the inventory was received correctly
+            * list of cards for each suit [spades, clubs, hearts, diamonds]
+        """
+
+        if response_data['status'] == 'SUCCESS':
+            nspades, nclubs, ndiamonds, nhearts = response_data['message'].split(',')
+            return True, [int(nspades), int(nclubs), int(nhearts), int(ndiamonds)]
+        elif response_data['status'] == 'NO_GAME':
+            logging.warning(f'No game is currently active.')
+            return False, []
+        elif response_data['status'] == 'RATE_LIMIT':
+            logging.warning(f'Rate limit was reached. Inventory was not sent.')
+            return False, []
+        elif response_data['status'] == 'UNKNOWN_PLAYER':
+            logging.error(f'The player does not exist.')
+            return False, []
+        elif response_data['status'] == 'MISSING_HEADER':
+            logging.error(f'The player header is missing.')
+            return False, []
+
+
+
+class RESTAPIController(BaseRESTAPIController):
+
     def post_order(self, suit, price, direction):
         """
         Sends an order to the market.
@@ -72,64 +256,12 @@ class RESTAPIController:
             logging.error(f'Invalid price. Price should be between 1 and 99.')
             return False
 
-        # Define the headers
-        headers = {
-            "Content-Type": "application/json",
-            "Playerid": self.playerid
-        }
-
-        # Define the data to send in the POST request
-        data = {
-            "card": suit,
-            "price": price,
-            "direction": direction
-        }
-
-        # Convert the data to JSON format
-        json_data = json.dumps(data)
-
         # Send the POST request
-        response = requests.post(self.url + '/order', headers=headers, data=json_data)
+        response = requests.post(self.url + '/order', headers=self.get_json_headers(), data=self.get_order_data(suit, price, direction))
 
         # Check the response status code
         if response.status_code == 200:
-            
-            # Get the response data
-            response_data = json.loads(response.json())
-            
-            if response_data['status'] == 'SUCCESS':
-                logging.info(f'Order ({suit},{price},{direction}) was sent correctly.')
-                return True
-            elif response_data['status'] == 'NO_GAME':
-                logging.warning(f'No game is currently active.')
-                return False
-            elif response_data['status'] == 'RATE_LIMIT':
-                logging.warning(f'Rate limit was reached. Order was {suit},{price},{direction} not sent.')
-                return False
-            elif response_data['status'] == 'INVALID_DIRECTION':
-                logging.error(f'Order direction is incorrect. Choose buy or sell.')
-                return False
-            elif response_data['status'] == 'INVALID_CARD':
-                logging.error(f'Suit is invalid. Choose between spade, club, diamond, or heart.')
-                return False
-            elif response_data['status'] == 'INVALID_PRICE':
-                logging.error(f'Invalid price. Price should be between 1 and 99.')
-                return False
-            elif response_data['status'] == 'INSUFFICIENT_FUNDS':
-                logging.error(f'Not enough funds.')
-                return False
-            elif response_data['status'] == 'SELF_TRADE':
-                logging.error(f'Trying to self-trade.')
-                return False
-            elif response_data['status'] == 'NO_INVENTORY':
-                logging.error(f'Trying to sell a card you do not have.')
-                return False
-            elif response_data['status'] == 'UNKNOWN_PLAYER':
-                logging.error(f'The player does not exist.')
-                return False
-            elif response_data['status'] == 'MISSING_HEADER':
-                logging.error(f'The player header is missing.')
-                return False
+            return self.handle_order_status(json.loads(response.json()), suit, price, direction)
 
         else:
             logging.error(f"Request failed with status code {response.status_code}. Order was not sent.")
@@ -145,51 +277,12 @@ class RESTAPIController:
             * direction (str): "buy" | "sell"
         """
 
-        # Define the headers
-        headers = {
-            "Content-Type": "application/json",
-            "Playerid": self.playerid
-        }
-
-        # Define the data to send in the POST request
-        data = {
-            "card": suit,
-            "direction": direction
-        }
-
-        # Convert the data to JSON format
-        json_data = json.dumps(data)
-
         # Send the POST request
-        response = requests.post(self.url + '/cancel', headers=headers, data=json_data)
+        response = requests.post(self.url + '/cancel', headers=self.get_json_headers(), data=self.get_cancel_data(suit, direction))
 
         # Check the response status code
         if response.status_code == 200:
-            
-            # Get the response data
-            response_data = json.loads(response.json())
-            
-            if response_data['status'] == 'SUCCESS':
-                logging.info(f'Order ({suit},{direction}) was cancelled correctly.')
-                return True
-            elif response_data['status'] == 'NO_GAME':
-                logging.warning(f'No game is currently active.')
-                return False
-            elif response_data['status'] == 'RATE_LIMIT':
-                logging.warning(f'Rate limit was reached. Order was {suit},{direction} not sent.')
-                return False
-            elif response_data['status'] == 'INVALID_DIRECTION':
-                logging.error(f'Order direction is incorrect. Choose buy or sell.')
-                return False
-            elif response_data['status'] == 'INVALID_CARD':
-                logging.error(f'Suit is invalid. Choose between spade, club, diamond, or heart.')
-                return False
-            elif response_data['status'] == 'UNKNOWN_PLAYER':
-                logging.error(f'The player does not exist.')
-                return False
-            elif response_data['status'] == 'MISSING_HEADER':
-                logging.error(f'The player header is missing.')
-                return False
+            return self.handle_cancel_status(json.loads(response.json()), suit, direction)
 
         else:
             logging.error(f"Request failed with status code {response.status_code}. Order was not cancelled.")
@@ -204,34 +297,189 @@ class RESTAPIController:
             * list of cards for each suit [spades, clubs, hearts, diamonds]
         """
 
-        # POST header
-        header = {
-            "Playerid" : self.playerid
-        }
-
         # Send the POST request
-        response = requests.post(self.url + '/inventory', headers=header)
+        response = requests.post(self.url + '/inventory', headers=self.get_headers())
 
         # Check the response status code
         if response.status_code == 200:
-            response_data = json.loads(response.json())
-
-            if response_data['status'] == 'SUCCESS':
-                nspades, nclubs, ndiamonds, nhearts = response_data['message'].split(',')
-                return True, [int(nspades), int(nclubs), int(nhearts), int(ndiamonds)]
-            elif response_data['status'] == 'NO_GAME':
-                logging.warning(f'No game is currently active.')
-                return False, []
-            elif response_data['status'] == 'RATE_LIMIT':
-                logging.warning(f'Rate limit was reached. Inventory was not sent.')
-                return False, []
-            elif response_data['status'] == 'UNKNOWN_PLAYER':
-                logging.error(f'The player does not exist.')
-                return False, []
-            elif response_data['status'] == 'MISSING_HEADER':
-                logging.error(f'The player header is missing.')
-                return False, []
+            return self.handle_inventory_status(json.loads(response.json()))
 
         else:
             logging.error(f"Inventory was not received: request failed with status code {response.status_code}")
-            return False, []
\ No newline at end of file
+            return False, []
+
+
+
+class AsyncRESTAPIController(BaseRESTAPIController):
+
+    def __init__(self, url, timeout=2.0, pool_size=8, keepalive_timeout=60.0) -> None:
+        """
+        REST API controller that sends the orders without blocking the event loop, reusing
+        keep-alive connections from a pool. Its order and inventory requests are coroutines,
+        the interface GameStrategy and WSController use. Registration is still synchronous.
+
+        INPUTS:
+            * url (str): REST API address
+            * timeout (double): default timeout in seconds of each request
+            * pool_size (int): maximum number of simultaneous connections
+            * keepalive_timeout (double): seconds an idle connection is kept open
+        """
+
+        super().__init__(url)
+        self.timeout           = timeout
+        self.pool_size         = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.session           = None
+
+
+    def get_session(self):
+        """
+        Returns the HTTP session, opening it in the running event loop if needed.
+        """
+
+        if aiohttp is None:
+            raise ImportError('AsyncRESTAPIController requires aiohttp.')
+
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive_timeout)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self.session
+
+
+    async def close(self):
+        """
+        Closes the HTTP session and its connections.
+        """
+
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+
+    async def post(self, endpoint, headers, data=None, timeout=None):
+        """
+        Sends a POST request.
+
+        INPUTS:
+            * endpoint (str): "/order" | "/cancel" | "/inventory"
+            * headers (dict)
+            * data (str): JSON data
+            * timeout (double): timeout in seconds, default one if None
+
+        OUTPUTS:
+            * (int): status code, None if the request failed
+            * (dict): decoded response, None if the status code is not 200 or the response is not valid JSON
+        """
+
+        # The session timeout applies unless another one is given
+        kwargs = {} if timeout is None else {'timeout': aiohttp.ClientTimeout(total=timeout)}
+
+        try:
+            async with self.get_session().post(self.url + endpoint, headers=headers, data=data, **kwargs) as response:
+                if response.status != 200:
+                    return response.status, None
+                try:
+                    return response.status, json.loads(await response.json(content_type=None))
+                except ValueError:
+                    logging.error(f"Response to {endpoint} could not be decoded.")
+                    return response.status, None
+
+        except asyncio.TimeoutError:
+            logging.error(f"Request to {endpoint} timed out.")
+        except aiohttp.ClientError as error:
+            logging.error(f"Request to {endpoint} failed: {error}")
+
+        return None, None
+
+
+    async def post_order(self, suit, price, direction, timeout=None):
+        """
+        Sends an order to the market.
+
+        INPUTS:
+            * suit (str): "spade" | "club" | "diamond" | "heart"
+            * price (int)
+            * direction (str): "buy" | "sell"
+            * timeout (double): timeout in seconds, default one if None
+        """
+
+        # Sanity check
+        if price < 1 or price > 99:
+            logging.error(f'Invalid price. Price should be between 1 and 99.')
+            return False
+
+        # Send the POST request
+        status_code, response_data = await self.post('/order', self.get_json_headers(), self.get_order_data(suit, price, direction), timeout)
+
+        # Check the response status code
+        if response_data is not None:
+            return self.handle_order_status(response_data, suit, price, direction)
+
+        elif status_code not in (None, 200): # Failed requests and undecodable responses were already logged
+            logging.error(f"Request failed with status code {status_code}. Order was not sent.")
+
+        return False
+
+
+    async def cancel_order(self, suit, direction, timeout=None):
+        """
+        Sends an order cancellation to the market.
+
+        INPUTS:
+            * suit (str): "spade" | "club" | "diamond" | "heart"
+            * direction (str): "buy" | "sell"
+            * timeout (double): timeout in seconds, default one if None
+        """
+
+        # Send the POST request
+        status_code, response_data = await self.post('/cancel', self.get_json_headers(), self.get_cancel_data(suit, direction), timeout)
+
+        # Check the response status code
+        if response_data is not None:
+            return self.handle_cancel_status(response_data, suit, direction)
+
+        elif status_code not in (None, 200): # Failed requests and undecodable responses were already logged
+            logging.error(f"Request failed with status code {status_code}. Order was not cancelled.")
+
+        return False
+
+
+    async def get_inventory(self, timeout=None):
+        """
+        Get your current inventory.
+
+        INPUTS:
+            * timeout (double): timeout in seconds, default one if None
+
+        OUTPUTS:
+            * list of cards for each suit [spades, clubs, hearts, diamonds]
+        """
+
+        # Send the POST request
+        status_code, response_data = await self.post('/inventory', self.get_headers(), None, timeout)
+
+        # Check the response status code
+        if response_data is not None:
+            return self.handle_inventory_status(response_data)
+
+        elif status_code not in (None, 200): # Failed requests and undecodable responses were already logged
+            logging.error(f"Inventory was not received: request failed with status code {status_code}")
+
+        return False, []
+
+
+    async def send_order_diff(self, diff):
+        """
+        Sends the orders and the cancellations of an order diff concurrently.
+
+        INPUTS:
+            * diff (OrderDiff): orders to send and to cancel
+
+        OUTPUTS:
+            * (list): boolean for each sent order
+            * (list): boolean for each cancellation
+        """
+
+        results = await asyncio.gather(*[self.post_order(suit, int(price), direction) for direction, suit, price in diff.posts],
+                                       *[self.cancel_order(suit, direction) for direction, suit in diff.cancels])
+
+        return list(results[:len(diff.posts)]), list(results[len(diff.posts):])
@@ -0,0 +1,281 @@
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import collections
+import multiprocessing
+import numpy as np
+
+from GoalSuitEstimator import GoalSuitEstimator
+from GoalSuitPremium import GoalSuitPremium
+from PortfolioVariants import VARIANTS
+from GameController import GameController
+from GameStrategy import GameStrategy
+from RESTAPIController import AsyncRESTAPIController
+from ExchangeSimulator import MatchingEngine, STARTING_BALANCE
+from WSMessages import MessageDecoder, DealingCards
+
+logger = logging.getLogger(__name__)
+
+
+class EngineRESTAPIController(AsyncRESTAPIController):
+
+    def __init__(self, table, player_id) -> None:
+        """
+        REST API of a self-play bot: orders go straight to the matching engine of the table.
+
+        INPUTS:
+            * table (SelfPlayTable)
+            * player_id (str)
+        """
+
+        super().__init__(url='')
+        self.table    = table
+        self.playerid = player_id
+
+
+    async def post_order(self, suit, price, direction):
+        status = self.table.post_order(self.playerid, suit, price, direction)
+        if status == 'NO_INVENTORY':
+            self.n_no_inventory += 1
+        return status == 'SUCCESS'
+
+
+    async def cancel_order(self, suit, direction):
+        return self.table.cancel_order(self.playerid, suit, direction) == 'SUCCESS'
+
+
+    async def get_inventory(self):
+        status, message = self.table.engine.get_inventory(self.playerid)
+        return self.handle_inventory_status({'status': status, 'message': message})
+
+
+
+class SelfPlayBot:
+
+    def __init__(self, table, player_id, variant, goalEst, gsPremium, params=None) -> None:
+        """
+        A bot of the table: the same GameController, GameStrategy and PortfolioEval as a live bot.
+        params (QuoteParams) are the quoting constants, the defaults if None.
+        """
+
+        self.player_id = player_id
+        self.variant   = variant
+        self.name      = f'{player_id}_{variant}'
+        self.restapi   = EngineRESTAPIController(table, player_id)
+        self.gameCon   = GameController()
+        self.gameStr   = GameStrategy(goalEst, VARIANTS[variant](gsPremium, goalEst, params), self.gameCon)
+        self.gameCon.set_restAPI(self.restapi)
+        self.gameCon.set_playerName(self.name)
+        self.decoder   = MessageDecoder(self.gameCon.get_player_row)
+        self.errors    = collections.Counter()
+
+
+
+class SelfPlayTable:
+
+    def __init__(self, variants, goalEst, gsPremium, n_ticks=50, seed=None, params=None) -> None:
+        """
+        Headless Figgie table: four bots trading through the matching engine, one round at a time.
+        In every tick each bot runs its strategy once, in random order. A round ends after n_ticks
+        or as soon as a whole tick goes by without any order (the bots would repeat themselves).
+
+        INPUTS:
+            * variants (list): quoting strategy of each seat
+            * goalEst (GoalSuitEstimator), gsPremium (GoalSuitPremium): shared read-only tables
+            * n_ticks (int): maximum ticks of a round
+            * seed (int)
+            * params (list): QuoteParams of each seat (None for the defaults), defaults if None
+        """
+
+        if params is None:
+            params = [None] * len(variants)
+
+        self.engine  = MatchingEngine(seed)
+        self.rng     = random.Random(seed)
+        self.n_ticks = n_ticks
+        self.bots    = [SelfPlayBot(self, f'bot{idx}', variant, goalEst, gsPremium, params[idx]) for idx, variant in enumerate(variants)]
+        for bot in self.bots:
+            self.engine.add_player(bot.player_id, bot.name)
+
+        self.n_events = 0
+
+
+    def post_order(self, player_id, suit, price, direction):
+        status, trade = self.engine.post_order(player_id, suit, price, direction)
+        if status == 'SUCCESS':
+            self.broadcast(trade)
+        return status
+
+
+    def cancel_order(self, player_id, suit, direction):
+        status, removed = self.engine.cancel_order(player_id, suit, direction)
+        if removed:
+            self.broadcast(None)
+        return status
+
+
+    def broadcast(self, trade):
+        """
+        Sends the update of the book to every bot, as the WebSocket feed would.
+        """
+
+        self.n_events += 1
+        data = self.engine.get_update(trade)
+        for bot in self.bots:
+            if bot.gameCon.update_game_status(bot.decoder.decode_update(data)):
+                bot.gameStr.reset()
+
+
+    async def play_round(self):
+        """
+        Plays one round.
+
+        OUTPUTS:
+            * (numpy array): PnL of each seat
+            * (int): ticks played
+        """
+
+        self.engine.reset_game()
+        hands = self.engine.start_round()
+        for bot in self.bots:
+            bot.gameCon.reset_round_inventory()
+            bot.gameCon.set_players([seat.name for seat in self.bots])
+            bot.gameStr.reset()
+            bot.gameCon.set_starting_hand(DealingCards(hands[bot.name]))
+
+        n_tick = 0
+        while n_tick < self.n_ticks:
+            n_tick += 1
+            n_events = self.n_events
+            for bot in self.rng.sample(self.bots, len(self.bots)):
+                # A failing run is skipped, as the StrategyScheduler of a live bot does, and reported
+                try:
+                    await bot.gameStr.perform_strategy()
+                except Exception as error:
+                    bot.errors[repr(error)] += 1
+                    if bot.errors[repr(error)] == 1:
+                        logger.exception(f'Strategy of {bot.name} failed.')
+            if self.n_events == n_events:
+                break
+
+        self.engine.end_round()
+        pnl = np.array([self.engine.players[bot.player_id].balance - STARTING_BALANCE for bot in self.bots], dtype=float)
+
+        return pnl, n_tick
+
+
+
+# Tables of each worker process, loaded once (memory mapped, shared between the processes)
+worker_tables = {}
+
+
+def init_worker(log_level):
+    logging.disable(log_level)
+    worker_tables['goalEst']   = GoalSuitEstimator()
+    worker_tables['gsPremium'] = GoalSuitPremium()
+
+
+def run_chunk(args):
+    """
+    Plays a chunk of rounds in a worker.
+
+    INPUTS:
+        * args (tuple): variants, number of rounds, ticks per round, seed and optionally the
+                        QuoteParams of each seat
+
+    OUTPUTS:
+        * (numpy 2d array): PnL of each seat for each round
+        * (int): total ticks played
+        * (list): failed strategy runs of each seat (dict: error -> count)
+    """
+
+    variants, n_rounds, n_ticks, seed, *params = args
+    if not worker_tables:
+        init_worker(logging.WARNING)
+
+    table = SelfPlayTable(variants, worker_tables['goalEst'], worker_tables['gsPremium'], n_ticks, seed, *params)
+
+    async def play():
+        pnls, ticks = [], 0
+        for _ in range(n_rounds):
+            pnl, n_tick = await table.play_round()
+            pnls.append(pnl)
+            ticks += n_tick
+        return np.array(pnls), ticks, [dict(bot.errors) for bot in table.bots]
+
+    return asyncio.run(play())
+
+
+def simulate(variants, n_rounds, n_processes=None, n_ticks=50, chunk_size=25, seed=0):
+    """
+    Spreads the rounds over a process pool. Seats are rotated between chunks so every
+    bot plays from every seat.
+
+    INPUTS:
+        * variants (list): quoting strategy of each of the four bots
+        * n_rounds (int)
+        * n_processes (int): worker processes, all the cores if None
+        * n_ticks (int): maximum ticks of a round
+        * chunk_size (int): rounds per task
+        * seed (int)
+
+    OUTPUTS:
+        * (dict): rounds/s, ticks per round and, for each bot ("bot0" to "bot3", in the order of
+                  variants), its variant and PnL per round (mean, 95% CI, failed strategy runs and their errors)
+    """
+
+    n_seats = len(variants)
+    bots = [f'bot{idx}' for idx in range(n_seats)]
+    tasks, seat_bots = [], []
+    for idx_chunk, start in enumerate(range(0, n_rounds, chunk_size)):
+        shift = idx_chunk % n_seats
+        tasks.append((variants[shift:] + variants[:shift], min(chunk_size, n_rounds - start), n_ticks, seed + idx_chunk))
+        seat_bots.append(bots[shift:] + bots[:shift])
+
+    start = time.perf_counter()
+    pnl = {bot: [] for bot in bots}
+    errors = {bot: collections.Counter() for bot in bots}
+    n_ticks_total = 0
+    with multiprocessing.Pool(n_processes, initializer=init_worker, initargs=(logging.WARNING,)) as pool:
+        for chunk_bots, (pnls, ticks, chunk_errors) in zip(seat_bots, pool.imap(run_chunk, tasks)):
+            for idx_seat, bot in enumerate(chunk_bots):
+                pnl[bot].append(pnls[:, idx_seat])
+                errors[bot].update(chunk_errors[idx_seat])
+            n_ticks_total += ticks
+    elapsed = time.perf_counter() - start
+
+    results = {'rounds':          n_rounds,
+               'elapsed':         elapsed,
+               'rounds_per_sec':  n_rounds / elapsed,
+               'ticks_per_round': n_ticks_total / n_rounds,
+               'pnl':             {}}
+    for bot, variant in zip(bots, variants):
+        values = np.concatenate(pnl[bot])
+        half_width = 1.96 * values.std(ddof=1) / np.sqrt(len(values)) if len(values) > 1 else float('nan')
+        results['pnl'][bot] = {'variant': variant,
+                               'mean':    float(values.mean()),
+                               'ci95':    [float(values.mean() - half_width), float(values.mean() + half_width)],
+                               'n':       len(values),
+                               'failed_runs': sum(errors[bot].values()),
+                               'errors':  dict(errors[bot])}
+
+    return results
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Self-play of the quoting strategies.')
+    parser.add_argument('--variants', nargs=4, default=['base', 'monocolor', 'monocolor2', 'base'], choices=list(VARIANTS))
+    parser.add_argument('--rounds', type=int, default=1000)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--ticks', type=int, default=50, help='maximum ticks of a round')
+    parser.add_argument('--chunk-size', type=int, default=25)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = simulate(args.variants, args.rounds, args.processes, args.ticks, args.chunk_size, args.seed)
+    print(json.dumps(results, indent=2))
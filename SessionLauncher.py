@@ -0,0 +1,311 @@
+import json
+import asyncio
+import logging
+import argparse
+import multiprocessing
+from websockets.exceptions import ConnectionClosedOK
+
+from ColoredLogger import ColoredLogger
+from GoalSuitEstimator import GoalSuitEstimator
+from GoalSuitPremium import GoalSuitPremium
+from GameController import GameController
+from GameStrategy import GameStrategy
+from WSController import WSController
+from RESTAPIController import AsyncRESTAPIController
+from SessionRecorder import SessionRecorder
+from StrategyExecutor import StrategyExecutor
+from QuoteParams import QuoteParams
+from PortfolioVariants import VARIANTS
+from QuoteCache import QuoteCache
+from OpeningQuotes import load_opening_quotes
+from QueueLogging import setup_queue_logging, stop_queue_logging
+from ExchangeSimulator import ExchangeSimulator
+
+logger = logging.getLogger(__name__)
+
+
+# Settings of a session missing in the config file
+SESSION_DEFAULTS = {'rest_url':  'http://localhost:8090',
+                    'ws_url':    'ws://localhost:8080',
+                    'variant':   'base',
+                    'params':    {},
+                    'executor':  None,
+                    'speculative': False,
+                    'opening_quotes': False,
+                    'record':    None,
+                    'timeout':   2.0}
+
+
+
+class BotSession:
+
+    def __init__(self, config, goalEst: GoalSuitEstimator, gsPremium: GoalSuitPremium) -> None:
+        """
+        One bot: its own REST API, GameController, GameStrategy (and open orders) and WSController.
+        The tables are shared with the other sessions of the process.
+
+        INPUTS:
+            * config (dict): player_id, rest_url, ws_url, variant, params (QuoteParams values),
+                             executor (None | "thread" | "process"), speculative (see QuoteCache),
+                             opening_quotes (see OpeningQuotes), record (session file), timeout
+            * goalEst (GoalSuitEstimator), gsPremium (GoalSuitPremium): shared read-only tables
+        """
+
+        self.config    = {**SESSION_DEFAULTS, **config}
+        self.player_id = self.config['player_id']
+        self.goalEst   = goalEst
+
+        self.restapi  = AsyncRESTAPIController(self.config['rest_url'], timeout=self.config['timeout'])
+        self.portEval = VARIANTS[self.config['variant']](gsPremium, goalEst, QuoteParams.from_dict(self.config['params']))
+        self.gameCon  = GameController()
+        self.executor = StrategyExecutor(self.config['executor'], 1, self.portEval) if self.config['executor'] else None
+        opening       = load_opening_quotes(goalEst, self.portEval) if self.config['opening_quotes'] else None
+        quote_cache   = QuoteCache(opening, self.config['speculative']) if (opening or self.config['speculative']) else None
+        self.gameStr  = GameStrategy(goalEst, self.portEval, self.gameCon, executor=self.executor, quote_cache=quote_cache)
+        self.wsCon    = None
+        self.error    = None
+
+
+    async def run(self):
+        """
+        Registers the player and follows the WebSocket feed until it closes.
+        """
+
+        try:
+            # Registration is blocking: it would stall the other sessions (and a local simulator)
+            _, player_name = await asyncio.to_thread(self.restapi.register_to_testnet, self.player_id)
+            self.gameCon.set_restAPI(self.restapi)
+            self.gameCon.set_playerName(player_name)
+
+            recorder = SessionRecorder(self.config['record'], player_name) if self.config['record'] else None
+            self.wsCon = WSController(self.config['ws_url'], self.player_id, self.restapi, self.gameCon, self.gameStr,
+                                      self.goalEst, self.portEval, recorder=recorder)
+            logger.info(f'Session {self.player_id} ({player_name}, {self.config["variant"]}) started.')
+            await self.wsCon.subscribe_to_websocket()
+
+        except ConnectionClosedOK:
+            logger.info(f'Session {self.player_id}: the exchange closed the feed.')
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            self.error = repr(error)
+            logger.exception(f'Session {self.player_id} stopped.')
+
+        finally:
+            await self.restapi.close()
+            if self.executor is not None:
+                self.executor.close()
+
+
+    def get_metrics(self):
+        """
+        Returns the metrics of the session.
+
+        OUTPUTS:
+            * (dict): deals, own trades, strategy scheduler and quote cache counters, rejected orders
+                      for missing inventory, tick-to-trade latency of the last round (us), error
+        """
+
+        metrics = {'player_id': self.player_id,
+                   'player':    self.gameCon.player_name,
+                   'variant':   self.config['variant'],
+                   'own_trades': self.gameCon.n_own_trades,
+                   'no_inventory': self.restapi.n_no_inventory,
+                   'error':     self.error}
+        if self.wsCon is not None:
+            metrics['deals']         = self.wsCon.n_deals
+            metrics['scheduler']     = self.wsCon.scheduler.get_stats()
+            metrics['tick_to_trade'] = self.wsCon.last_latency.get('tick_to_trade', {'count': 0})
+        if self.gameStr.quote_cache is not None:
+            metrics['quote_cache']   = self.gameStr.quote_cache.get_stats()
+
+        return metrics
+
+
+
+async def log_metrics(sessions, interval):
+    """
+    Logs the metrics of every session periodically.
+    """
+
+    while True:
+        await asyncio.sleep(interval)
+        for session in sessions:
+            logger.info(f'Session metrics: {json.dumps(session.get_metrics())}')
+
+
+
+def make_sessions(session_configs):
+    """
+    Builds the sessions of a process. The tables are loaded once (memory mapped) and shared by
+    all the sessions.
+
+    INPUTS:
+        * session_configs (list): config of each session (see BotSession)
+
+    OUTPUTS:
+        * (list): BotSession of each config
+    """
+
+    goalEst, gsPremium = GoalSuitEstimator(), GoalSuitPremium()
+    return [BotSession(config, goalEst, gsPremium) for config in session_configs]
+
+
+
+async def run_sessions(sessions, simulator_configs=(), metrics_interval=60.0):
+    """
+    Runs sessions (and local exchange simulators) on the event loop of this process.
+
+    INPUTS:
+        * sessions (list): BotSession (see make_sessions)
+        * simulator_configs (list): ExchangeSimulator arguments of each local simulator, plus
+                                    "players": external players to wait for
+        * metrics_interval (double): seconds between metric logs, None to log them only at the end
+
+    OUTPUTS:
+        * (list): metrics of each session
+    """
+
+    simulators = [asyncio.create_task(games) for games in await start_simulators(simulator_configs)]
+
+    metrics_task = asyncio.create_task(log_metrics(sessions, metrics_interval)) if metrics_interval else None
+    try:
+        await asyncio.gather(*[session.run() for session in sessions], *simulators)
+    finally:
+        if metrics_task is not None:
+            metrics_task.cancel()
+
+    metrics = [session.get_metrics() for session in sessions]
+    for session_metrics in metrics:
+        logger.info(f'Session metrics: {json.dumps(session_metrics)}')
+
+    return metrics
+
+
+
+async def start_simulators(simulator_configs):
+    """
+    Starts local exchange simulators.
+
+    INPUTS:
+        * simulator_configs (list): ExchangeSimulator arguments, plus "players": external players to wait for
+
+    OUTPUTS:
+        * (list): coroutines playing the games of each simulator
+    """
+
+    games = []
+    for config in simulator_configs:
+        config = dict(config)
+        n_external = config.pop('players', 1)
+        simulator = ExchangeSimulator(**config)
+        await simulator.start()
+        games.append(run_simulator(simulator, n_external))
+    return games
+
+
+
+async def run_simulator(simulator, n_external):
+    """
+    Plays the games of a started simulator and stops it, which closes the sessions connected to it.
+    """
+
+    try:
+        await simulator.run_games(n_external)
+    finally:
+        await simulator.stop()
+
+
+
+def setup_logging(level):
+    """
+    Console logging of a launcher process.
+
+    OUTPUTS:
+        * (logging.Handler): console handler, to move to the log writer thread in queue mode
+    """
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(level)
+    formatter = ColoredLogger("{asctime} - {levelname} - {processName} - {filename} - {message}", style="{", datefmt="%Y-%m-%d %H:%M:%S")
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    root_logger.addHandler(console_handler)
+
+    return console_handler
+
+
+
+def run_process(session_configs, simulator_configs, options):
+    """
+    Entry point of a launcher process. The sessions are built before the log writer thread and
+    the event loop start, so the workers of a process executor are not forked while they run.
+    """
+
+    console_handler = setup_logging(options['log_level'])
+    sessions = make_sessions(session_configs)
+    if options['queue_logging']:
+        setup_queue_logging([console_handler])
+    try:
+        asyncio.run(run_sessions(sessions, simulator_configs, options['metrics_interval']))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_queue_logging()
+
+
+
+def launch(config):
+    """
+    Runs the sessions of a config, on one event loop or spread over worker processes.
+    Local simulators run in the launcher process. Worker processes are spawned, not forked:
+    the launcher already runs its event loop and the log writer thread. They map the same
+    table files (shared page cache).
+
+    INPUTS:
+        * config (dict): "sessions" (list), "simulators" (list), "processes" (int, 1 for a single
+                         event loop), "metrics_interval" (s), "log_level", "queue_logging"
+    """
+
+    session_configs   = config['sessions']
+    simulator_configs = config.get('simulators', [])
+    n_processes = max(1, min(config.get('processes', 1), len(session_configs)))
+    options = {'log_level':        config.get('log_level', 'INFO'),
+               'queue_logging':    config.get('queue_logging', False),
+               'metrics_interval': config.get('metrics_interval', 60.0)}
+
+    if n_processes == 1:
+        run_process(session_configs, simulator_configs, options)
+        return
+
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=run_process, name=f'Sessions{idx}', args=(session_configs[idx::n_processes], [], options))
+                 for idx in range(n_processes)]
+
+    # Simulators are listening before the sessions register
+    async def run_parent():
+        games = await start_simulators(simulator_configs)
+        for process in processes:
+            process.start()
+        await asyncio.gather(*games, *[asyncio.to_thread(process.join) for process in processes])
+
+    console_handler = setup_logging(options['log_level'])
+    if options['queue_logging']:
+        setup_queue_logging([console_handler])
+    try:
+        asyncio.run(run_parent())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_queue_logging()
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Runs several bot sessions from a JSON config file.')
+    parser.add_argument('config', help='JSON config (see sessions.example.json)')
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        launch(json.load(f))
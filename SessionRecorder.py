@@ -0,0 +1,106 @@
+import os
+import json
+import time
+import struct
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Session file: MAGIC, header length (uint32), JSON header, then one record per frame:
+# monotonic timestamp in ns (uint64), frame length (uint32), frame bytes. Little endian.
+MAGIC = b'FIGREC01'
+RECORD = struct.Struct('<QI')
+
+
+class SessionRecorder:
+
+    def __init__(self, path, player_name='', flush_every=64) -> None:
+        """
+        Appends every incoming WebSocket frame to a session file.
+
+        INPUTS:
+            * path (str): session file, frames are appended if it exists
+            * player_name (str): name of the bot in the session, needed to replay it
+            * flush_every (int): frames buffered before flushing to disk
+        """
+
+        self.path        = path
+        self.flush_every = flush_every
+        self.n_frames    = 0
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        is_new = (not os.path.exists(path)) or (os.path.getsize(path) == 0)
+        self.file = open(path, 'ab')
+
+        if is_new:
+            header = json.dumps({'player_name': player_name, 'started': time.time()}).encode()
+            self.file.write(MAGIC + len(header).to_bytes(4, 'little') + header)
+        logger.info(f'Recording the session in {path}.')
+
+
+    def record(self, frame):
+        """
+        Appends a frame with its arrival time.
+
+        INPUTS:
+            * frame (str | bytes): raw WebSocket frame
+        """
+
+        data = frame.encode() if isinstance(frame, str) else frame
+        self.file.write(RECORD.pack(time.monotonic_ns(), len(data)))
+        self.file.write(data)
+
+        self.n_frames += 1
+        if self.n_frames % self.flush_every == 0:
+            self.file.flush()
+
+
+    def close(self):
+        """
+        Flushes and closes the session file.
+        """
+
+        if not self.file.closed:
+            self.file.close()
+            logger.info(f'{self.n_frames} frames recorded in {self.path}.')
+
+
+
+def read_session(path):
+    """
+    Reads a session file.
+
+    INPUTS:
+        * path (str)
+
+    OUTPUTS:
+        * (dict): header of the session
+        * (list): (monotonic timestamp in ns, frame bytes) for each frame
+    """
+
+    with open(path, 'rb') as f:
+        content = f.read()
+
+    if content[:len(MAGIC)] != MAGIC:
+        raise ValueError(f'{path} is not a session file.')
+    header_len = int.from_bytes(content[len(MAGIC):len(MAGIC) + 4], 'little')
+    offset = len(MAGIC) + 4 + header_len
+    header = json.loads(content[len(MAGIC) + 4:offset])
+
+    frames = []
+    view = memoryview(content)
+    while offset + RECORD.size <= len(content):
+        timestamp, length = RECORD.unpack_from(content, offset)
+        offset += RECORD.size
+        # The last record can be truncated if the bot was killed
+        if offset + length > len(content):
+            logger.warning(f'{path} ends with a truncated frame.')
+            break
+        frames.append((timestamp, bytes(view[offset:offset + length])))
+        offset += length
+
+    return header, frames
@@ -0,0 +1,216 @@
+import json
+import time
+import asyncio
+import logging
+import argparse
+
+from GoalSuitEstimator import GoalSuitEstimator
+from GoalSuitPremium import GoalSuitPremium
+from PortfolioVariants import VARIANTS
+from GameController import GameController
+from GameStrategy import GameStrategy
+from QuoteCache import QuoteCache
+from OpeningQuotes import load_opening_quotes
+from RESTAPIController import AsyncRESTAPIController
+from WSController import WSController
+from SessionRecorder import read_session
+from WSMessages import UpdateMessage, EndRound
+from ExchangeSimulator import GOAL_CARD_PRIZE
+
+logger = logging.getLogger(__name__)
+
+
+class StubRESTAPIController(AsyncRESTAPIController):
+
+    def __init__(self) -> None:
+        """
+        REST API that accepts every order without sending it. It keeps the emitted order stream.
+        """
+
+        super().__init__(url='')
+        self.orders = []
+        self.frame_index = -1
+
+
+    async def post_order(self, suit, price, direction):
+        if price < 1 or price > 99:
+            return False
+        self.orders.append({'frame': self.frame_index, 'action': 'post', 'suit': suit, 'price': price, 'direction': direction})
+        return True
+
+
+    async def cancel_order(self, suit, direction):
+        self.orders.append({'frame': self.frame_index, 'action': 'cancel', 'suit': suit, 'direction': direction})
+        return True
+
+
+    async def get_inventory(self):
+        # The inventory of a replayed session is only known from the frames
+        return False, []
+
+
+
+class SessionReplayer:
+
+    def __init__(self, path, variant='base', params=None, goalEst=None, gsPremium=None, speculative=False, opening=False) -> None:
+        """
+        Feeds a recorded session through GameController and GameStrategy with a stub REST API.
+
+        INPUTS:
+            * path (str): session file written by SessionRecorder
+            * variant (str): "base" | "monocolor" | "monocolor2", quoting strategy
+            * params (QuoteParams): quoting constants, the defaults if None
+            * goalEst (GoalSuitEstimator), gsPremium (GoalSuitPremium): tables to reuse, loaded if None
+            * speculative (boolean): reuses and computes ahead the quotes (see QuoteCache). Drained
+                                     replays give the speculation all the time it needs between frames
+            * opening (boolean): loads the quotes of the opening hands in the cache (see OpeningQuotes)
+        """
+
+        self.header, self.frames = read_session(path)
+
+        # Trades and round ends of the recording: (frame index, suit, price) | (frame index, goal suit, None)
+        self.tape = []
+
+        self.restapi  = StubRESTAPIController()
+        self.goalEst  = goalEst if goalEst is not None else GoalSuitEstimator()
+        self.portEval = VARIANTS[variant](gsPremium if gsPremium is not None else GoalSuitPremium(), self.goalEst, params)
+        self.gameCon  = GameController()
+        opening_quotes = load_opening_quotes(self.goalEst, self.portEval) if opening else None
+        quote_cache   = QuoteCache(opening_quotes, speculative) if (speculative or opening) else None
+        self.gameStr  = GameStrategy(self.goalEst, self.portEval, self.gameCon, quote_cache=quote_cache)
+        self.gameCon.set_restAPI(self.restapi)
+        self.gameCon.set_playerName(self.header['player_name'])
+        self.wsCon    = WSController(None, self.header['player_name'], self.restapi, self.gameCon,
+                                     self.gameStr, self.goalEst, self.portEval, reconcile_interval=None)
+
+
+    async def run(self, max_speed=True, drain=True):
+        """
+        Replays the session.
+
+        INPUTS:
+            * max_speed (boolean): replays as fast as possible, otherwise at the original pace
+            * drain (boolean): in max speed, waits for the strategy after every frame so each
+                               update gets its own run (otherwise runs are coalesced as live)
+
+        OUTPUTS:
+            * (dict): frames, strategy runs, orders, elapsed time and rates
+        """
+
+        if not self.frames:
+            return {'frames': 0}
+
+        first_timestamp = self.frames[0][0]
+        start = time.perf_counter()
+
+        for idx_frame, (timestamp, frame) in enumerate(self.frames):
+
+            # Keep the original pace
+            if not max_speed:
+                delay = (timestamp - first_timestamp)/1e9 - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            self.restapi.frame_index = idx_frame
+            message = self.wsCon.handle_message(frame)
+            if isinstance(message, UpdateMessage) and message.trade is not None:
+                self.tape.append((idx_frame, message.trade.suit + 's', message.trade.price))
+            elif isinstance(message, EndRound):
+                self.tape.append((idx_frame, message.goal_suit, None))
+
+            if max_speed and drain:
+                await self.wsCon.scheduler.wait_idle()
+            else:
+                await asyncio.sleep(0)
+
+        await self.wsCon.scheduler.wait_idle()
+        elapsed = time.perf_counter() - start
+        n_runs = self.wsCon.scheduler.n_runs
+
+        stats = {'frames':           len(self.frames),
+                 'strategy_runs':    n_runs,
+                 'orders':           len(self.restapi.orders),
+                 'elapsed':          elapsed,
+                 'messages_per_sec': len(self.frames) / elapsed,
+                 'runs_per_sec':     n_runs / elapsed,
+                 'scheduler':        self.wsCon.scheduler.get_stats()}
+        if self.gameStr.quote_cache is not None:
+            stats['quote_cache'] = self.gameStr.quote_cache.get_stats()
+
+        return stats
+
+
+    def get_markout(self):
+        """
+        Scores the emitted orders against the recorded tape. An order rests from its frame until
+        it is cancelled or replaced, or the book is cleared by a trade of any suit. It is filled
+        if a trade of its suit is printed at its price or better in that time. A filled card is
+        worth GOAL_CARD_PRIZE if it is of the goal suit of the round, nothing otherwise (the pot
+        is ignored). The counterparties of the recording did not see the orders, so this is only
+        a proxy of the PnL.
+
+        OUTPUTS:
+            * (dict): filled orders and the PnL of the fills of the finished rounds
+        """
+
+        # Merge orders and tape in frame order (orders of a frame come after the frame)
+        events = [(frame, 0, 'tape', event) for frame, *event in self.tape]
+        events += [(order['frame'], 1, 'order', order) for order in self.restapi.orders]
+        events.sort(key=lambda x: (x[0], x[1]))
+
+        resting, fills, pnl, n_fills = {}, [], 0, 0
+        for _, _, kind, event in events:
+
+            if kind == 'order':
+                key = (event['suit'] + 's', event['direction'])
+                if event['action'] == 'post':
+                    resting[key] = event['price']
+                else:
+                    resting.pop(key, None)
+                continue
+
+            suit, price = event
+            # End of the round: fills are valued with the goal suit
+            if price is None:
+                for fill_suit, direction, fill_price in fills:
+                    value = GOAL_CARD_PRIZE if fill_suit == suit else 0
+                    pnl += value - fill_price if direction == 'buy' else fill_price - value
+                n_fills += len(fills)
+                resting, fills = {}, []
+                continue
+
+            # A trade: my resting order would have been hit first if it was at least as good
+            if resting.get((suit, 'buy'), -1) >= price:
+                fills.append((suit, 'buy', resting[(suit, 'buy')]))
+            elif resting.get((suit, 'sell'), 100) <= price:
+                fills.append((suit, 'sell', resting[(suit, 'sell')]))
+            resting = {}
+
+        return {'fills': n_fills, 'pnl': pnl}
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Replays a recorded WebSocket session.')
+    parser.add_argument('session', help='session file')
+    parser.add_argument('--variant', default='base', choices=list(VARIANTS))
+    parser.add_argument('--wall-clock', action='store_true', help='replays at the original pace')
+    parser.add_argument('--no-drain', action='store_true', help='coalesces strategy runs as in a live session')
+    parser.add_argument('--speculative', action='store_true', help='reuses and computes ahead the quotes')
+    parser.add_argument('--opening', action='store_true', help='looks up the quotes of the opening hands')
+    parser.add_argument('--orders', help='writes the emitted order stream (JSON lines) to this file')
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+
+    replayer = SessionReplayer(args.session, args.variant, speculative=args.speculative, opening=args.opening)
+    stats = asyncio.run(replayer.run(max_speed=not args.wall_clock, drain=not args.no_drain))
+    stats['markout'] = replayer.get_markout()
+    print(json.dumps(stats, indent=2))
+
+    if args.orders:
+        with open(args.orders, 'w') as f:
+            for order in replayer.restapi.orders:
+                f.write(json.dumps(order) + '\n')
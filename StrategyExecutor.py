@@ -0,0 +1,108 @@
+import os
+import asyncio
+import logging
+import multiprocessing
+import concurrent.futures
+
+import QueueLogging
+from GoalSuitEstimator import GoalSuitEstimator
+from GoalSuitPremium import GoalSuitPremium
+from GameStrategy import compute_decision, compute_quotes
+
+logger = logging.getLogger(__name__)
+
+
+# Tables and portfolio evaluator of a worker process
+worker_state = {}
+
+
+def init_worker(portEval_class, params):
+    """
+    Loads the tables (memory mapped, shared with the other processes) and builds the
+    portfolio evaluator of a worker process.
+    """
+
+    # Workers log warnings only
+    QueueLogging.reset_after_fork()
+    logging.disable(max(logging.root.manager.disable, logging.INFO))
+
+    worker_state['goalEst']  = GoalSuitEstimator()
+    worker_state['portEval'] = portEval_class(GoalSuitPremium(), worker_state['goalEst'], params)
+
+
+def compute_in_worker(snapshot):
+    return compute_decision(snapshot, worker_state['goalEst'], worker_state['portEval'])
+
+
+def compute_quotes_in_worker(pl_cards, speculative):
+    return compute_quotes(pl_cards, worker_state['goalEst'], worker_state['portEval'], speculative)
+
+
+def get_pid():
+    return os.getpid()
+
+
+
+class StrategyExecutor:
+
+    def __init__(self, mode='thread', max_workers=1, portEval=None) -> None:
+        """
+        Runs the strategy computation (see GameStrategy.compute_decision) off the event loop, so
+        frames keep being read while it runs. Only the snapshot goes in and the decision comes back.
+
+        INPUTS:
+            * mode (str): "thread" (shares the tables and the portfolio evaluator, still holds the GIL
+                          while computing) | "process" (own GIL, tables memory mapped in every worker)
+            * max_workers (int): threads or processes. The scheduler runs one computation at a time per bot
+            * portEval (PortfolioEval): evaluator of the bot, rebuilt in the workers in process mode
+        """
+
+        self.mode = mode
+
+        if mode == 'thread':
+            self.pool = concurrent.futures.ThreadPoolExecutor(max_workers, thread_name_prefix='Strategy')
+        elif mode == 'process':
+            # Fork: workers start with the loaded modules and map the same table files
+            self.pool = concurrent.futures.ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context('fork'),
+                                                               initializer=init_worker, initargs=(type(portEval), portEval.params))
+            # Start the workers now, not on the first tick
+            pids = set(future.result() for future in [self.pool.submit(get_pid) for _ in range(max_workers)])
+            logger.info(f'Strategy workers started: {sorted(pids)}.')
+        else:
+            raise ValueError(f'Unknown strategy executor mode: {mode}')
+
+
+    async def compute(self, snapshot, goalEst, portEval):
+        """
+        Computes the decision of a snapshot in the pool.
+
+        INPUTS:
+            * snapshot (StrategySnapshot)
+            * goalEst (GoalSuitEstimator), portEval (PortfolioEval): used in thread mode
+
+        OUTPUTS:
+            * (StrategyDecision)
+        """
+
+        loop = asyncio.get_running_loop()
+        if self.mode == 'thread':
+            return await loop.run_in_executor(self.pool, compute_decision, snapshot, goalEst, portEval)
+        return await loop.run_in_executor(self.pool, compute_in_worker, snapshot)
+
+
+    async def compute_quotes(self, pl_cards, goalEst, portEval, speculative=False):
+        """
+        Computes the quotes of an inventory in the pool (see GameStrategy.compute_quotes).
+
+        OUTPUTS:
+            * (QuoteEntry)
+        """
+
+        loop = asyncio.get_running_loop()
+        if self.mode == 'thread':
+            return await loop.run_in_executor(self.pool, compute_quotes, pl_cards, goalEst, portEval, speculative)
+        return await loop.run_in_executor(self.pool, compute_quotes_in_worker, pl_cards, speculative)
+
+
+    def close(self):
+        self.pool.shutdown(wait=True)
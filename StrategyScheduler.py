@@ -0,0 +1,105 @@
+import asyncio
+import logging
+
+from GameStrategy import GameStrategy
+
+logger = logging.getLogger(__name__)
+
+
+class StrategyScheduler:
+
+    def __init__(self, gameStr: GameStrategy) -> None:
+        """
+        Runs at most one strategy computation at a time. Requests arriving while a run is
+        in flight are coalesced into a single rerun on the newest state (latest wins). Between
+        runs, the quotes of the next inventories are computed ahead (GameStrategy.speculate).
+
+        INPUTS:
+            * gameStr (GameStrategy)
+        """
+
+        self.gameStr = gameStr
+        self.task    = None
+        self.pending = False
+
+        # Counters
+        self.n_requests  = 0
+        self.n_runs      = 0
+        self.n_coalesced = 0
+        self.n_dropped   = 0
+
+
+    def request_run(self):
+        """
+        Requests a strategy run. It returns immediately.
+        """
+
+        self.n_requests += 1
+
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+        elif self.pending:
+            # Already waiting for a rerun, which will see this update too
+            self.n_coalesced += 1
+        else:
+            self.pending = True
+
+
+    def discard_pending(self):
+        """
+        Drops the pending rerun, if any. Used when the round or the game ends.
+        """
+
+        if self.pending:
+            self.pending = False
+            self.n_dropped += 1
+
+
+    async def run(self):
+        """
+        Performs the strategy until no new request arrived during the last run, then speculates
+        until a new request arrives or there is nothing left to compute.
+        """
+
+        while True:
+            self.pending = False
+            self.n_runs += 1
+
+            try:
+                await self.gameStr.perform_strategy()
+            except Exception:
+                logger.exception('Strategy run failed.')
+
+            if self.pending:
+                continue
+
+            try:
+                await self.gameStr.speculate(lambda: self.pending)
+            except Exception:
+                logger.exception('Speculative quotes failed.')
+
+            if not self.pending:
+                break
+
+
+    async def wait_idle(self):
+        """
+        Waits until the strategy run in flight (and its reruns and speculation) finished.
+        """
+
+        if self.task is not None:
+            await self.task
+
+
+    def get_stats(self):
+        """
+        Returns the scheduler counters.
+
+        OUTPUTS:
+            * (dict): requests, runs, coalesced and dropped runs
+        """
+
+        return {'requests':  self.n_requests,
+                'runs':      self.n_runs,
+                'coalesced': self.n_coalesced,
+                'dropped':   self.n_dropped}
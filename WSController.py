@@ -7,7 +7,9 @@ from GameController import GameController
 from GameStrategy import GameStrategy
 from GoalSuitEstimator import GoalSuitEstimator
 from PortfolioEval import PortfolioEval
-from RESTAPIController import RESTAPIController
+from RESTAPIController import AsyncRESTAPIController
+from StrategyScheduler import StrategyScheduler
+from WSMessages import MessageDecoder, StatusMessage, UpdateMessage, DealingCards, EndRound, EndGame
 
 logger = logging.getLogger(__name__)
 
@@ -17,18 +19,23 @@ class WSController:
     def __init__(self, 
                  uri, 
                  player_id, 
-                 restapi: RESTAPIController, 
+                 restapi: AsyncRESTAPIController, 
                  game: GameController, 
                  gameStr: GameStrategy, 
                  goalEst: GoalSuitEstimator,
-                 portEval: PortfolioEval) -> None:
+                 portEval: PortfolioEval,
+                 reconcile_interval = 5.0,
+                 recorder = None) -> None:
         """
         Constructor.
 
         INPUTS:
-            * restapi (RESTAPIController): REST API object
+            * restapi (AsyncRESTAPIController): REST API object
             * game (GameController)
             * player_id (str): ID of the player.
+            * reconcile_interval (double): seconds between inventory reconciliations with the REST API,
+                                           None to reconcile only on detected drift.
+            * recorder (SessionRecorder): records every incoming frame, None to disable.
         """
 
         self.uri            = uri
@@ -38,6 +45,16 @@ class WSController:
         self.gameStr        = gameStr
         self.goalEst        = goalEst
         self.portEval       = portEval
+        self.scheduler      = StrategyScheduler(gameStr)
+        self.tracer         = gameStr.tracer
+        self.decoder        = MessageDecoder(game.get_player_row)
+        self.reconcile_interval = reconcile_interval
+        self.reconcile_event    = asyncio.Event()
+        self.cards_were_dealt   = False
+        self.n_deals            = 0
+        self.n_no_inventory     = 0
+        self.recorder           = recorder
+        self.last_latency       = {}
 
 
     async def subscribe_to_websocket(self):
@@ -52,7 +69,13 @@ class WSController:
             await websocket.send(json.dumps(initial_request))
             logger.info("WebSocket request was sent.")
 
-            await self.handle_messages(websocket)
+            reconciler = asyncio.create_task(self.reconcile_inventory())
+            try:
+                await self.handle_messages(websocket)
+            finally:
+                reconciler.cancel()
+                if self.recorder is not None:
+                    self.recorder.close()
 
 
 
@@ -61,65 +84,142 @@ class WSController:
         Handle the messages from the websocket.
         """
 
-        cards_were_dealt = False
+        self.cards_were_dealt = False
 
         while True:
-            message = await ws.recv()
-            message = json.loads(message)
-
-            if "status" in message:
-                if message['status'] == "SUCCESS":
-                    logger.info("Correctly subscribed to the websocket.")
-                elif message['status'] == "UNKNOWN_PLAYER":
-                    logger.error("Unknown player. If test mode then register in Testnet.")
-                elif message['status'] == "UNAUTHORIZED_ACTION":
-                    logger.error("Unauthorized action. Subscription to websocket failed.")
-                elif message['status'] == "PARSE_ERROR":
-                    logger.error("JSON malformed. Subscription to websocket failed.")
-
-            elif "kind" in  message:
-
-                # The game has ended
-                if message['kind'] == "end_game":
-                    logger.info("The game ended.")
-                    for player in message['data']['player_points']:
-                        logger.info(f"{player['player_name']} has {player['points']} points.")
-                    self.gameCon.print_game_end(message)
-                    self.gameCon.reset_game_inventory()
-                    self.gameStr.reset()
-                    cards_were_dealt = False
-                
-                # The round has ended
-                elif message['kind'] == "end_round":
-                    logger.info(f'Round has ended.')
-                    self.gameCon.print_round_end(message)
-                    self.gameCon.reset_round_inventory()
+            frame = await ws.recv()
+            received_ns = self.tracer.now()
+            if self.recorder is not None:
+                self.recorder.record(frame)
+            self.handle_message(frame, received_ns)
+
+
+
+    def handle_message(self, frame, received_ns=None):
+        """
+        Handles one frame of the websocket.
+
+        INPUTS:
+            * frame (str | bytes): raw WebSocket frame
+            * received_ns (int): perf_counter_ns when the frame was received, now if None
+
+        OUTPUTS:
+            * decoded message (see WSMessages), None if unknown
+        """
+
+        if received_ns is None:
+            received_ns = t = self.tracer.now()
+        else:
+            t = self.tracer.record('receive', received_ns)
+
+        message = self.decoder.decode(frame)
+        t = self.tracer.record('decode', t)
+
+        if isinstance(message, StatusMessage):
+            if message.status == "SUCCESS":
+                logger.info("Correctly subscribed to the websocket.")
+            elif message.status == "UNKNOWN_PLAYER":
+                logger.error("Unknown player. If test mode then register in Testnet.")
+            elif message.status == "UNAUTHORIZED_ACTION":
+                logger.error("Unauthorized action. Subscription to websocket failed.")
+            elif message.status == "PARSE_ERROR":
+                logger.error("JSON malformed. Subscription to websocket failed.")
+
+        # The game has ended
+        elif isinstance(message, EndGame):
+            logger.info("The game ended.")
+            for player in message.player_points:
+                logger.info(f"{player['player_name']} has {player['points']} points.")
+            self.gameCon.print_game_end(message)
+            self.gameCon.reset_game_inventory()
+            self.scheduler.discard_pending()
+            self.gameStr.reset()
+            self.cards_were_dealt = False
+        
+        # The round has ended
+        elif isinstance(message, EndRound):
+            logger.info(f'Round has ended.')
+            self.gameCon.print_round_end(message)
+            logger.info(f'Order book snapshots: {self.gameCon.book.get_stats()}')
+            self.gameCon.reset_round_inventory()
+
+            # The exchange lists the players in seat order: next rounds keep it
+            self.gameCon.set_players([pl_inventory['player_name'] for pl_inventory in message.player_inventories])
+            self.scheduler.discard_pending()
+            self.gameStr.reset()
+            logger.info(f'Strategy scheduler: {self.scheduler.get_stats()}')
+            if self.gameStr.quote_cache is not None:
+                logger.info(f'Quote cache: {json.dumps(self.gameStr.quote_cache.get_stats())}')
+            self.last_latency = self.tracer.get_summary()
+            logger.info(f'Latency (us): {json.dumps(self.last_latency)}')
+            self.tracer.reset()
+            self.cards_were_dealt = False
+
+        # Cards were dealt
+        elif isinstance(message, DealingCards):
+            logger.info(f'Cards were dealt.')
+            self.gameCon.set_starting_hand(message)
+            self.tracer.set_frame(received_ns, self.tracer.now())
+            self.scheduler.request_run()
+            self.cards_were_dealt = True
+            self.n_deals += 1
+
+        # State was updated
+        elif isinstance(message, UpdateMessage):
+
+            if self.cards_were_dealt:
+
+                # Update players and inventory (mine is tracked from the trades)
+                is_trade = self.gameCon.update_game_status(message)
+                if is_trade:
                     self.gameStr.reset()
-                    cards_were_dealt = False
-
-                # Cards were dealt
-                elif message['kind'] == "dealing_cards":
-                    logger.info(f'Cards were dealt.')
-                    self.gameCon.set_starting_hand(message)
-                    asyncio.create_task(self.gameStr.perform_strategy())
-                    cards_were_dealt = True
-
-                # State was updated
-                elif message['kind'] == "update":
-
-                    if cards_were_dealt:
-
-                        # Update inventory with REST API because I found it more reliable during test phase
-                        bool_inven, nsuits = self.gameCon.get_restAPI().get_inventory()
-                        suit_names = ['spades', 'clubs', 'hearts', 'diamonds']
-                        if bool_inven:
-                            for idx, nsuit in enumerate(nsuits):
-                                self.gameCon.set_suit_n(suit_names[idx], nsuit)
-
-                        # Update players and inventory
-                        is_trade = self.gameCon.update_game_status(message)
-                        if is_trade:
-                            self.gameStr.reset()
-                        asyncio.create_task(self.gameStr.perform_strategy())
-
-    
\ No newline at end of file
+                self.tracer.set_frame(received_ns, self.tracer.record('update_game_status', t))
+                self.scheduler.request_run()
+
+                # Reconcile the inventory with the REST API if it drifted
+                if self.gameCon.inventory_drift or (self.restapi.n_no_inventory != self.n_no_inventory):
+                    self.n_no_inventory = self.restapi.n_no_inventory
+                    self.reconcile_event.set()
+
+        return message
+
+
+
+    async def reconcile_inventory(self):
+        """
+        Reconciles my inventory with the REST API in the background, periodically or when
+        a drift was detected. It never runs in the message handling path.
+        """
+
+        while True:
+
+            # Wait for the next period or for a detected drift
+            try:
+                await asyncio.wait_for(self.reconcile_event.wait(), timeout=self.reconcile_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.reconcile_event.clear()
+
+            if not self.cards_were_dealt:
+                continue
+
+            # A failed reconciliation must not stop the next ones
+            try:
+                await self.reconcile_once()
+            except Exception:
+                logger.exception('Inventory reconciliation failed.')
+
+
+
+    async def reconcile_once(self):
+        """
+        Requests my inventory to the REST API and reconciles the tracked one with it.
+        """
+
+        n_own_trades, n_deals = self.gameCon.n_own_trades, self.n_deals
+        bool_inven, nsuits = await self.restapi.get_inventory()
+
+        # A trade of mine or a new deal in the meantime makes the answer stale
+        if bool_inven and self.cards_were_dealt and (n_own_trades, n_deals) == (self.gameCon.n_own_trades, self.n_deals):
+            if self.gameCon.reconcile_inventory(nsuits):
+                self.scheduler.request_run()
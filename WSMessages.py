@@ -0,0 +1,210 @@
+import json
+
+# Fast JSON decoder when available
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    json_loads = json.loads
+
+# Suits in the order used by every array [spades, clubs, hearts, diamonds]
+SUITS = ['spades', 'clubs', 'hearts', 'diamonds']
+SUIT_INDEX = {suit: idx for idx, suit in enumerate(SUITS)}
+
+# Order in which the order book is walked (players are registered in this order)
+BOOK_ORDER = [SUIT_INDEX[suit] for suit in ['spades', 'clubs', 'diamonds', 'hearts']]
+
+# Empty side of the order book
+EMPTY_BOOK = ()
+
+
+
+class StatusMessage:
+
+    __slots__ = ('status',)
+
+    def __init__(self, status) -> None:
+        """
+        Answer to the subscription request.
+
+        INPUTS:
+            * status (str): "SUCCESS" | "UNKNOWN_PLAYER" | "UNAUTHORIZED_ACTION" | "PARSE_ERROR"
+        """
+        self.status = status
+
+
+
+class Trade:
+
+    __slots__ = ('suit', 'price', 'buyer', 'seller', 'idx_buyer', 'idx_seller')
+
+    def __init__(self, suit, price, buyer, seller, idx_buyer, idx_seller) -> None:
+        """
+        Last trade of an update.
+
+        INPUTS:
+            * suit (str): "spade" | "club" | "heart" | "diamond"
+            * price (int)
+            * buyer, seller (str): name of the players
+            * idx_buyer, idx_seller (int): player index, -1 if unknown
+        """
+        self.suit       = suit
+        self.price      = price
+        self.buyer      = buyer
+        self.seller     = seller
+        self.idx_buyer  = idx_buyer
+        self.idx_seller = idx_seller
+
+
+
+class UpdateMessage:
+
+    __slots__ = ('trade', 'bids', 'asks')
+
+    def __init__(self, trade, bids, asks) -> None:
+        """
+        Order book update.
+
+        INPUTS:
+            * trade (Trade): last trade, None if the update has no trade
+            * bids (list): for each suit [spades, clubs, hearts, diamonds], tuple of (price, player index)
+            * asks (list): for each suit [spades, clubs, hearts, diamonds], tuple of (price, player index)
+        """
+        self.trade = trade
+        self.bids  = bids
+        self.asks  = asks
+
+
+
+class DealingCards:
+
+    __slots__ = ('cards',)
+
+    def __init__(self, cards) -> None:
+        """
+        Starting hand.
+
+        INPUTS:
+            * cards (list): number of cards for each suit [spades, clubs, hearts, diamonds]
+        """
+        self.cards = cards
+
+
+
+class EndRound:
+
+    __slots__ = ('card_count', 'goal_suit', 'player_inventories', 'player_points')
+
+    def __init__(self, card_count, goal_suit, player_inventories, player_points) -> None:
+        """
+        Results of the round, as sent by the exchange.
+        """
+        self.card_count         = card_count
+        self.goal_suit          = goal_suit
+        self.player_inventories = player_inventories
+        self.player_points      = player_points
+
+
+
+class EndGame:
+
+    __slots__ = ('player_points',)
+
+    def __init__(self, player_points) -> None:
+        """
+        Results of the game, as sent by the exchange.
+
+        INPUTS:
+            * player_points (list): [{"player_name": str, "points": int}, ...]
+        """
+        self.player_points = player_points
+
+
+
+class MessageDecoder:
+
+    def __init__(self, player_lookup=None) -> None:
+        """
+        Decodes the WebSocket frames into typed records. It is not zero-copy: the JSON decoder still
+        builds the dicts of the frame, the records only replace the ones kept afterwards.
+
+        INPUTS:
+            * player_lookup (callable): returns the player index of a player name (-1 if unknown).
+                                        It is called in the order the old parser met the players,
+                                        so it can register new players (see GameController.get_player_row).
+        """
+
+        self.player_lookup = player_lookup if player_lookup is not None else (lambda player_id: -1)
+
+
+    def decode(self, frame):
+        """
+        Decodes a frame.
+
+        INPUTS:
+            * frame (str | bytes): raw WebSocket frame
+
+        OUTPUTS:
+            * StatusMessage | UpdateMessage | DealingCards | EndRound | EndGame, None if unknown
+        """
+
+        message = json_loads(frame)
+
+        if "status" in message:
+            return StatusMessage(message['status'])
+
+        kind = message.get('kind')
+        if kind == "update":
+            return self.decode_update(message['data'])
+        elif kind == "dealing_cards":
+            return DealingCards([message['data'].get(suit, 0) for suit in SUITS])
+        elif kind == "end_round":
+            data = message['data']
+            return EndRound(data['card_count'], data['goal_suit'], data['player_inventories'], data['player_points'])
+        elif kind == "end_game":
+            return EndGame(message['data']['player_points'])
+
+        return None
+
+
+    def decode_update(self, data):
+        """
+        Decodes the data of an update frame.
+
+        INPUTS:
+            * data (dict): 'data' field of the frame
+
+        OUTPUTS:
+            * (UpdateMessage)
+        """
+
+        lookup = self.player_lookup
+
+        # Trade string: "suit,price,buyer,seller"
+        trade = None
+        if data['trade'] != '':
+            suit, price, buyer, seller = data['trade'].split(',')
+            trade = Trade(suit, int(price), buyer, seller, lookup(buyer), lookup(seller))
+
+        # Sides hold a handful of orders: plain tuples are cheaper to build than arrays
+        bids = [EMPTY_BOOK] * 4
+        asks = [EMPTY_BOOK] * 4
+        for idx_suit in BOOK_ORDER:
+            book = data[SUITS[idx_suit]]
+
+            side = book['asks']
+            if side:
+                orders = []
+                for price, player_id in side:
+                    orders.append((price, lookup(player_id)))
+                asks[idx_suit] = tuple(orders)
+
+            side = book['bids']
+            if side:
+                orders = []
+                for price, player_id in side:
+                    orders.append((price, lookup(player_id)))
+                bids[idx_suit] = tuple(orders)
+
+        return UpdateMessage(trade, bids, asks)
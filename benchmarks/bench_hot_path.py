@@ -0,0 +1,324 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import tracemalloc
+import numpy as np
+
+# Modules of the bot live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from GoalSuitEstimator import GoalSuitEstimator
+from GoalSuitPremium import GoalSuitPremium
+from GameController import GameController
+from GameStrategy import GameStrategy
+from PortfolioVariants import VARIANTS
+from SelfPlaySimulator import SelfPlayTable
+from SessionReplayer import StubRESTAPIController
+from WSMessages import MessageDecoder, DealingCards
+from ColoredLogger import ColoredLogger
+from QueueLogging import setup_queue_logging, stop_queue_logging
+
+
+def capture_rounds(goalEst, gsPremium, n_rounds, seed):
+    """
+    Plays self-play rounds and keeps what the first bot saw: its starting hand and every
+    order book update, so the states follow the distribution of real games.
+
+    OUTPUTS:
+        * (str): name of the first bot
+        * (list): (starting hand, list of update data) for each round
+    """
+
+    table = SelfPlayTable(['base', 'monocolor', 'monocolor2', 'base'], goalEst, gsPremium, seed=seed)
+    engine = table.engine
+    rounds = []
+
+    start_round, get_update = engine.start_round, engine.get_update
+
+    def recording_start_round():
+        hands = start_round()
+        rounds.append((hands[table.bots[0].name], []))
+        return hands
+
+    def recording_get_update(trade):
+        data = get_update(trade)
+        rounds[-1][1].append(data)
+        return data
+
+    engine.start_round, engine.get_update = recording_start_round, recording_get_update
+
+    async def play():
+        for _ in range(n_rounds):
+            await table.play_round()
+    asyncio.run(play())
+
+    return table.bots[0].name, rounds
+
+
+
+class Bot:
+
+    def __init__(self, name, variant, goalEst, gsPremium) -> None:
+        """
+        GameController, GameStrategy and PortfolioEval of a bot with a stub REST API.
+        """
+
+        self.restapi  = StubRESTAPIController()
+        self.goalEst  = goalEst
+        self.portEval = VARIANTS[variant](gsPremium, goalEst)
+        self.gameCon  = GameController()
+        self.gameStr  = GameStrategy(goalEst, self.portEval, self.gameCon)
+        self.gameCon.set_restAPI(self.restapi)
+        self.gameCon.set_playerName(name)
+        self.decoder  = MessageDecoder(self.gameCon.get_player_row)
+
+
+    def start_round(self, hand):
+        self.gameCon.reset_round_inventory()
+        self.gameStr.reset()
+        self.gameCon.set_starting_hand(DealingCards(hand))
+
+
+    def apply(self, data):
+        if self.gameCon.update_game_status(self.decoder.decode_update(data)):
+            self.gameStr.reset()
+
+
+
+def capture_states(bot, rounds):
+    """
+    Replays the rounds and keeps the inputs of every step of the strategy after each update.
+
+    OUTPUTS:
+        * (list): dict of inputs for each state
+    """
+
+    states = []
+    for hand, updates in rounds:
+        bot.start_round(hand)
+        for data in updates:
+            bot.apply(data)
+            gameCon, portEval = bot.gameCon, bot.portEval
+
+            n_suits = gameCon.get_ncards_per_suit()
+            try:
+                probs, probs_10 = bot.goalEst.get_goalsuit_prob(n_suits)
+            except ValueError:
+                continue
+            own_cards = gameCon.get_my_inventory()
+            pl_cards  = gameCon.inventory2d.copy()
+            port_ev   = portEval.evaluate_portfolio(own_cards, pl_cards, probs, probs_10)
+            neutral   = portEval.get_neutral_quotes(port_ev, pl_cards, probs, probs_10)
+            adjusted  = portEval.get_adjusted_quotes(neutral, sum(n_suits), probs, own_cards)
+
+            states.append({'n_suits':   list(n_suits),
+                           'own_cards': own_cards,
+                           'pl_cards':  pl_cards,
+                           'probs':     probs,
+                           'probs_10':  probs_10,
+                           'port_ev':   port_ev,
+                           'neutral':   neutral,
+                           'adjusted':  adjusted,
+                           'orderbook': json.loads(json.dumps(gameCon.orderbook))})
+
+    return states
+
+
+
+def build_cases(name, variant, rounds, goalEst, gsPremium):
+    """
+    Benchmark cases. Each one prepares its state and returns its calls in order: the setup
+    steps of the stateful cases (round starts, updates between ticks) are run but not timed.
+
+    OUTPUTS:
+        * (dict): name of the case -> function returning a list of (zero argument callable, timed)
+    """
+
+    states = capture_states(Bot(name, variant, goalEst, gsPremium), rounds)
+    portEval = Bot(name, variant, goalEst, gsPremium).portEval
+
+    def goalsuit_prob():
+        return [(lambda s=s: goalEst.get_goalsuit_prob(s['n_suits']), True) for s in states]
+
+    def goal_suit_premium():
+        return [(lambda s=s, suit=suit: gsPremium.get_goal_suit_premium(s['own_cards'][suit], s['pl_cards'][:, suit], s['probs_10'][suit]), True)
+                for s in states for suit in range(4)]
+
+    def evaluate_portfolio():
+        return [(lambda s=s: portEval.evaluate_portfolio(s['own_cards'], s['pl_cards'], s['probs'], s['probs_10']), True) for s in states]
+
+    def neutral_quotes():
+        return [(lambda s=s: portEval.get_neutral_quotes(s['port_ev'], s['pl_cards'], s['probs'], s['probs_10']), True) for s in states]
+
+    def adjusted_quotes():
+        return [(lambda s=s: portEval.get_adjusted_quotes(s['neutral'], sum(s['n_suits']), s['probs'], s['own_cards']), True) for s in states]
+
+    def market_taking_order():
+        return [(lambda s=s: portEval.get_market_taking_order(s['orderbook'], s['neutral'], s['adjusted']), True) for s in states]
+
+    def market_limiting_order():
+        return [(lambda s=s: portEval.get_market_limiting_order(s['neutral'], s['adjusted']), True) for s in states]
+
+    def update_game_status():
+        bot = Bot(name, variant, goalEst, gsPremium)
+        decoded = []
+        calls = []
+        for hand, updates in rounds:
+            calls.append((lambda hand=hand: bot.start_round(hand), False))
+            for data in updates:
+                # Frames are decoded before the timed call: only the update of the state is timed
+                calls.append((lambda data=data: decoded.append(bot.decoder.decode_update(data)), False))
+                calls.append((lambda: bot.gameCon.update_game_status(decoded.pop()), True))
+        return calls
+
+    def perform_strategy():
+        bot = Bot(name, variant, goalEst, gsPremium)
+        loop = asyncio.new_event_loop()
+        calls = []
+        for hand, updates in rounds:
+            calls.append((lambda hand=hand: bot.start_round(hand), False))
+            for data in updates:
+                calls.append((lambda data=data: bot.apply(data), False))
+                calls.append((lambda: loop.run_until_complete(bot.gameStr.perform_strategy()), True))
+        return calls
+
+    return {'get_goalsuit_prob':         goalsuit_prob,
+            'get_goal_suit_premium':     goal_suit_premium,
+            'evaluate_portfolio':        evaluate_portfolio,
+            'get_neutral_quotes':        neutral_quotes,
+            'get_adjusted_quotes':       adjusted_quotes,
+            'get_market_taking_order':   market_taking_order,
+            'get_market_limiting_order': market_limiting_order,
+            'update_game_status':        update_game_status,
+            'perform_strategy':          perform_strategy}
+
+
+
+def measure(prepare, repeat):
+    """
+    Latency percentiles (ns per call) over every timed call of the repetitions, and the
+    allocations per call (peak above the memory in use before the call, and retained).
+    """
+
+    timings = []
+    for _ in range(repeat):
+        calls = prepare()
+        for call, timed in calls:
+            if not timed:
+                call()
+                continue
+            start = time.perf_counter_ns()
+            call()
+            timings.append(time.perf_counter_ns() - start)
+
+    # Allocations (separate pass, tracing slows the calls down)
+    calls = prepare()
+    peaks, retained = [], 0
+    tracemalloc.start()
+    for call, timed in calls:
+        if not timed:
+            call()
+            continue
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        call()
+        current, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        retained += current - before
+    tracemalloc.stop()
+
+    timings = np.array(timings, dtype=float)
+    return {'calls':                len(peaks),
+            'mean_ns':              float(timings.mean()),
+            'p50_ns':               float(np.percentile(timings, 50)),
+            'p90_ns':               float(np.percentile(timings, 90)),
+            'p99_ns':               float(np.percentile(timings, 99)),
+            'max_ns':               float(timings.max()),
+            'peak_bytes_per_call':  float(np.mean(peaks)),
+            'retained_bytes_per_call': retained / len(peaks)}
+
+
+
+def compare(results, baseline, threshold, metrics):
+    """
+    Compares the results with a saved baseline.
+
+    OUTPUTS:
+        * (list): regressions, the metrics that grew more than the threshold (relative)
+    """
+
+    regressions = []
+    for case, stats in results['cases'].items():
+        if case not in baseline['cases']:
+            continue
+        for metric in metrics:
+            old, new = baseline['cases'][case][metric], stats[metric]
+            if old > 0 and (new - old) / old > threshold:
+                regressions.append({'case': case, 'metric': metric, 'baseline': old, 'current': new, 'change': (new - old) / old})
+    return regressions
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency percentiles and allocations of the hot-path functions.')
+    parser.add_argument('--variant', default='base', choices=list(VARIANTS))
+    parser.add_argument('--rounds', type=int, default=20, help='self-play rounds giving the states')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help='timing repetitions of every call')
+    parser.add_argument('--cases', nargs='+', help='cases to run (all by default)')
+    parser.add_argument('--out', help='writes the results (JSON) to this file')
+    parser.add_argument('--baseline', help='results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative growth flagged as a regression')
+    parser.add_argument('--metrics', nargs='+', default=['p50_ns', 'p90_ns', 'peak_bytes_per_call'])
+    parser.add_argument('--logging', default='off', choices=['off', 'sync', 'queue'],
+                        help='INFO logs written to the null device, synchronously or by the background writer')
+    args = parser.parse_args()
+
+    if args.logging == 'off':
+        logging.disable(logging.WARNING)
+    else:
+        handler = logging.StreamHandler(open(os.devnull, 'w'))
+        handler.setFormatter(ColoredLogger("{asctime} - {levelname} - {filename} - {message}", style="{", datefmt="%Y-%m-%d %H:%M:%S"))
+        logging.getLogger().setLevel(logging.INFO)
+        logging.getLogger().addHandler(handler)
+        if args.logging == 'queue':
+            setup_queue_logging([handler])
+
+    goalEst, gsPremium = GoalSuitEstimator(), GoalSuitPremium()
+    name, rounds = capture_rounds(goalEst, gsPremium, args.rounds, args.seed)
+    cases = build_cases(name, args.variant, rounds, goalEst, gsPremium)
+
+    results = {'variant': args.variant,
+               'rounds':  args.rounds,
+               'seed':    args.seed,
+               'updates': sum(len(updates) for _, updates in rounds),
+               'python':  platform.python_version(),
+               'numpy':   np.__version__,
+               'logging': args.logging,
+               'cases':   {}}
+    for case in (args.cases or cases):
+        results['cases'][case] = measure(cases[case], args.repeat)
+    stop_queue_logging()
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        results['regressions'] = compare(results, baseline, args.threshold, args.metrics)
+
+    print(json.dumps(results, indent=2))
+
+    if results.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+
+# Modules of the bot live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from GoalSuitEstimator import GoalSuitEstimator
+from GoalSuitPremium import GoalSuitPremium
+from GameController import GameController
+from GameStrategy import GameStrategy
+from WSController import WSController
+from SessionReplayer import StubRESTAPIController
+from PortfolioVariants import VARIANTS
+from StrategyExecutor import StrategyExecutor
+from QuoteCache import QuoteCache
+from LatencyTracer import LatencyHistogram
+from WSMessages import SUITS
+from bench_hot_path import capture_rounds
+
+
+def build_frames(rounds):
+    """
+    WebSocket frames of the captured rounds: dealing, updates and end of round.
+    """
+
+    frames = []
+    for hand, updates in rounds:
+        frames.append(json.dumps({'kind': 'dealing_cards', 'data': dict(zip(SUITS, hand))}))
+        frames.extend(json.dumps({'kind': 'update', 'data': data}) for data in updates)
+        frames.append(json.dumps({'kind': 'end_round', 'data': {'card_count': {}, 'goal_suit': 'spades',
+                                                                'player_inventories': [], 'player_points': []}}))
+    return frames
+
+
+
+async def flood(name, frames, variant, mode, rate, interval, goalEst, gsPremium, speculative=False):
+    """
+    Feeds the frames to a WSController at a fixed rate while a monitor task measures the lag of
+    the event loop. Frames arriving while the loop is busy are handled late (as if they waited in
+    the socket buffer), the delay of each frame is measured too.
+
+    OUTPUTS:
+        * (dict): loop lag and frame delay percentiles (us), strategy runs (coalesced requests), quote
+                  cache counters (if speculative) and elapsed time
+    """
+
+    portEval = VARIANTS[variant](gsPremium, goalEst)
+    executor = StrategyExecutor(mode, 1, portEval) if mode != 'inline' else None
+    restapi  = StubRESTAPIController()
+    gameCon  = GameController()
+    gameStr  = GameStrategy(goalEst, portEval, gameCon, executor=executor,
+                            quote_cache=QuoteCache() if speculative else None)
+    gameCon.set_restAPI(restapi)
+    gameCon.set_playerName(name)
+    wsCon    = WSController(None, name, restapi, gameCon, gameStr, goalEst, portEval, reconcile_interval=None)
+
+    lag, delay = LatencyHistogram(), LatencyHistogram()
+    running = True
+
+    async def monitor():
+        while running:
+            start = time.perf_counter_ns()
+            await asyncio.sleep(interval)
+            lag.record(time.perf_counter_ns() - start - int(interval * 1e9))
+
+    monitor_task = asyncio.create_task(monitor())
+    await asyncio.sleep(interval)
+
+    start = time.perf_counter_ns()
+    period = int(1e9 / rate)
+    for idx_frame, frame in enumerate(frames):
+        arrival = start + idx_frame * period
+        now = time.perf_counter_ns()
+        if now < arrival:
+            await asyncio.sleep((arrival - now) / 1e9)
+            now = time.perf_counter_ns()
+        else:
+            # Already buffered: read without waiting, as the websocket would, but let other tasks run
+            await asyncio.sleep(0)
+        delay.record(now - arrival)
+        wsCon.handle_message(frame, now)
+
+    await wsCon.scheduler.wait_idle()
+    elapsed = (time.perf_counter_ns() - start) / 1e9
+    running = False
+    await monitor_task
+    if executor is not None:
+        executor.close()
+
+    results = {'loop_lag_us':    lag.get_summary(),
+               'frame_delay_us': delay.get_summary(),
+               'strategy_runs':  wsCon.scheduler.n_runs,
+               'coalesced':      wsCon.scheduler.n_coalesced,
+               'elapsed':        elapsed}
+    if speculative:
+        results['quote_cache'] = gameStr.quote_cache.get_stats()
+
+    return results
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Event loop lag under a flood of update frames, per strategy execution mode.')
+    parser.add_argument('--modes', nargs='+', default=['inline', 'thread', 'process'], choices=['inline', 'thread', 'process'])
+    parser.add_argument('--variant', default='base', choices=list(VARIANTS))
+    parser.add_argument('--rounds', type=int, default=10, help='self-play rounds giving the frames')
+    parser.add_argument('--rate', type=float, default=5000, help='frames per second')
+    parser.add_argument('--interval', type=float, default=0.001, help='seconds between two lag probes')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--speculative', action='store_true', help='reuses and computes ahead the quotes (QuoteCache)')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    goalEst, gsPremium = GoalSuitEstimator(), GoalSuitPremium()
+    name, rounds = capture_rounds(goalEst, gsPremium, args.rounds, args.seed)
+    frames = build_frames(rounds)
+
+    results = {'frames': len(frames), 'rate': args.rate, 'modes': {}}
+    for mode in args.modes:
+        results['modes'][mode] = asyncio.run(flood(name, frames, args.variant, mode, args.rate, args.interval,
+                                                  goalEst, gsPremium, args.speculative))
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+
+# Modules of the bot live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from WSMessages import MessageDecoder, SUITS, orjson
+from SessionRecorder import read_session
+
+PLAYERS = ['me', 'alice', 'bob', 'carol']
+
+
+def synthesize_frames(n_frames, seed=0):
+    """
+    Builds update frames shaped like the ones sent by the exchange.
+
+    INPUTS:
+        * n_frames (int): number of frames
+        * seed (int): random seed
+
+    OUTPUTS:
+        * (list): raw frames (str)
+    """
+
+    rng = random.Random(seed)
+    frames = []
+    for _ in range(n_frames):
+        data = {}
+        for suit in SUITS:
+            data[suit] = {'bids': [[rng.randint(1, 40), player] for player in rng.sample(PLAYERS, rng.randint(0, 3))],
+                          'asks': [[rng.randint(10, 80), player] for player in rng.sample(PLAYERS, rng.randint(0, 3))]}
+        data['trade'] = ''
+        if rng.random() < 0.2:
+            buyer, seller = rng.sample(PLAYERS, 2)
+            data['trade'] = f'{rng.choice(SUITS)[:-1]},{rng.randint(1, 80)},{buyer},{seller}'
+        frames.append(json.dumps({'kind': 'update', 'data': data}))
+
+    return frames
+
+
+def load_frames(path):
+    """
+    Loads recorded frames, one raw frame per line.
+    """
+
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def load_session(path):
+    """
+    Loads the frames of a session recorded by SessionRecorder (see read_session), as received.
+    """
+
+    _, frames = read_session(path)
+    return [frame for _, frame in frames]
+
+
+def find_players(frames):
+    """
+    Returns the players met in the update frames, in order of appearance.
+    """
+
+    players = {}
+    for frame in frames:
+        message = json.loads(frame)
+        if message.get('kind') != 'update':
+            continue
+        data = message['data']
+        if data['trade'] != '':
+            players.update(dict.fromkeys(data['trade'].split(',')[2:]))
+        for suit in SUITS:
+            for side in ['bids', 'asks']:
+                players.update(dict.fromkeys(player for _, player in data[suit][side]))
+
+    return list(players)
+
+
+def legacy_decode(frame, player_index):
+    """
+    Previous parsing path: generic dicts, trade string split and book walk.
+    """
+
+    message = json.loads(frame)
+    if message.get('kind') != 'update':
+        return message
+
+    data = message['data']
+    if data['trade'] != '':
+        suit, price, buyer, seller = data['trade'].split(',')
+        player_index.get(buyer), player_index.get(seller)
+    for suit in ['spades', 'clubs', 'diamonds', 'hearts']:
+        for ask in data[suit]['asks']:
+            player_index.get(ask[1])
+        for bid in data[suit]['bids']:
+            player_index.get(bid[1])
+
+    return message
+
+
+def measure_times(decoders, frames, repeat):
+    """
+    Returns the best parse time per message (ns) of each decoder. Repetitions of the decoders
+    are interleaved, so a noisy neighbour slows them alike.
+    """
+
+    best = {name: float('inf') for name in decoders}
+    for _ in range(repeat):
+        for name, decode in decoders.items():
+            start = time.perf_counter_ns()
+            for frame in frames:
+                decode(frame)
+            best[name] = min(best[name], time.perf_counter_ns() - start)
+
+    return {name: value / len(frames) for name, value in best.items()}
+
+
+def measure(decode, frames):
+    """
+    Returns the allocations per message (bytes, blocks).
+    """
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    messages = [decode(frame) for frame in frames]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    size   = sum(stat.size_diff for stat in stats)
+    blocks = sum(stat.count_diff for stat in stats)
+    del messages
+
+    n = len(frames)
+    return {'bytes_per_msg': size / n, 'blocks_per_msg': blocks / n}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parse time and allocations per WebSocket message.')
+    parser.add_argument('--frames', help='file with recorded frames, one per line (synthesized if missing)')
+    parser.add_argument('--session', help='session file recorded by SessionRecorder (see the "record" setting)')
+    parser.add_argument('--n', type=int, default=5000, help='number of synthesized frames')
+    parser.add_argument('--repeat', type=int, default=10, help='timing repetitions (best is kept)')
+    args = parser.parse_args()
+
+    if args.session:
+        frames = load_session(args.session)
+    elif args.frames:
+        frames = load_frames(args.frames)
+    else:
+        frames = synthesize_frames(args.n)
+
+    player_index = {player: idx for idx, player in enumerate(find_players(frames))}
+    decoder = MessageDecoder(lambda player_id: player_index.get(player_id, -1))
+
+    decoders = {'legacy': lambda frame: legacy_decode(frame, player_index),
+                'typed':  decoder.decode}
+    times = measure_times(decoders, frames, args.repeat)
+
+    results = {'source': args.session or args.frames or 'synthesized',
+               'frames': len(frames),
+               'orjson': orjson is not None}
+    for name, decode in decoders.items():
+        results[name] = {'ns_per_msg': times[name], **measure(decode, frames)}
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -9,9 +9,14 @@ from GoalSuitEstimator import GoalSuitEstimator
 from GoalSuitPremium import  GoalSuitPremium
 from PortfolioEval import PortfolioEval
 from WSController import WSController
-from RESTAPIController import RESTAPIController
+from RESTAPIController import AsyncRESTAPIController
 from GameController import GameController
 from GameStrategy import GameStrategy
+from SessionRecorder import SessionRecorder
+from QueueLogging import setup_queue_logging
+from StrategyExecutor import StrategyExecutor
+from QuoteCache import QuoteCache
+from OpeningQuotes import load_opening_quotes
 
 
 # Logging config
@@ -26,12 +31,34 @@ console_handler = logging.StreamHandler()
 console_handler.setFormatter(formatter)
 root_logger.addHandler(console_handler)
 
+# Logs are formatted and written by a background thread (opt-in), False to log synchronously
+QUEUE_LOGGING = False
+
+# Per-tick state dumps (JSON lines, needs QUEUE_LOGGING), None to disable
+TICK_LOG = None # "logs/ticks.jsonl"
+
+# Strategy computation off the event loop: None (inline), "thread" or "process"
+STRATEGY_EXECUTOR = None
+
+# Reuse the quotes and compute ahead the ones of the next trades while idle (opt-in)
+SPECULATIVE_QUOTES = False
+
+# Quotes of every opening hand, built once in the precomputed folder (opt-in)
+OPENING_QUOTES = False
+
 # Initialize objects
 goalEst  = GoalSuitEstimator()
 gsPrem   = GoalSuitPremium()
 portEval = PortfolioEval(gsPrem, goalEst)
 gameCon  = GameController()
-gameStr  = GameStrategy(goalEst, portEval, gameCon)
+executor = StrategyExecutor(STRATEGY_EXECUTOR, 1, portEval) if STRATEGY_EXECUTOR else None
+opening  = load_opening_quotes(goalEst, portEval) if OPENING_QUOTES else None
+quotes   = QuoteCache(opening, SPECULATIVE_QUOTES) if (SPECULATIVE_QUOTES or OPENING_QUOTES) else None
+gameStr  = GameStrategy(goalEst, portEval, gameCon, executor=executor, quote_cache=quotes)
+
+# The log writer thread starts once the workers of a process executor are forked
+if QUEUE_LOGGING:
+    setup_queue_logging([console_handler], tick_path=TICK_LOG)
 
 # Websocket and REST API addresses
 URL_RESTAPI = "http://localhost:8090"# "http://testnet.figgiewars.com" # "http://localhost:8090" # "http://testnet.figgiewars.com" # "http://exchange.figgiewars.com"
@@ -40,16 +67,25 @@ URL_WS      = "ws://localhost:8080" #"ws://testnet-ws.figgiewars.com" # "ws://lo
 # Player id
 PLAYER_ID   = "MyTest" 
 
+# Session recording (replay it with SessionReplayer.py), None to disable
+RECORD_SESSION = None # "sessions/session.rec"
+
 # Register to websocket and REST API
-rest_api = RESTAPIController(URL_RESTAPI)
+rest_api = AsyncRESTAPIController(URL_RESTAPI, timeout=2.0)
 _, player_name = rest_api.register_to_testnet(PLAYER_ID)
 gameCon.set_restAPI(rest_api)
 gameCon.set_playerName(player_name)
-obj = WSController(URL_WS, PLAYER_ID, rest_api, gameCon, gameStr, goalEst, portEval)
+recorder = SessionRecorder(RECORD_SESSION, player_name) if RECORD_SESSION else None
+obj = WSController(URL_WS, PLAYER_ID, rest_api, gameCon, gameStr, goalEst, portEval, recorder=recorder)
 
 # Define an asynchronous function that calls the coroutine
 async def main():
-    await obj.subscribe_to_websocket()
+    try:
+        await obj.subscribe_to_websocket()
+    finally:
+        await rest_api.close()
+        if executor is not None:
+            executor.close()
 
 # Run the asynchronous main function
 asyncio.run(main())
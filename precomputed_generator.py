@@ -1,12 +1,24 @@
+import argparse
+import time
 import numpy as np
 import pandas as pd
 
 
+# Figgie deck configurations: one 12-cards suit, two 10-cards suits and one 8-cards suit.
+# The order sets the order of the floating point sums, keep it to reproduce GoalDist.csv.
+DECKS = ((12, 10, 10, 8), (12, 10, 8, 10), (12, 8, 10, 10),
+         (8, 12, 10, 10), (10, 12, 10, 8), (10, 12, 8, 10),
+         (10, 8, 12, 10), (8, 10, 12, 10), (10, 10, 12, 8),
+         (10, 10, 8, 12), (10, 8, 10, 12), (8, 10, 10, 12))
 
+# Suits of the same colour [spades, clubs, hearts, diamonds]
+SAME_COLOUR = (1, 0, 3, 2)
 
-run_goal_premium = False
-run_goal_distribution = True
+# Pot of the goal suit for 10 and 8 cards
+POTS = {10: 100, 8: 120}
 
+# Highest number of cards of a suit plus one
+N_CARDS_AXIS = 13
 
 
 
@@ -18,149 +30,163 @@ run_goal_distribution = True
 # win in each case.
 ##################################################################
 
+def goal_premium_table():
+    """
+    Builds the goal premium table.
 
-if run_goal_premium:
+    OUTPUTS:
+        * (pandas DataFrame): [Me, Pl_2, Pl_3, Pl_4, Pr_goal, Weight, Pot] for every distribution
+                              of a 10-cards or 8-cards goal suit where I hold at least 2 cards
+    """
 
-    dfDist = pd.DataFrame(0.0, index=range(249), columns=['Me','Pl_2','Pl_3','Pl_4', 'Pr_goal', 'Weight', 'Pot'])
+    # All distributions in loop order (Me, Pl_2, Pl_3, Pl_4)
+    dist = np.indices((11, 11, 11, 11)).reshape(4, -1).T
+    n_cards = dist.sum(axis=1)
+    dist = dist[(dist[:, 0] >= 2) & np.isin(n_cards, list(POTS))]
+    n_cards = dist.sum(axis=1)
 
-    count = 0
+    # Weights: whole pot when I have the majority, split between the ties
+    max_others = dist[:, 1:].max(axis=1)
+    n_ties = (dist[:, 1:] == max_others[:, None]).sum(axis=1) + 1
+    weight = np.where(dist[:, 0] > max_others, 1.0, np.where(dist[:, 0] == max_others, 1.0/n_ties, 0.0))
 
-    for nn in range(2,11):
-        for py2 in range(11):
-            for py3 in range(11):
-                for py4 in range(11):
-                    dist = [nn, py2, py3, py4]
+    table = np.zeros((len(dist), 7))
+    table[:, :4] = dist
+    table[:, 5] = weight
+    table[:, 6] = np.where(n_cards == 10, POTS[10], POTS[8])
 
-                    # Only two cases, 10-cards or 8-cards
-                    if (np.sum(dist) == 10) or (np.sum(dist) == 8):
+    return pd.DataFrame(table, columns=['Me','Pl_2','Pl_3','Pl_4', 'Pr_goal', 'Weight', 'Pot'])
 
-                        # Cards distribution
-                        dfDist.iloc[count, :4] = dist
 
-                        # Pot
-                        if np.sum(dist) == 10:
-                            dfDist.iloc[count, 6] = 100
-                        else:
-                            dfDist.iloc[count, 6] = 120
 
-                        # Weights
-                        if dist[0] > np.max(dist[1:]):
-                            dfDist.iloc[count, 5] = 1.0
-                        elif dist[0] == np.max(dist[1:]):
-                            dfDist.iloc[count, 5] = 1.0/(dist.count(np.max(dist[1:])))
-                        elif dist[0] < np.max(dist[1:]):
-                            dfDist.iloc[count, 5] = 0.0
 
-                        count += 1           
+##################################################################
+# GoalDist.csv generator
+# Computes all the possible distributions of seen cards between
+# four players, the probabability of being goal suit and
+# the probability of being 10 cards.
+##################################################################
 
-    dfDist.to_csv("precomputed/GoalPremium.csv", index=False)
+def get_goals(decks, same_colour=SAME_COLOUR):
+    """
+    Returns the goal suit of each deck configuration, the suit of the same colour as the largest one.
 
+    INPUTS:
+        * decks (numpy 2d array, Dx4): cards of each suit for every configuration
+        * same_colour (tuple): suit of the same colour of each suit
 
+    OUTPUTS:
+        * (numpy array, D)
+    """
 
+    return np.array(same_colour)[decks.argmax(axis=1)]
 
 
+def get_seen_states():
+    """
+    Enumerates the feasible seen-cards states in loop order, with the first suit the most seen.
 
+    OUTPUTS:
+        * (numpy 2d array, Nx4)
+    """
 
+    states = np.indices((N_CARDS_AXIS,) * 4).reshape(4, -1).T
 
-##################################################################
-# GoalDist.csv generator
-# Computes all the possible distributions of seen cards between
-# four players, the probabability of being goal suit and
-# the probability of being 10 cards.
-##################################################################
+    feasible = (states.sum(axis=1) <= 40) & \
+               ((states == 12).sum(axis=1) < 2) & \
+               ((states > 10).sum(axis=1) < 2) & \
+               ((states > 8).sum(axis=1) < 4) & \
+               (states[:, 0] >= states[:, 1:].max(axis=1))
+
+    return states[feasible]
+
+
+def get_likelihoods(states, decks, n_deck=40):
+    """
+    Probability of drawing the seen cards, suit after suit, with each deck configuration.
+    Hypergeometric terms are evaluated with broadcasting, multiplied in the same order as
+    the original loop generator so the rounded table is identical.
+
+    INPUTS:
+        * states (numpy 2d array, Nx4): seen cards of each suit
+        * decks (numpy 2d array, Dx4): cards of each suit for every configuration
+        * n_deck (int): number of cards of the deck
+
+    OUTPUTS:
+        * (numpy 2d array, NxD)
+    """
+
+    seen  = states[:, None, :]                                     # N x 1 x 4
+    cards = decks[None, :, :]                                      # 1 x D x 4
+    drawn = np.concatenate([np.zeros_like(states[:, :1]), np.cumsum(states, axis=1)[:, :-1]], axis=1)[:, None, :]
+
+    # Product of (cards - idx)/(n_deck - drawn - idx) over the seen cards of each suit
+    prob_suits = np.ones(np.broadcast_shapes(seen.shape, cards.shape))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for idx in range(int(states.max())):
+            prob_suits = np.where(idx < seen, prob_suits * ((cards - idx) / (n_deck - drawn - idx)), prob_suits)
+
+    return prob_suits[..., 0] * prob_suits[..., 1] * prob_suits[..., 2] * prob_suits[..., 3]
+
+
+def goal_distribution_table(decks=DECKS, same_colour=SAME_COLOUR, decimals=3):
+    """
+    Builds the goal suit distribution table.
+
+    INPUTS:
+        * decks (tuple): cards of each suit for every deck configuration
+        * same_colour (tuple): suit of the same colour of each suit
+        * decimals (int): rounding of the probabilities, None to keep full precision
+
+    OUTPUTS:
+        * (pandas DataFrame): [Suit_1..4, Pr_suit_1..4, Pr_10_1..4] for every seen-cards state
+    """
+
+    states = get_seen_states()
+    decks  = np.array(decks)
+    goals  = get_goals(decks, same_colour)
+    like   = get_likelihoods(states, decks)
+
+    # Sums in deck order, starting from -0.0 (the exact additive identity, it keeps the signed zeros)
+    sum_tot  = np.full(len(states), -0.0)
+    sum_goal = np.full((len(states), 4), -0.0)
+    sum_10   = np.full((len(states), 4), -0.0)
+    for idx_deck, goal in enumerate(goals):
+        sum_tot += like[:, idx_deck]
+        sum_goal[:, goal] += like[:, idx_deck]
+        if decks[idx_deck, goal] == 10:
+            sum_10[:, goal] += like[:, idx_deck]
+
+    # Probabilities of being goal suit and of the goal suit having 10 cards
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pr_goal = sum_goal / sum_tot[:, None]
+        pr_10   = np.nan_to_num(sum_10 / sum_goal, nan=0.0)
+
+    table = np.hstack([states, pr_goal, pr_10]).astype(float)
+    if decimals is not None:
+        table = table.round(decimals)
+
+    return pd.DataFrame(table, columns=['Suit_1', 'Suit_2', 'Suit_3', 'Suit_4',
+                                        'Pr_suit_1', 'Pr_suit_2', 'Pr_suit_3', 'Pr_suit_4',
+                                        'Pr_10_1', 'Pr_10_2', 'Pr_10_3', 'Pr_10_4'])
+
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Generates the precomputed tables.')
+    parser.add_argument('--tables', nargs='+', default=['premium', 'distribution'], choices=['premium', 'distribution'])
+    parser.add_argument('--out', default='precomputed', help='output folder')
+    parser.add_argument('--no-round', action='store_true', help='keeps full precision of the probabilities')
+    args = parser.parse_args()
+
+    if 'premium' in args.tables:
+        start = time.perf_counter()
+        goal_premium_table().to_csv(f'{args.out}/GoalPremium.csv', index=False)
+        print(f'GoalPremium.csv written in {time.perf_counter() - start:.3f}s')
 
-if run_goal_distribution:
-
-    def prob_calculation(suits, temp):
-        d_goal = np.prod([gg/(40-idx) for idx, gg in enumerate(range(suits[0],suits[0]-temp[0],-1))]) * \
-                np.prod([gg/(40-temp[0]-idx) for idx, gg in enumerate(range(suits[1],suits[1]-temp[1],-1))]) * \
-                np.prod([gg/(40-temp[0]-temp[1]-idx) for idx, gg in enumerate(range(suits[2],suits[2]-temp[2],-1))]) * \
-                np.prod([gg/(40-temp[0]-temp[1]-temp[2]-idx) for idx, gg in enumerate(range(suits[3],suits[3]-temp[3],-1))])
-        
-        return d_goal
-
-    count = 0
-
-    dfGoalSuit = pd.DataFrame(0.0, index=np.arange(6993), columns=['Suit_1', 'Suit_2', 'Suit_3', 'Suit_4', 
-                                                                'Pr_suit_1', 'Pr_suit_2', 'Pr_suit_3', 'Pr_suit_4',
-                                                                'Pr_10_1', 'Pr_10_2', 'Pr_10_3', 'Pr_10_4']) 
-
-    for ii in range(13):
-        for jj in range(13):
-            for zz in range(13):
-                for ww in range(13):
-                    temp = np.array([ii, jj, zz, ww])
-
-                    if (temp.sum() <= 40) and \
-                    (np.count_nonzero(temp == 12) < 2) and \
-                    (np.count_nonzero(temp > 10) < 2) and \
-                    (np.count_nonzero(temp > 8) < 4) and \
-                    (temp[0] >= np.max(temp[1:])): 
-                        
-                        dfGoalSuit.iloc[count, 0:4] = temp
-
-                        # Deck1: 12,10,10,8 -- Goal = 2
-                        suits = [12, 10, 10, 8]
-                        d1_goal = prob_calculation(suits, temp)
-                        
-                        # Deck2:  12,10,8,10 -- Goal = 2
-                        suits = [12, 10, 8, 10]
-                        d2_goal = prob_calculation(suits, temp)
-                        
-                        # Deck3:  12,8,10,10 -- Goal = 2
-                        suits = [12, 8, 10, 10]
-                        d3_goal = prob_calculation(suits, temp)
-                        
-                        # Deck4:  8,12,10,10 -- Goal = 1
-                        suits = [8, 12, 10, 10]
-                        d4_goal = prob_calculation(suits, temp)
-                        
-                        # Deck5:  10,12,10,8 -- Goal = 1
-                        suits = [10, 12, 10, 8]
-                        d5_goal = prob_calculation(suits, temp)
-                        
-                        # Deck6:  10,12,8,10 -- Goal = 1
-                        suits = [10, 12, 8, 10]
-                        d6_goal = prob_calculation(suits, temp)
-
-                        # Deck7:  10,8,12,10 -- Goal = 4
-                        suits = [10, 8, 12, 10]
-                        d7_goal = prob_calculation(suits, temp)
-                        
-                        # Deck8:  8,10,12,10 -- Goal = 4
-                        suits = [8, 10, 12, 10]
-                        d8_goal = prob_calculation(suits, temp)
-                        
-                        # Deck9:  10,10,12,8 -- Goal = 4
-                        suits = [10, 10, 12, 8]
-                        d9_goal = prob_calculation(suits, temp)
-
-                        # Deck10: 10,10,8,12 -- Goal = 3
-                        suits = [10, 10, 8, 12]
-                        d10_goal= prob_calculation(suits, temp)
-                        
-                        # Deck11: 10,8,10,12 -- Goal = 3
-                        suits = [10, 8, 10, 12]
-                        d11_goal= prob_calculation(suits, temp)
-                        
-                        # Deck12: 8,10,10,12 -- Goal = 3
-                        suits = [8, 10, 10, 12]
-                        d12_goal= prob_calculation(suits, temp)
-
-                        # Probabilities of being goal suit
-                        sum_tot = d1_goal + d2_goal + d3_goal + d4_goal + d5_goal + d6_goal + d7_goal + d8_goal + d9_goal + d10_goal + d11_goal + d12_goal
-                        dfGoalSuit.iloc[count, 4] = (d4_goal + d5_goal + d6_goal) / sum_tot
-                        dfGoalSuit.iloc[count, 5] = (d1_goal + d2_goal + d3_goal) / sum_tot
-                        dfGoalSuit.iloc[count, 6] = (d10_goal + d11_goal + d12_goal) / sum_tot
-                        dfGoalSuit.iloc[count, 7] = (d7_goal + d8_goal + d9_goal) / sum_tot
-
-                        # Probabilities of goal suit having 10 cards
-                        dfGoalSuit.iloc[count, 8]  = np.nan_to_num((d5_goal + d6_goal) / (d4_goal + d5_goal + d6_goal), nan=0.0)
-                        dfGoalSuit.iloc[count, 9]  = np.nan_to_num((d1_goal + d2_goal) / (d1_goal + d2_goal + d3_goal), nan=0.0)
-                        dfGoalSuit.iloc[count, 10] = np.nan_to_num((d11_goal + d12_goal) / (d10_goal + d11_goal + d12_goal), nan=0.0)
-                        dfGoalSuit.iloc[count, 11] = np.nan_to_num((d7_goal + d8_goal) / (d7_goal + d8_goal + d9_goal), nan=0.0)
-
-                        count += 1
-
-    dfGoalSuit = dfGoalSuit.round(3)
-    dfGoalSuit.to_csv('precomputed/GoalDist.csv', index=False)   
\ No newline at end of file
+    if 'distribution' in args.tables:
+        start = time.perf_counter()
+        goal_distribution_table(decimals=None if args.no_round else 3).to_csv(f'{args.out}/GoalDist.csv', index=False)
+        print(f'GoalDist.csv written in {time.perf_counter() - start:.3f}s')
@@ -0,0 +1,70 @@
+import json
+import asyncio
+import pytest
+
+pytest.importorskip('aiohttp')
+from aiohttp.test_utils import TestClient, TestServer
+
+from ExchangeSimulator import ExchangeSimulator
+
+
+# Bodies that are valid JSON, but not the object of an order
+NON_OBJECT_BODIES = ['[]', '1', '"x"', 'null', '[{"card": "spade"}]', 'not json']
+
+
+def run_with_client(make_app, test):
+    """
+    Runs test(client, simulator) against an app of a simulator with one registered player.
+    """
+
+    async def run():
+        simulator = ExchangeSimulator(rate_limit=None)
+        simulator.engine.add_player('p1', 'p1_1')
+        async with TestClient(TestServer(make_app(simulator))) as client:
+            await test(client, simulator)
+
+    asyncio.run(run())
+
+
+async def get_status(response):
+    # The exchange double encodes its answers
+    return json.loads(await response.json())['status']
+
+
+@pytest.mark.parametrize('path', ['/order', '/cancel'])
+@pytest.mark.parametrize('body', NON_OBJECT_BODIES)
+def test_non_object_order_bodies_are_parse_errors(path, body):
+
+    async def test(client, simulator):
+        response = await client.post(path, data=body, headers={'Playerid': 'p1', 'Content-Type': 'application/json'})
+        assert response.status == 200
+        assert await get_status(response) == 'PARSE_ERROR'
+
+    run_with_client(ExchangeSimulator.make_rest_app, test)
+
+
+def test_order_object_is_still_handled():
+
+    async def test(client, simulator):
+        response = await client.post('/order', json={'card': 'spade', 'price': 5, 'direction': 'buy'}, headers={'Playerid': 'p1'})
+        assert await get_status(response) == 'NO_GAME'
+
+    run_with_client(ExchangeSimulator.make_rest_app, test)
+
+
+def test_non_object_websocket_frames_are_parse_errors():
+
+    async def test(client, simulator):
+        async with client.ws_connect('/') as ws:
+            for body in NON_OBJECT_BODIES:
+                await ws.send_str(body)
+                assert json.loads(await ws.receive_str())['status'] == 'PARSE_ERROR'
+
+            await ws.send_str(json.dumps({'action': 'subscribe', 'playerid': ['p1']}))
+            assert json.loads(await ws.receive_str())['status'] == 'UNKNOWN_PLAYER'
+
+            # The socket is still served
+            await ws.send_str(json.dumps({'action': 'subscribe', 'playerid': 'p1'}))
+            assert json.loads(await ws.receive_str())['status'] == 'SUCCESS'
+
+    run_with_client(ExchangeSimulator.make_ws_app, test)
@@ -0,0 +1,56 @@
+from GameController import GameController
+from WSMessages import MessageDecoder, DealingCards, SUITS
+
+
+def make_update(asks=(), trade=''):
+    """
+    Data of an update frame with asks [(suit, price, player), ...] in the book.
+    """
+
+    data = {suit: {'bids': [], 'asks': []} for suit in SUITS}
+    for suit, price, player in asks:
+        data[suit]['asks'].append([price, player])
+    data['trade'] = trade
+    return data
+
+
+def make_controller():
+    gameCon = GameController()
+    gameCon.set_playerName('me')
+    return gameCon, MessageDecoder(gameCon.get_player_row)
+
+
+def test_updates_before_the_deal_do_not_register_players():
+
+    gameCon, decoder = make_controller()
+    message = decoder.decode_update(make_update(asks=[('spades', 9, 'carol'), ('clubs', 8, 'alice')]))
+
+    assert message.asks[0] == ((9, -1),)
+    assert gameCon.players_names == ['me', 'P2', 'P3', 'P4']
+
+    gameCon.set_starting_hand(DealingCards([3, 2, 3, 2]))
+    decoder.decode_update(make_update(trade='club,8,bob,alice'))
+    assert gameCon.players_names == ['me', 'bob', 'alice', 'P4']
+
+
+def test_players_keep_their_seat_order():
+
+    gameCon, decoder = make_controller()
+    gameCon.set_players(['alice', 'me', 'bob', 'carol'])
+    gameCon.set_starting_hand(DealingCards([3, 2, 3, 2]))
+
+    # Met in another order than their seats
+    message = decoder.decode_update(make_update(asks=[('spades', 9, 'carol'), ('clubs', 8, 'bob'), ('hearts', 7, 'alice')]))
+
+    assert gameCon.players_names == ['me', 'alice', 'bob', 'carol']
+    assert [message.asks[idx_suit][0][1] for idx_suit in range(3)] == [3, 2, 1]
+
+
+def test_round_end_clears_the_deal():
+
+    gameCon, decoder = make_controller()
+    gameCon.set_starting_hand(DealingCards([3, 2, 3, 2]))
+    gameCon.reset_round_inventory()
+
+    decoder.decode_update(make_update(asks=[('spades', 9, 'carol')]))
+    assert gameCon.known_players == 1
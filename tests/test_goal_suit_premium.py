@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from GoalSuitPremium import GoalSuitPremium, MAJORITY_PREMIUM
+
+
+@pytest.fixture(scope='module')
+def gsPremium():
+    return GoalSuitPremium()
+
+
+def reference_premium(table, n_my_cards, n_pl_cards, prob_10):
+    """
+    Premium as GoalSuitPremium used to compute it: filter the rows of GoalPremium.csv, then sum them.
+    """
+
+    if n_my_cards < 2:
+        return 0.0
+    elif n_my_cards > 6:
+        return MAJORITY_PREMIUM
+
+    rows = table[(table[:, 0] == n_my_cards) & (table[:, 1] >= n_pl_cards[1]) &
+                 (table[:, 2] >= n_pl_cards[2]) & (table[:, 3] >= n_pl_cards[3])]
+    pr_goal = np.where(rows[:, :4].sum(axis=1) == 10, prob_10, 1 - prob_10)
+
+    with np.errstate(invalid='ignore'):
+        return np.sum(pr_goal*rows[:, 5]*rows[:, 6]) / np.sum(pr_goal)
+
+
+def all_keys(seed=0):
+    rng  = np.random.default_rng(seed)
+    keys = np.array([(me, me, p2, p3, p4) for me in range(9) for p2 in range(10) for p3 in range(10) for p4 in range(10)])
+    return keys[:, 0], keys[:, 1:], rng.random(len(keys))
+
+
+def test_scalar_premium_is_identical_to_the_row_sum(gsPremium):
+
+    n_my_cards, n_pl_cards, probs_10 = all_keys()
+    for me, pl, prob_10 in zip(n_my_cards, n_pl_cards, probs_10):
+        expected = reference_premium(gsPremium.dist, me, pl, prob_10)
+        np.testing.assert_array_equal(gsPremium.get_goal_suit_premium(me, pl, prob_10), expected)
+
+
+def test_batch_premium_is_identical_to_the_row_sum(gsPremium):
+
+    n_my_cards, n_pl_cards, probs_10 = all_keys(seed=1)
+    expected = [reference_premium(gsPremium.dist, me, pl, prob_10) for me, pl, prob_10 in zip(n_my_cards, n_pl_cards, probs_10)]
+
+    np.testing.assert_array_equal(gsPremium.get_goal_suit_premium_batch(n_my_cards, n_pl_cards, probs_10), expected)
+
+    # Any batch shape
+    premiums = gsPremium.get_goal_suit_premium_batch(n_my_cards.reshape(-1, 4), n_pl_cards.reshape(-1, 4, 4), probs_10.reshape(-1, 4))
+    np.testing.assert_array_equal(premiums.ravel(), expected)
@@ -0,0 +1,132 @@
+import numpy as np
+import pytest
+
+from GoalSuitEstimator import GoalSuitEstimator
+from GoalSuitPremium import GoalSuitPremium
+from PortfolioEval import PortfolioEval
+from PortfolioVariants import VARIANTS
+
+
+@pytest.fixture(scope='module')
+def gsEst():
+    return GoalSuitEstimator()
+
+
+@pytest.fixture(scope='module')
+def gsPremium():
+    return GoalSuitPremium()
+
+
+def random_positions(gsEst, n_positions, seed=0):
+    """
+    Positions of real deals: my whole hand and some of the cards of the other players.
+
+    OUTPUTS:
+        * (list): (pl_cards, probs, probs_10) of each position
+    """
+
+    rng = np.random.default_rng(seed)
+    positions = []
+    while len(positions) < n_positions:
+        deck  = np.repeat(np.arange(4), rng.permutation([12, 10, 10, 8]))
+        hands = rng.permutation(deck).reshape(4, 10)
+        pl_cards = np.array([np.bincount(hand, minlength=4) for hand in hands])
+
+        # Cards of the other players seen so far
+        pl_cards[1:] = rng.binomial(pl_cards[1:], rng.random())
+
+        probs, probs_10 = gsEst.get_goalsuit_prob(list(np.sum(pl_cards, axis=0)))
+        positions.append((pl_cards, probs, probs_10))
+
+    return positions
+
+
+def reference_neutral_quotes(portEval, port_ev, pl_cards, probs, probs_10):
+    """
+    Neutral quotes as get_neutral_quotes used to compute them: evaluate_portfolio on each one card move.
+    """
+
+    neutral_quotes = np.full((4, 2), np.nan)
+    for suit in range(4):
+
+        # Selling case
+        if pl_cards[0, suit] > 0:
+            sell_evals = []
+            for opp in range(1, 4):
+                new_pl_cards = pl_cards.copy()
+                new_pl_cards[0, suit]   -= 1
+                new_pl_cards[opp, suit] += 1
+                sell_evals.append(portEval.evaluate_portfolio(list(new_pl_cards[0]), new_pl_cards, probs, probs_10))
+            neutral_quotes[suit][1] = port_ev - np.nanmin(sell_evals)
+
+        # Buying case
+        buy_evals = [np.nan]
+        for opp in range(1, 4):
+            new_pl_cards = pl_cards.copy()
+            new_pl_cards[0, suit] += 1
+            if pl_cards[opp, suit] == 0:
+                try:
+                    new_probs, new_probs_10 = portEval.gsEst.get_goalsuit_prob(list(np.sum(pl_cards, axis=0) + np.eye(4, dtype=int)[suit]))
+                except ValueError:
+                    continue
+            else:
+                new_pl_cards[opp, suit] -= 1
+                new_probs, new_probs_10 = probs, probs_10
+            buy_evals.append(portEval.evaluate_portfolio(list(new_pl_cards[0]), new_pl_cards, new_probs, new_probs_10))
+        neutral_quotes[suit][0] = np.nanmax([np.nanmin(buy_evals) - port_ev, 0.0])
+
+    return neutral_quotes
+
+
+@pytest.mark.filterwarnings('ignore::RuntimeWarning')
+def test_neutral_quotes_match_the_evaluation_of_every_one_card_move(gsEst, gsPremium):
+
+    portEval = PortfolioEval(gsPremium, gsEst)
+    for pl_cards, probs, probs_10 in random_positions(gsEst, 300):
+        port_ev = portEval.evaluate_portfolio(list(pl_cards[0]), pl_cards, probs, probs_10)
+
+        expected = reference_neutral_quotes(portEval, port_ev, pl_cards, probs, probs_10)
+        np.testing.assert_array_equal(portEval.get_neutral_quotes(port_ev, pl_cards, probs, probs_10, checks=[]), expected)
+
+
+@pytest.mark.filterwarnings('ignore::RuntimeWarning')
+def test_batch_evaluation_is_identical_to_evaluate_portfolio(gsEst, gsPremium):
+
+    portEval  = PortfolioEval(gsPremium, gsEst)
+    positions = random_positions(gsEst, 300, seed=1)
+    pl_batch, probs_batch, probs_10_batch = (np.array(values) for values in zip(*positions))
+
+    expected = [portEval.evaluate_portfolio(list(pl_cards[0]), pl_cards, probs, probs_10) for pl_cards, probs, probs_10 in positions]
+    np.testing.assert_array_equal(portEval.evaluate_portfolio_batch(pl_batch[:, 0], pl_batch, probs_batch, probs_10_batch), expected)
+
+
+@pytest.mark.filterwarnings('ignore::RuntimeWarning')
+@pytest.mark.parametrize('variant', sorted(VARIANTS))
+def test_adjusted_quotes_match_the_old_loop(gsEst, gsPremium, variant):
+
+    portEval = VARIANTS[variant](gsPremium, gsEst)
+    for pl_cards, probs, probs_10 in random_positions(gsEst, 300, seed=2):
+        port_ev = portEval.evaluate_portfolio(list(pl_cards[0]), pl_cards, probs, probs_10)
+        n_seen_cards = int(np.sum(pl_cards))
+
+        neutral  = portEval.get_neutral_quotes(port_ev, pl_cards, probs, probs_10, checks=[])
+        expected = reference_neutral_quotes(portEval, port_ev, pl_cards, probs, probs_10)
+        np.testing.assert_array_equal(portEval.get_adjusted_quotes(neutral, n_seen_cards, probs, list(pl_cards[0]), checks=[]),
+                                      portEval.get_adjusted_quotes(expected, n_seen_cards, probs, list(pl_cards[0]), checks=[]))
+
+
+def test_exact_integer_neutral_price_is_kept(gsEst, gsPremium):
+
+    # Buying a diamond is worth exactly 4 dollars, a rounding error below it bids one dollar less
+    pl_cards = np.array([[3, 2, 5, 0],
+                         [0, 0, 1, 0],
+                         [0, 0, 0, 0],
+                         [3, 0, 0, 3]])
+    probs, probs_10 = gsEst.get_goalsuit_prob(list(np.sum(pl_cards, axis=0)))
+
+    portEval = VARIANTS['monocolor'](gsPremium, gsEst)
+    port_ev  = portEval.evaluate_portfolio(list(pl_cards[0]), pl_cards, probs, probs_10)
+    neutral  = portEval.get_neutral_quotes(port_ev, pl_cards, probs, probs_10, checks=[])
+
+    assert neutral[3][0] == 4.0
+    assert portEval.get_adjusted_quotes(neutral, int(np.sum(pl_cards)), probs, list(pl_cards[0]), checks=[])[3][0] == 2